@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Local stand-in for the Census ACS API for testing fetch_from_acs
+"""
+
+import argparse
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+
+class Args(NamedTuple):
+    port: int
+    tracts: int
+    block_groups: int
+    error_rate: float
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Local stand-in for the Census ACS API',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-p',
+                        '--port',
+                        help='Port to listen on',
+                        metavar='int',
+                        type=int,
+                        default=8765)
+
+    parser.add_argument('-t',
+                        '--tracts',
+                        help='Tracts per county',
+                        metavar='int',
+                        type=int,
+                        default=20)
+
+    parser.add_argument('-b',
+                        '--block_groups',
+                        help='Block groups per tract',
+                        metavar='int',
+                        type=int,
+                        default=3)
+
+    parser.add_argument('-e',
+                        '--error_rate',
+                        help='Fraction of requests to answer with a 429',
+                        metavar='float',
+                        type=float,
+                        default=0.)
+
+    args = parser.parse_args()
+
+    return Args(args.port, args.tracts, args.block_groups, args.error_rate)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """Make a jazz noise here"""
+
+    args = get_args()
+    server = make_server(args)
+    print(f'Listening on http://127.0.0.1:{server.server_port}/')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+# --------------------------------------------------
+def make_server(args: Args) -> ThreadingHTTPServer:
+    """Create (but don't start) the server, port 0 picks a free port"""
+
+    class Handler(BaseHTTPRequestHandler):
+        """Answer "get=NAME,VAR,...&in=county:NNN" like api.census.gov"""
+
+        def do_GET(self):
+            self.server.num_requests += 1
+            if args.error_rate and random.random() < args.error_rate:
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            qry = parse_qs(urlparse(self.path).query)
+            variables = qry.get('get', [''])[0].split(',')
+            county = ''
+            for geo in qry.get('in', []):
+                if geo.startswith('county:'):
+                    county = geo.split(':', 1)[1]
+
+            if not county or variables[0] != 'NAME':
+                self.send_error(400, 'Expected "get=NAME,..." and county')
+                return
+
+            body = json.dumps(
+                response(variables[1:], county, args.tracts,
+                         args.block_groups)).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    server.num_requests = 0
+    return server
+
+
+# --------------------------------------------------
+def response(variables: List[str], county: str, tracts: int,
+             block_groups: int) -> List[List[str]]:
+    """Census-shaped JSON: header row then one row per block group"""
+
+    rows = [['NAME'] + variables + ['state', 'county', 'tract', 'block group']]
+    for tract in range(1, tracts + 1):
+        for bg in range(1, block_groups + 1):
+            name = (f'Block Group {bg}, Census Tract {tract}, '
+                    f'County {county}, Arizona')
+            # Values derived from the variable so responses are repeatable
+            values = [
+                str(sum(map(ord, f'{var}{county}{tract}{bg}')))
+                for var in variables
+            ]
+            rows.append([name] + values +
+                        ['04', county, f'{tract:06d}',
+                         str(bg)])
+
+    return rows
+
+
+# --------------------------------------------------
+def test_response() -> None:
+    """Test response"""
+
+    rows = response(['B01001_001E', 'B01001_002E'], '019', 2, 2)
+    assert rows[0] == [
+        'NAME', 'B01001_001E', 'B01001_002E', 'state', 'county', 'tract',
+        'block group'
+    ]
+    assert len(rows) == 5
+    assert rows[1][-4:] == ['04', '019', '000001', '1']
+    assert rows == response(['B01001_001E', 'B01001_002E'], '019', 2, 2)
+
+
+# --------------------------------------------------
+def test_server() -> None:
+    """Test the server answers like the API"""
+
+    from urllib.request import urlopen
+
+    server = make_server(Args(port=0, tracts=1, block_groups=2,
+                              error_rate=0.))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        url = (f'http://127.0.0.1:{server.server_port}/?get=NAME,B01001_001E'
+               '&for=block%20group:*&in=state:04&in=county:025&in=tract:*')
+        with urlopen(url) as fh:
+            data = json.load(fh)
+        assert data == response(['B01001_001E'], '025', 1, 2)
+        assert server.num_requests == 1
+    finally:
+        server.shutdown()
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -7,22 +7,289 @@ Purpose: Get US Census data
 
 import argparse
 import csv
+import email.utils
+import hashlib
+import io
+import json
 import os
+import random
+import sqlite3
+import statistics
 import sys
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 from pprint import pprint
-from typing import NamedTuple, TextIO, Optional, List
+from typing import Dict, NamedTuple, TextIO, Optional, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 
 class Args(NamedTuple):
     file: TextIO
-    variable: Optional[str]
+    variable: Optional[List[str]]
     county: List[str]
     outdir: str
+    api: str
+    batch: int
+    jobs: int
+    rate: float
+    retries: int
+    backoff: float
+    failed: str
+    retry_failed: bool
+    cache: str
+    revalidate: bool
+    store: str
     verbose: bool
 
+
+class Job(NamedTuple):
+    url: str
+    out_files: Dict[str, str]  # variable => output file
+    msg: str
+    county: str = ''
+
+
+class RetryPolicy(NamedTuple):
+    retries: int
+    backoff: float  # seconds, doubled on each retry
+    max_backoff: float = 120.
+
+
+class FetchError(Exception):
+    """A request failed for good"""
+
+
+class Stats:
+    """Thread-safe request/retry/latency counts"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.statuses: Dict[str, int] = {}
+        self.latencies: List[float] = []
+
+    def request(self, status: str, secs: float) -> None:
+        """Record one response (or connection error)"""
+
+        with self.lock:
+            self.requests += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.latencies.append(secs)
+
+    def retry(self) -> None:
+        """Record one retry"""
+
+        with self.lock:
+            self.retries += 1
+
+    def hit(self) -> None:
+        """Record one response served from the cache"""
+
+        with self.lock:
+            self.cache_hits += 1
+
+    def report(self) -> str:
+        """Summary for the end of a run"""
+
+        lines = [
+            f'Requests: {self.requests:,}, retries: {self.retries:,}, '
+            f'cache hits: {self.cache_hits:,}'
+        ]
+        if self.statuses:
+            lines.append('Status: ' + ', '.join(
+                f'{status} = {num:,}'
+                for status, num in sorted(self.statuses.items())))
+        if len(self.latencies) > 1:
+            pcts = statistics.quantiles(self.latencies, n=20)
+            lines.append('Latency (s): '
+                         f'min {min(self.latencies):.3f}, '
+                         f'mean {statistics.mean(self.latencies):.3f}, '
+                         f'p50 {statistics.median(self.latencies):.3f}, '
+                         f'p95 {pcts[-1]:.3f}, '
+                         f'max {max(self.latencies):.3f}')
+        return '\n'.join(lines)
+
+
+class ResponseCache:
+    """
+    On-disk response bodies stored by their SHA-256 under "objects"
+    with "manifest.jsonl" mapping normalized request URLs to them.
+    Bodies are verified against their hash before reuse.
+    """
+
+    def __init__(self, cache_dir: str, revalidate: bool = False):
+        self.dir = cache_dir
+        self.revalidate = revalidate
+        self.manifest_file = os.path.join(cache_dir, 'manifest.jsonl')
+        self.lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        num_lines = 0
+        if os.path.isfile(self.manifest_file):
+            with open(self.manifest_file, 'rt') as fh:
+                for num_lines, line in enumerate(fh, start=1):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # e.g., a line cut short by a crash
+                    self.entries[entry['url']] = entry
+
+        # Drop superseded/broken lines so the manifest doesn't keep growing
+        if num_lines > len(self.entries):
+            atomic_write(
+                self.manifest_file, ''.join(
+                    json.dumps(entry) + '\n'
+                    for entry in self.entries.values()).encode())
+
+    def object_path(self, digest: str) -> str:
+        """Where the body with this hash lives"""
+
+        return os.path.join(self.dir, 'objects', digest[:2], digest)
+
+    def get(self, url: str) -> Optional[Tuple[dict, bytes]]:
+        """The manifest entry and verified body for url, if any"""
+
+        entry = self.entries.get(normalize_url(url))
+        if not entry:
+            return None
+
+        try:
+            with open(self.object_path(entry['sha256']), 'rb') as fh:
+                body = fh.read()
+        except OSError:
+            return None
+
+        if hashlib.sha256(body).hexdigest() != entry['sha256']:
+            return None
+
+        return entry, body
+
+    def put(self, url: str, body: bytes, headers) -> None:
+        """Store the body and record it in the manifest"""
+
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, body)
+
+        entry = {
+            'url': normalize_url(url),
+            'sha256': digest,
+            'size': len(body),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched': time.time(),
+        }
+
+        with self.lock:
+            self.entries[entry['url']] = entry
+            with open(self.manifest_file, 'at') as fh:
+                fh.write(json.dumps(entry) + '\n')
+
+
+class Store:
+    """
+    All the fetched values in one SQLite table clustered on
+    (variable, block_group) instead of a CSV per variable/county
+    """
+
+    schema = """
+        create table if not exists acs (
+          variable text not null,
+          block_group text not null,
+          value text not null,
+          primary key (variable, block_group)
+        ) without rowid;
+
+        create table if not exists fetched (
+          variable text not null,
+          county text not null,
+          primary key (variable, county)
+        ) without rowid;
+    """
+
+    def __init__(self, db_file: str):
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.executescript(self.schema)
+        self.lock = threading.Lock()
+        self.fetched = set(
+            self.db.execute('select variable, county from fetched'))
+
+    def done(self, variable: str, county: str) -> bool:
+        """Has this variable/county already been stored?"""
+
+        return (variable, county) in self.fetched
+
+    def add(self, job: Job, headers: List[str], data: List[list]) -> None:
+        """Store a response and mark its variables fetched, all or none"""
+
+        variables = [var for var in headers[1:] if var in job.out_files]
+        rows = []
+        for row in data:
+            rec = dict(zip(headers, row))
+            block_group = ''.join([
+                rec['state'], rec['county'], rec['tract'], rec['block group']
+            ])
+            for var in variables:
+                val = rec.get(var)
+                if val is not None and val != '':
+                    rows.append((var, block_group, val))
+
+        with self.lock, self.db:
+            self.db.executemany(
+                'insert or replace into acs (variable, block_group, value) '
+                'values (?, ?, ?)', rows)
+            self.db.executemany(
+                'insert or ignore into fetched (variable, county) '
+                'values (?, ?)', [(var, job.county) for var in job.out_files])
+            self.fetched.update((var, job.county) for var in job.out_files)
+
+
+class TokenBucket:
+    """Thread-safe rate limiter, "rate" tokens/second up to "capacity" """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1., rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> None:
+        """Block until a token is available"""
+
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
 KEY = '9f04099fa56bdfe585c32715618dce959e1afd0f'
 
+# The API allows 50 variables in "get=", and one of those is NAME
+MAX_BATCH = 49
+
+# Worth another try, anything else (e.g., 400 for a bad variable) is not
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
 COUNTIES = {
     'Apache': '001',
     'Cochise': '003',
@@ -79,6 +346,73 @@ def get_args() -> Args:
                         metavar='str',
                         default=os.path.join(os.getcwd(), 'data'))
 
+    parser.add_argument('-a',
+                        '--api',
+                        help='Census API endpoint',
+                        metavar='url',
+                        default='https://api.census.gov/data/2018/acs/acs5')
+
+    parser.add_argument('-b',
+                        '--batch',
+                        help=f'Variables per request (max {MAX_BATCH})',
+                        metavar='int',
+                        type=int,
+                        default=1)
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        help='Number of concurrent requests',
+                        metavar='int',
+                        type=int,
+                        default=8)
+
+    parser.add_argument('-r',
+                        '--rate',
+                        help='Max requests per second (0 for no limit)',
+                        metavar='float',
+                        type=float,
+                        default=10.)
+
+    parser.add_argument('-R',
+                        '--retries',
+                        help='Retries per request',
+                        metavar='int',
+                        type=int,
+                        default=5)
+
+    parser.add_argument('-B',
+                        '--backoff',
+                        help='Initial retry delay in seconds',
+                        metavar='float',
+                        type=float,
+                        default=1.)
+
+    parser.add_argument('-F',
+                        '--failed',
+                        help='Failed requests queue file',
+                        metavar='FILE',
+                        default='failed.jsonl')
+
+    parser.add_argument('--retry_failed',
+                        help='Only fetch the requests in --failed',
+                        action='store_true')
+
+    parser.add_argument('-C',
+                        '--cache',
+                        help='Response cache directory ("" for none)',
+                        metavar='DIR',
+                        default=os.path.join(os.getcwd(), 'cache'))
+
+    parser.add_argument('--revalidate',
+                        help='Check cached responses with the server',
+                        action='store_true')
+
+    parser.add_argument('-s',
+                        '--store',
+                        help='Write to this SQLite db instead of --outdir',
+                        metavar='DB',
+                        default='')
+
     parser.add_argument('-V',
                         '--verbose',
                         help='Be chatty',
@@ -86,8 +420,20 @@ def get_args() -> Args:
 
     args = parser.parse_args()
 
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be greater than 0')
+
+    if not 0 < args.batch <= MAX_BATCH:
+        parser.error(f'--batch "{args.batch}" must be between 1 and '
+                     f'{MAX_BATCH}')
+
+    if args.retries < 0:
+        parser.error(f'--retries "{args.retries}" must not be negative')
+
     return Args(args.file, args.variable, args.county, args.outdir,
-                args.verbose)
+                args.api.rstrip('/'), args.batch, args.jobs, args.rate,
+                args.retries, args.backoff, args.failed, args.retry_failed,
+                args.cache, args.revalidate, args.store, args.verbose)
 
 
 # --------------------------------------------------
@@ -99,7 +445,7 @@ def main() -> None:
     out_dir = args.outdir
     num_vars = len(variables)
 
-    if not num_vars:
+    if not num_vars and not args.retry_failed:
         sys.exit('Must have --file or --variable to fetch')
 
     def progress(msg):
@@ -108,66 +454,451 @@ def main() -> None:
 
     progress(f"Fetching {num_vars} variable{'' if num_vars == 1 else 's'}")
 
-    if not os.path.isdir(out_dir):
+    store = Store(args.store) if args.store else None
+    if not store and not os.path.isdir(out_dir):
         os.makedirs(out_dir)
 
-    tmpl = ('https://api.census.gov/data/2018/acs/acs5?'
+    tmpl = (f'{args.api}?'
             'get=NAME,{}&for=block%20group:*&in=state:04'
             '&in=county:{}&in=tract:*'
             f'&key={KEY}')
 
-    num_vars = len(variables)
-    for var_num, var in enumerate(variables, start=1):
-        for county in args.county:
-            county_num = COUNTIES.get(county)
-            if not county_num:
+    jobs = []
+    for county in [] if args.retry_failed else args.county:
+        county_num = COUNTIES.get(county)
+        if not county_num:
+            continue
+
+        # Pack the variables still missing for this county into batches
+        out_files = {}
+        for var in variables:
+            if store:
+                if store.done(var, county_num):
+                    progress(f'\tSkipping "{var}" for "{county}" stored')
+                    continue
+                out_files[var] = ''
                 continue
 
-            progress(f'{var_num:4}/{num_vars:4}: '
-                     f'"{var}" for "{county}" ({county_num})')
-
             out_file = os.path.join(out_dir, f'{var}-{county_num}.csv')
             if os.path.isfile(out_file) and os.path.getsize(out_file):
                 progress(f'\tSkipping "{out_file}" exists')
                 continue
+            out_files[var] = out_file
+
+        pending = list(out_files)
+        for start in range(0, len(pending), args.batch):
+            batch = pending[start:start + args.batch]
+            desc = f'"{batch[0]}"' if len(batch) == 1 else \
+                f'{len(batch)} vars "{batch[0]}".."{batch[-1]}"'
+            jobs.append(
+                Job(url=tmpl.format(','.join(batch), county_num),
+                    out_files={var: out_files[var]
+                               for var in batch},
+                    msg=f'{desc} for "{county}" ({county_num})',
+                    county=county_num))
+
+    if args.retry_failed:
+        jobs = read_failed(args.failed)
+
+    num_jobs = len(jobs)
+    progress(f"Making {num_jobs} request{'' if num_jobs == 1 else 's'}")
+
+    bucket = TokenBucket(args.rate)
+    policy = RetryPolicy(args.retries, args.backoff)
+    stats = Stats()
+    cache = ResponseCache(args.cache, args.revalidate) if args.cache else None
+    session = threading.local()
+    failed = []
+
+    def run(job):
+        if not hasattr(session, 'requests'):
+            session.requests = requests.Session()
+
+        progress(job.msg)
+        try:
+            fetch(session.requests, job, progress, bucket, policy, stats,
+                  cache, store)
+        except FetchError as err:
+            print(f'Failed {job.msg}: {err}', file=sys.stderr)
+            return job, str(err)
+        except Exception as err:
+            # E.g., a KeyError on an unexpected body fails only this job
+            error = f'{type(err).__name__}: {err}'
+            print(f'Failed {job.msg}: {error}', file=sys.stderr)
+            return job, error
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(run, job) for job in jobs]
+        failed = [f.result() for f in as_completed(futures) if f.result()]
+
+    # Give the stragglers one more (serial) pass before queueing them
+    if failed:
+        progress(f'Retrying {len(failed)} failed request(s)')
+        failed = list(filter(None, map(run, [job for job, _ in failed])))
+
+    write_failed(args.failed, failed)
+    print(stats.report())
+
+    if failed:
+        print(f'{len(failed):,} request(s) failed, see "{args.failed}" '
+              'and rerun with --retry_failed')
+
+    print(f'Done, see output '
+          f'{"db" if store else "directory"} "{args.store or args.outdir}".')
 
-            url = tmpl.format(var, county_num)
-            r = requests.get(url)
-            if r.status_code == 429:
-                sys.exit(f'Status "{r.status_code}" getting "{url}"')
 
-            data = r.json()
-            headers = data.pop(0)
-            var_name = headers[1]
+# --------------------------------------------------
+def get_json(session: requests.Session,
+             url: str,
+             bucket: TokenBucket,
+             policy: RetryPolicy,
+             stats: Stats,
+             cache: Optional[ResponseCache] = None) -> list:
+    """GET url, retrying with exponential backoff, return decoded JSON"""
+
+    cached = cache.get(url) if cache else None
+    conditional = {}
+    if cached:
+        entry, body = cached
+        if not cache.revalidate:
+            stats.hit()
+            return json.loads(body) if body else []
+
+        if entry.get('etag'):
+            conditional['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            conditional['If-Modified-Since'] = entry['last_modified']
+
+    for attempt in range(policy.retries + 1):
+        if attempt:
+            stats.retry()
+
+        bucket.take()
+        start = time.monotonic()
+        delay = None
+        try:
+            r = session.get(url, headers=conditional, timeout=120)
+        except requests.RequestException as exc:
+            stats.request(type(exc).__name__, time.monotonic() - start)
+            error = str(exc)
+        else:
+            stats.request(str(r.status_code), time.monotonic() - start)
+
+            if r.status_code == 304 and cached:
+                stats.hit()
+                return json.loads(cached[1]) if cached[1] else []
+
+            # The API answers 204 when there is no data
+            if r.status_code == 204:
+                if cache:
+                    cache.put(url, b'', r.headers)
+                return []
+
+            if r.status_code == 200:
+                try:
+                    data = r.json()
+                except ValueError:
+                    error = f'Non-JSON response "{r.text[:100]}"'
+                else:
+                    if cache:
+                        cache.put(url, r.content, r.headers)
+                    return data
+            elif r.status_code in RETRY_STATUS:
+                error = f'Status "{r.status_code}"'
+                delay = retry_after(r.headers.get('Retry-After'))
+            else:
+                raise FetchError(f'Status "{r.status_code}" getting "{url}"')
+
+        if attempt < policy.retries:
+            time.sleep(retry_delay(policy, attempt, delay))
+
+    raise FetchError(f'{error} after {policy.retries} retries')
 
-            if not data:
-                continue
 
-            progress(f'\tWriting "{out_file}"')
-            writer = csv.DictWriter(
-                open(out_file, 'wt'),
-                fieldnames=['variable', 'value', 'block_group'])
-            writer.writeheader()
+# --------------------------------------------------
+def normalize_url(url: str) -> str:
+    """Cache key for a request: no API key, sorted query, lowercase host"""
+
+    parts = urlsplit(url)
+    qry = sorted((k, v) for k, v in parse_qsl(parts.query) if k != 'key')
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                       parts.path.rstrip('/'), urlencode(qry), ''))
+
+
+# --------------------------------------------------
+def test_normalize_url() -> None:
+    """Test normalize_url"""
+
+    url = ('https://api.census.gov/data/2018/acs/acs5?get=NAME,B01001_001E'
+           '&for=block%20group:*&in=state:04&in=county:019&key=SECRET')
+    norm = normalize_url(url)
+    assert 'SECRET' not in norm
+    assert norm == normalize_url(url.replace('key=SECRET', 'key=OTHER'))
+    assert norm == normalize_url(url.replace('api.census', 'API.census'))
+    assert norm != normalize_url(url.replace('2018', '2019'))
+
+
+# --------------------------------------------------
+def atomic_write(path: str, data: bytes) -> None:
+    """Write to a temp file in the same dir then rename into place"""
+
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+# --------------------------------------------------
+def test_response_cache() -> None:
+    """Test ResponseCache"""
+
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        url = 'http://127.0.0.1/?get=NAME,B01001_001E&key=SECRET'
+        cache = ResponseCache(cache_dir)
+        assert cache.get(url) is None
+
+        cache.put(url, b'[["NAME"]]', {'ETag': '"abc"'})
+        entry, body = cache.get(url)
+        assert body == b'[["NAME"]]'
+        assert entry['etag'] == '"abc"'
+
+        # Reloaded from the manifest, found under a different key
+        cache = ResponseCache(cache_dir)
+        assert cache.get(url.replace('SECRET', 'OTHER'))[1] == b'[["NAME"]]'
+
+        # A corrupted body is not reused
+        with open(cache.object_path(entry['sha256']), 'wb') as fh:
+            fh.write(b'[["NA')
+        assert cache.get(url) is None
+
+
+# --------------------------------------------------
+def backoff(policy: RetryPolicy, attempt: int) -> float:
+    """Exponential backoff with "full jitter" """
+
+    return random.uniform(0, min(policy.max_backoff,
+                                 policy.backoff * 2**attempt))
+
+
+# --------------------------------------------------
+def test_backoff() -> None:
+    """Test backoff"""
+
+    policy = RetryPolicy(retries=10, backoff=1., max_backoff=5.)
+    for attempt in range(10):
+        assert 0 <= backoff(policy, attempt) <= min(5., 2**attempt)
+
+
+# --------------------------------------------------
+def retry_delay(policy: RetryPolicy, attempt: int,
+                delay: Optional[float]) -> float:
+    """The server's "Retry-After" delay or else backoff, capped alike"""
+
+    if delay is None:
+        return backoff(policy, attempt)
+
+    return min(policy.max_backoff, delay)
+
+
+# --------------------------------------------------
+def test_retry_delay() -> None:
+    """Test retry_delay"""
+
+    policy = RetryPolicy(retries=10, backoff=1., max_backoff=5.)
+    assert retry_delay(policy, 0, 3.) == 3.
+    assert retry_delay(policy, 0, 3600.) == 5.
+    assert 0 <= retry_delay(policy, 3, None) <= 5.
+
+
+# --------------------------------------------------
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a "Retry-After" header (seconds or a date)"""
+
+    if not value:
+        return None
+
+    if value.strip().isdigit():
+        return float(value)
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0., when.timestamp() - time.time())
+
+
+# --------------------------------------------------
+def test_retry_after() -> None:
+    """Test retry_after"""
+
+    assert retry_after(None) is None
+    assert retry_after('') is None
+    assert retry_after('foo') is None
+    assert retry_after('3') == 3.
+    assert retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.
+    future = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 50 < retry_after(future) <= 60
+
+
+# --------------------------------------------------
+def read_failed(filename: str) -> List[Job]:
+    """Read the failed requests queue"""
+
+    if not os.path.isfile(filename):
+        return []
+
+    with open(filename, 'rt') as fh:
+        return [Job(**json.loads(line)['job']) for line in fh if line.strip()]
+
+
+# --------------------------------------------------
+def write_failed(filename: str, failed: List[tuple]) -> None:
+    """Write (or clear) the failed requests queue"""
+
+    if not failed:
+        if os.path.isfile(filename):
+            os.remove(filename)
+        return
+
+    with open(filename, 'wt') as fh:
+        for job, error in failed:
+            fh.write(json.dumps({'job': job._asdict(), 'error': error}) + '\n')
 
-            for i, row in enumerate(data, start=1):
-                rec = dict(zip(headers, row))
+
+# --------------------------------------------------
+def fetch(session: requests.Session,
+          job: Job,
+          progress,
+          bucket: TokenBucket,
+          policy: RetryPolicy,
+          stats: Stats,
+          cache: Optional[ResponseCache] = None,
+          store: Optional[Store] = None) -> None:
+    """Fetch variables for one county and write an output file for each"""
+
+    data = get_json(session, job.url, bucket, policy, stats, cache)
+    headers = data.pop(0) if data else ['NAME']
+
+    if store:
+        progress(f'\tStoring {len(data):,} rows')
+        store.add(job, headers, data)
+        return
+
+    if not data:
+        return
+
+    # Write to temp files renamed into place when complete so that an
+    # existing output file is never a truncated one
+    tmp_files = {}
+    with ExitStack() as stack:
+        writers = {}
+        for var_name in headers[1:]:
+            if out_file := job.out_files.get(var_name):
+                progress(f'\tWriting "{out_file}"')
+                tmp_files[out_file] = f'{out_file}.tmp'
+                writers[var_name] = csv.DictWriter(
+                    stack.enter_context(open(tmp_files[out_file], 'wt')),
+                    fieldnames=['variable', 'value', 'block_group'])
+                writers[var_name].writeheader()
+
+        for row in data:
+            rec = dict(zip(headers, row))
+            block_group = ''.join([
+                rec['state'], rec['county'], rec['tract'], rec['block group']
+            ])
+
+            for var_name, writer in writers.items():
                 val = rec.get(var_name)
                 if val is None or val == '':
                     continue
 
                 writer.writerow({
-                    'variable':
-                    var_name,
-                    'value':
-                    val,
-                    'block_group':
-                    ''.join([
-                        rec['state'], rec['county'], rec['tract'],
-                        rec['block group']
-                    ])
+                    'variable': var_name,
+                    'value': val,
+                    'block_group': block_group,
                 })
 
-    print(f'Done, see output directory "{args.outdir}".')
+    for out_file, tmp_file in tmp_files.items():
+        os.replace(tmp_file, out_file)
+
+
+# --------------------------------------------------
+def test_fetch() -> None:
+    """Test fetch against the local stub API"""
+
+    import tempfile
+    from census_stub import Args as StubArgs, make_server
+
+    server = make_server(StubArgs(port=0, tracts=2, block_groups=2,
+                                  error_rate=0.))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        with tempfile.TemporaryDirectory() as out_dir:
+            out_files = {
+                var: os.path.join(out_dir, f'{var}-019.csv')
+                for var in ['B01001_001E', 'B01001_002E']
+            }
+            url = (f'http://127.0.0.1:{server.server_port}/'
+                   '?get=NAME,B01001_001E,B01001_002E&for=block%20group:*'
+                   '&in=state:04&in=county:019&in=tract:*')
+            fetch(requests.Session(), Job(url, out_files, ''), print,
+                  TokenBucket(0), RetryPolicy(0, 0.), Stats())
+
+            for var, out_file in out_files.items():
+                with open(out_file) as fh:
+                    rows = list(csv.DictReader(fh))
+
+                assert len(rows) == 4
+                assert rows[0]['variable'] == var
+                assert rows[0]['block_group'] == '040190000011'
+    finally:
+        server.shutdown()
+
+
+# --------------------------------------------------
+def test_store() -> None:
+    """Test Store"""
+
+    import tempfile
+    from census_stub import response
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'acs5.db')
+        store = Store(db_file)
+        job = Job('', {'B01001_001E': '', 'B01001_002E': ''}, '', '019')
+        assert not store.done('B01001_001E', '019')
+
+        data = response(['B01001_001E', 'B01001_002E'], '019', 2, 2)
+        store.add(job, data[0], data[1:])
+        assert store.done('B01001_001E', '019')
+        assert store.done('B01001_002E', '019')
+
+        store = Store(db_file)
+        assert store.done('B01001_002E', '019')
+        assert store.db.execute('select count(*) from acs').fetchone() == (8,)
+
+
+# --------------------------------------------------
+def test_token_bucket() -> None:
+    """Test TokenBucket"""
+
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.take()
+
+    # 1 token up front, then 5 more at 50/s
+    assert time.monotonic() - start >= 5 / 50 * .9
+
+    unlimited = TokenBucket(rate=0)
+    start = time.monotonic()
+    for _ in range(1000):
+        unlimited.take()
+    assert time.monotonic() - start < .5
 
 
 # --------------------------------------------------
@@ -178,11 +909,25 @@ def read_vars(args: Args) -> List[str]:
     if args.file:
         var_names = args.file.read().splitlines()
     elif args.variable:
-        var_names = [args.variable]
+        var_names = args.variable
 
     return var_names
 
 
+# --------------------------------------------------
+def test_read_vars() -> None:
+    """Test read_vars"""
+
+    args = Args(file=None, variable=['B01001_001E', 'B01001_002E'],
+                county=[], outdir='', api='', batch=1, jobs=1, rate=1.,
+                retries=0, backoff=0., failed='', retry_failed=False,
+                cache='', revalidate=False, store='', verbose=False)
+
+    assert read_vars(args) == ['B01001_001E', 'B01001_002E']
+    assert read_vars(args._replace(file=io.StringIO('A\nB\n'))) == ['A', 'B']
+    assert read_vars(args._replace(variable=None)) == []
+
+
 # --------------------------------------------------
 if __name__ == '__main__':
     main()
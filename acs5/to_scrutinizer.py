@@ -7,20 +7,38 @@ Purpose: Create Scrutinizer format
 
 import argparse
 import csv
+import hashlib
+import io
 import os
+import pickle
 import sys
 import re
+import shutil
+import sqlite3
+import tempfile
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any, NamedTuple, TextIO, List, Dict, Callable, \
-    Iterable, Optional
+    Iterable, Iterator, Optional, Tuple
 from pprint import pprint
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+from compressed_io import FileType, open_file  # noqa: E402
+from scrutinizer_record import (  # noqa: E402
+    ParquetWriter, ScrutinizerRecord, ScrutinizerWriter, get_writer)
+
 
 class Args(NamedTuple):
     file: List[str]  # Too many open files error!
+    store: Optional[str]
     variables: TextIO
     outfile: TextIO
     source: str
+    jobs: int
+
+
+# Bump if the pickled variable index changes shape
+INDEX_VERSION = 1
 
 
 # --------------------------------------------------
@@ -38,18 +56,24 @@ def get_args() -> Args:
                         type=str,
                         nargs='+')
 
+    parser.add_argument('-d',
+                        '--store',
+                        help='SQLite db from "fetch_from_acs.py --store"',
+                        metavar='DB',
+                        type=str)
+
     parser.add_argument('-v',
                         '--variables',
                         help='Variable description file',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         default='acs_variables_to_download.csv')
 
     parser.add_argument('-o',
                         '--outfile',
-                        help='Output file',
+                        help='Output file (Parquet if "*.parquet")',
                         metavar='FILE',
-                        type=argparse.FileType('wt'),
+                        type=FileType('wt'),
                         default='scrutinizer.csv')
 
     parser.add_argument('-s',
@@ -59,12 +83,28 @@ def get_args() -> Args:
                         type=str,
                         default='ACS5')
 
+    parser.add_argument('-j',
+                        '--jobs',
+                        help='Number of processes converting --file',
+                        metavar='int',
+                        type=int,
+                        default=1)
+
     args = parser.parse_args()
 
-    if bad := list(filter(lambda f: not os.path.isfile(f), args.file)):
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be greater than 0')
+
+    if not args.file and not args.store:
+        parser.error('Must have --file or --store')
+
+    if bad := list(
+            filter(lambda f: not os.path.isfile(f),
+                   (args.file or []) + ([args.store] if args.store else []))):
         parser.error('The following are not files:\n{}'.format("\n".join(bad)))
 
-    return Args(args.file, args.variables, args.outfile, args.source)
+    return Args(args.file or [], args.store, args.variables, args.outfile,
+                args.source, args.jobs)
 
 
 # --------------------------------------------------
@@ -73,47 +113,133 @@ def main() -> None:
 
     args = get_args()
 
-    variables = read_variables(args.variables)
+    variables = load_index(args.variables)
 
-    writer = csv.DictWriter(args.outfile,
-                            delimiter=',',
-                            fieldnames=[
-                                'source', 'unit',
-                                'location_name', 'location_type',
-                                'variable_name', 'variable_desc',
-                                'collected_on', 'value', 'medium'
-                            ])
+    writer = get_writer(args.outfile)
     writer.writeheader()
 
+    if args.store:
+        num_written = convert(read_store(args.store), variables, args.source,
+                              writer)
+    elif args.jobs == 1:
+        num_written = convert(read_files(args.file), variables, args.source,
+                              writer)
+    else:
+        args.outfile.flush()
+        num_written = convert_parallel(args.file, variables, args.source,
+                                       args.jobs, args.outfile, writer)
+
+    writer.close()
+    print(f'Done, wrote {num_written:,} to "{args.outfile.name}"')
+
+
+# --------------------------------------------------
+def convert(rows: Iterable[Tuple[str, int, Dict[str, str]]],
+            variables: Dict[str, str], source: str,
+            writer: ScrutinizerWriter) -> int:
+    """
+    Write Scrutinizer records for the rows, return number written
+    "variables" is from load_index (name => final description)
+    """
+
     num_written = 0
-    for file_num, file in enumerate(args.file, start=1):
-        print('{:3}: {}'.format(file_num, os.path.basename(file)))
-        reader = csv.DictReader(open(file, 'rt'), delimiter=',')
-
-        for line_num, row in enumerate(reader, start=1):
-            if value := get_value(row.get('value')):
-                if var_name := row.get('variable'):
-                    if var_desc := variables.get(var_name):
-                        num_written += 1
-                        writer.writerow({
-                            'source': args.source,
-                            'unit': '',
-                            'location_name': row['block_group'],
-                            'location_type': 'census_block',
-                            'variable_name': var_name,
-                            'variable_desc': f'{var_desc} ({var_name})',
-                            'collected_on': '01-01-2018',
-                            'value': value,
-                            'medium': 'population',
-                        })
-                    else:
-                        warn(
-                            f'{file}/{line_num}: Unknown variable "{var_name}"'
-                        )
+    for file, line_num, row in rows:
+        if value := get_value(row.get('value')):
+            if var_name := row.get('variable'):
+                if var_desc := variables.get(var_name):
+                    num_written += 1
+                    writer.writerow(
+                        ScrutinizerRecord(source=source,
+                                          unit='',
+                                          location_name=row['block_group'],
+                                          location_type='census_block',
+                                          variable_name=var_name,
+                                          variable_desc=var_desc,
+                                          collected_on='01-01-2018',
+                                          medium='population',
+                                          value=value))
                 else:
-                    warn(f'{file}/{line_num}: Missing "variable" field')
+                    warn(f'{file}/{line_num}: Unknown variable "{var_name}"')
+            else:
+                warn(f'{file}/{line_num}: Missing "variable" field')
 
-    print(f'Done, wrote {num_written:,} to "{args.outfile.name}"')
+    return num_written
+
+
+# --------------------------------------------------
+def convert_parallel(files: List[str], variables: Dict[str, str],
+                     source: str, jobs: int, out_fh: TextIO,
+                     writer: ScrutinizerWriter) -> int:
+    """
+    Convert runs of files in a process pool, each to its own temp file,
+    then append the temp files to out_fh in the original file order
+    (through the writer for Parquet)
+    """
+
+    # Several chunks per process to even out the work
+    size = max(1, -(-len(files) // (jobs * 4)))
+    chunks = [(files[i:i + size], i + 1, variables, source)
+              for i in range(0, len(files), size)]
+
+    num_written = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # "map" yields in submission order
+        for tmp_file, num in executor.map(convert_chunk, chunks):
+            with open(tmp_file, 'rt', newline='') as fh:
+                if isinstance(writer, ParquetWriter):
+                    writer.writerows(csv.reader(fh))
+                else:
+                    shutil.copyfileobj(fh, out_fh)
+            os.remove(tmp_file)
+            num_written += num
+
+    return num_written
+
+
+# --------------------------------------------------
+def convert_chunk(
+        chunk: Tuple[List[str], int, Dict[str, str], str]) -> Tuple[str, int]:
+    """Convert some files to a temp file (no header) in a worker"""
+
+    files, start, variables, source = chunk
+    fd, tmp_file = tempfile.mkstemp(prefix='acs5_', suffix='.csv')
+    with open(fd, 'wt') as out_fh:
+        writer = ScrutinizerWriter(out_fh)
+        num = convert(read_files(files, start), variables, source, writer)
+
+    return tmp_file, num
+
+
+# --------------------------------------------------
+def read_files(files: List[str],
+               start: int = 1) -> Iterator[Tuple[str, int, Dict[str, str]]]:
+    """Rows from the per-variable CSV files"""
+
+    for file_num, file in enumerate(files, start=start):
+        print('{:3}: {}'.format(file_num, os.path.basename(file)))
+        with open_file(file, 'rt') as fh:
+            reader = csv.DictReader(fh, delimiter=',')
+            for line_num, row in enumerate(reader, start=1):
+                yield file, line_num, row
+
+
+# --------------------------------------------------
+def read_store(db_file: str) -> Iterator[Tuple[str, int, Dict[str, str]]]:
+    """Rows from the "fetch_from_acs.py --store" db in one scan"""
+
+    print(f'Reading "{db_file}"')
+    db = sqlite3.connect(db_file)
+    cur = db.execute('select variable, value, block_group from acs '
+                     'order by variable, block_group')
+
+    for line_num, (variable, value, block_group) in enumerate(cur, start=1):
+        yield db_file, line_num, {
+            'variable': variable,
+            'value': value,
+            'block_group': block_group
+        }
+
+    db.close()
 
 
 # --------------------------------------------------
@@ -169,6 +295,77 @@ def read_variables(fh: TextIO) -> Dict[str, str]:
     return dict(mk_row(row) for row in reader)
 
 
+# --------------------------------------------------
+def load_index(fh: TextIO) -> Dict[str, str]:
+    """
+    Variable name => "concept (label) (name)" for the variables file,
+    compiled once and pickled next to the file keyed by its SHA-256
+    """
+
+    text = fh.read()
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    name = getattr(fh, 'name', '')
+    index_file = f'{name}.idx.pickle' if os.path.isfile(name) else ''
+
+    if index_file and os.path.isfile(index_file):
+        try:
+            with open(index_file, 'rb') as idx_fh:
+                cached = pickle.load(idx_fh)
+            if cached.get('version') == INDEX_VERSION and \
+                    cached.get('sha256') == digest:
+                return cached['index']
+        except Exception:
+            pass  # Stale or corrupt, rebuild it
+
+    index = {
+        var_name: f'{var_desc} ({var_name})'
+        for var_name, var_desc in read_variables(io.StringIO(text)).items()
+    }
+
+    if index_file:
+        try:
+            tmp_file = f'{index_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'wb') as idx_fh:
+                pickle.dump(
+                    {
+                        'version': INDEX_VERSION,
+                        'sha256': digest,
+                        'index': index
+                    }, idx_fh)
+            os.replace(tmp_file, index_file)
+        except OSError as err:
+            warn(f'Could not write "{index_file}": {err}')
+
+    return index
+
+
+# --------------------------------------------------
+def test_load_index() -> None:
+    """Test load_index"""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        var_file = os.path.join(tmp_dir, 'vars.csv')
+        with open(var_file, 'wt') as fh:
+            fh.write('"variable_id","label_in_vars_csv","concept"\n'
+                     '"B01_001E","Estimate!!Total","SEX BY AGE"\n')
+
+        expected = {'B01_001E': 'SEX BY AGE (Estimate Total) (B01_001E)'}
+        with open(var_file) as fh:
+            assert load_index(fh) == expected
+        assert os.path.isfile(var_file + '.idx.pickle')
+
+        # From the pickle
+        with open(var_file) as fh:
+            assert load_index(fh) == expected
+
+        # A changed file is recompiled
+        with open(var_file, 'at') as fh:
+            fh.write('"B01_002E","Estimate!!Total!!Male","SEX BY AGE"\n')
+        with open(var_file) as fh:
+            assert load_index(fh)['B01_002E'] == \
+                'SEX BY AGE (Estimate Total Male) (B01_002E)'
+
+
 # --------------------------------------------------
 def normalize(name: str) -> Optional[str]:
     """Make identifiers sane"""
@@ -10,19 +10,34 @@ import csv
 import os
 import re
 import sys
-from typing import TextIO, NamedTuple, Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import TextIO, NamedTuple, Dict, Iterable, List, Tuple
 from collections import defaultdict
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+from compressed_io import FileType, open_file  # noqa: E402
+from scrutinizer_record import (  # noqa: E402
+    ScrutinizerRecord, get_writer)
+
 
 class Args(NamedTuple):
     """ Command-line arguments """
-    files: List[TextIO]
+    files: List[str]
     outfile: TextIO
     variables: TextIO
     location_type: str
     medium: str
     source: str
     units: str
+    jobs: int
+
+
+COUNTIES = frozenset([
+    'Apache', 'Cochise', 'Coconino', 'Gila', 'Graham', 'Greenlee', 'La Paz',
+    'Maricopa', 'Mohave', 'Navajo', 'Pima', 'Pinal', 'Santa Cruz', 'Yavapai',
+    'Yuma'
+])
 
 
 # --------------------------------------------------
@@ -36,23 +51,23 @@ def get_args() -> Args:
     parser.add_argument('-f',
                         '--files',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=str,
                         nargs='+',
                         help='Input file(s)')
 
     parser.add_argument('-v',
                         '--variables',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         default='ArizonaEPHT_Variables.csv',
                         help='Variables file')
 
     parser.add_argument('-o',
                         '--outfile',
                         metavar='FILE',
-                        type=argparse.FileType('wt'),
+                        type=FileType('wt'),
                         default='scrutinizer.csv',
-                        help='Output file')
+                        help='Output file (Parquet if "*.parquet")')
 
     parser.add_argument('-l',
                         '--location_type',
@@ -83,15 +98,29 @@ def get_args() -> Args:
                         default='Cases per 100,000 people per year',
                         help='Units for data')
 
+    parser.add_argument('-j',
+                        '--jobs',
+                        metavar='jobs',
+                        type=int,
+                        default=1,
+                        help='Number of files to read in parallel')
+
     args = parser.parse_args()
 
+    if bad := list(filter(lambda f: not os.path.isfile(f), args.files)):
+        parser.error('The following are not files:\n{}'.format("\n".join(bad)))
+
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be greater than 0')
+
     return Args(files=args.files,
                 outfile=args.outfile,
                 variables=args.variables,
                 location_type=args.location_type,
                 medium=args.medium,
                 source=args.source,
-                units=args.units)
+                units=args.units,
+                jobs=args.jobs)
 
 
 # --------------------------------------------------
@@ -100,97 +129,159 @@ def main() -> None:
 
     args = get_args()
     variables = get_variables(args.variables)
-    writer = csv.DictWriter(args.outfile,
-                            fieldnames=[
-                                'source', 'unit', 'location_name',
-                                'location_type', 'variable_name',
-                                'variable_desc', 'collected_on', 'medium',
-                                'value'
-                            ])
+    writer = get_writer(args.outfile)
     writer.writeheader()
+
+    convert = partial(process,
+                      variables=variables,
+                      location_type=args.location_type,
+                      medium=args.medium,
+                      source=args.source,
+                      units=args.units)
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            num_exported = write_results(executor.map(convert, args.files),
+                                         writer)
+    else:
+        num_exported = write_results(map(convert, args.files), writer)
+
+    writer.close()
+    print(f'Done, exported {num_exported:,} to "{args.outfile.name}"')
+
+
+# --------------------------------------------------
+def write_results(results: Iterable[Tuple[List[ScrutinizerRecord],
+                                          List[Tuple[bool, str]]]],
+                  writer) -> int:
+    """
+    Print the messages and write the rows of each file's results (in the
+    order of the input files), return the number of rows
+    """
+
     num_exported = 0
+    for rows, messages in results:
+        for is_err, msg in messages:
+            print(msg, file=sys.stderr if is_err else sys.stdout)
+
+        writer.writerows(rows)
+        num_exported += len(rows)
 
-    for fh in args.files:
+    return num_exported
+
+
+# --------------------------------------------------
+def process(file: str, variables: Dict[str, List[Dict[str, str]]],
+            location_type: str, medium: str, source: str,
+            units: str) -> Tuple[List[ScrutinizerRecord],
+                                 List[Tuple[bool, str]]]:
+    """
+    Convert one file, return the output rows and messages (is_err, msg)
+    for the parent process to print
+    """
+
+    rows, messages = [], []
+    basename = os.path.basename(file)
+
+    def err(msg):
+        messages.append((True, f'{basename}: {msg}'))
+
+    with open_file(file, 'rt') as fh:
         reader = csv.DictReader(fh, delimiter=',')
 
         # Cannot normalize names b/c some have "Name" and "NAME" fields!
         # reader.fieldnames = list(map(normalize, reader.fieldnames))
 
         if 'Name' not in reader.fieldnames:
-            print(f'"{fh.name}" missing county "Name" field', file=sys.stderr)
-            print("\n".join(map(lambda f: f'"{f}"', reader.fieldnames)))
-            print(reader.fieldnames)
-            continue
-
-        counties = [
-            'Apache', 'Cochise', 'Coconino', 'Gila', 'Graham', 'Greenlee',
-            'La Paz', 'Maricopa', 'Mohave', 'Navajo', 'Pima', 'Pinal',
-            'Santa Cruz', 'Yavapai', 'Yuma'
-        ]
-
-        basename = os.path.basename(fh.name)
+            messages.append((True, f'"{file}" missing county "Name" field'))
+            messages.append(
+                (False, "\n".join(map(lambda f: f'"{f}"',
+                                      reader.fieldnames))))
+            messages.append((False, str(reader.fieldnames)))
+            return rows, messages
+
         for rec in reader:
-            loc_name = ' '.join(map(str.title, rec.get('Name', '').split()))
-            if args.location_type == 'county' and loc_name not in counties:
-                print(f'{basename}: unknown county "{loc_name}"',
-                      file=sys.stderr)
+            loc_name = title_case(rec.get('Name', ''))
+            if location_type == 'county' and loc_name not in COUNTIES:
+                err(f'unknown county "{loc_name}"')
                 continue
 
             indicator_name = rec.get('indicatorName')
             if not indicator_name:
-                print(f'{basename}: missing indicator name', file=sys.stderr)
+                err('missing indicator name')
                 continue
 
             vars_ = variables.get(normalize(indicator_name))
             if not vars_:
-                print(f'{basename}: unknown indicator "{indicator_name}"',
-                      file=sys.stderr)
+                err(f'unknown indicator "{indicator_name}"')
                 continue
 
             if len(vars_) > 1:
-                print(f'{basename}: multiple variables for "{indicator_name}"',
-                      file=sys.stderr)
+                err(f'multiple variables for "{indicator_name}"')
                 continue
 
             variable = vars_[0]
 
             value = rec.get('Value')
             if not value:
-                print(f'{basename}: missing value', file=sys.stderr)
+                err('missing value')
                 continue
 
-            num_exported += 1
-            writer.writerow({
-                'source':
-                args.source,
-                'unit':
-                args.units,
-                'location_name':
-                loc_name,
-                'location_type':
-                args.location_type,
-                'variable_name':
-                variable['Code'],
-                'variable_desc':
-                '{}: {}'.format(indicator_name, variable['Measure']),
-                'medium':
-                args.medium,
-                'collected_on':
-                rec.get('Year') or '',
-                'value':
-                value,
-            })
+            rows.append(
+                ScrutinizerRecord(source=source,
+                                  unit=units,
+                                  location_name=loc_name,
+                                  location_type=location_type,
+                                  variable_name=variable['Code'],
+                                  variable_desc=variable_desc(
+                                      indicator_name, variable['Measure']),
+                                  collected_on=rec.get('Year') or '',
+                                  medium=medium,
+                                  value=value))
 
-    print(f'Done, exported {num_exported:,} to "{args.outfile.name}"')
+    return rows, messages
+
+
+# --------------------------------------------------
+@lru_cache(maxsize=None)
+def title_case(name: str) -> str:
+    """ "SANTA  CRUZ" => "Santa Cruz" """
+
+    return ' '.join(map(str.title, name.split()))
+
+
+# --------------------------------------------------
+def test_title_case() -> None:
+    """ Test title_case """
+
+    assert title_case('') == ''
+    assert title_case('APACHE') == 'Apache'
+    assert title_case(' SANTA  CRUZ ') == 'Santa Cruz'
 
 
 # --------------------------------------------------
+def variable_desc(indicator_name: str, measure: str) -> str:
+    """ Description for the indicator/measure """
+
+    return '{}: {}'.format(indicator_name, measure)
+
+
+# --------------------------------------------------
+@lru_cache(maxsize=None)
 def normalize(s: str) -> str:
     """ Normalize a string """
 
     return re.sub('[^a-z0-9_]', '_', re.sub('[()]', '', s.lower()))
 
 
+# --------------------------------------------------
+def test_normalize() -> None:
+    """ Test normalize """
+
+    assert normalize('') == ''
+    assert normalize('Lung Cancer (Crude Rate)') == 'lung_cancer_crude_rate'
+
+
 # --------------------------------------------------
 def get_variables(fh: TextIO) -> Dict[str, Dict[str, str]]:
     """ Read variables file """
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Generate synthetic inputs for the benchmarks
+
+Each data set looks like the real input of a converter or loader (same
+columns, value formats, grouping and some bad values) with about "rows"
+records. The random numbers are seeded, so the same size gives the same
+files. Each data set goes in its own directory with a "done" file once it
+is complete, so an interrupted run is generated again.
+"""
+
+import argparse
+import csv
+import os
+import random
+import sqlite3
+from typing import Callable, Dict, List, NamedTuple
+
+SEED = 1
+
+# Arizona, as the real data is mostly from there
+LAT = (31.33, 37.0)
+LON = (-114.82, -109.05)
+
+COUNTIES = [f'{n:03d}' for n in range(1, 28, 2)]
+
+STATIONS = [
+    'ABOVE RUSSEL', 'CC MAIN ABOVE NFCC', 'CONFLUENCE', 'PUMPHOUSE',
+    'RAIL-LESS', 'RIVERA', 'UPPER REFERENCE', 'GUAGE'
+]
+
+ELEMENTS = ('Ag Al As Ba Be Bi Ca Cd Ce Co Cr Cs Cu Fe Ga Hg K Mn Pb Zn'
+            ).split()
+
+
+class Args(NamedTuple):
+    rows: List[int]
+    outdir: str
+    dataset: List[str]
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic inputs for the benchmarks',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-n',
+                        '--rows',
+                        help='Number of records (for each size)',
+                        metavar='int',
+                        type=int,
+                        nargs='+',
+                        default=[10000])
+
+    parser.add_argument('-o',
+                        '--outdir',
+                        help='Output directory',
+                        metavar='DIR',
+                        type=str,
+                        default='data')
+
+    parser.add_argument('-d',
+                        '--dataset',
+                        help='Data sets to generate',
+                        metavar='name',
+                        type=str,
+                        nargs='+',
+                        choices=sorted(GENERATORS),
+                        default=sorted(GENERATORS))
+
+    args = parser.parse_args()
+
+    if bad := [n for n in args.rows if n < 1]:
+        parser.error(f'--rows "{bad[0]}" must be > 0')
+
+    return Args(args.rows, args.outdir, args.dataset)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """Make a jazz noise here"""
+
+    args = get_args()
+
+    for rows in args.rows:
+        for name in args.dataset:
+            out_dir = generate(name, rows, args.outdir)
+            print(f'{rows:>10,} {name:12} {out_dir}')
+
+    print('Done.')
+
+
+# --------------------------------------------------
+def generate(name: str, rows: int, outdir: str) -> str:
+    """ Generate a data set (if not already there), return its directory """
+
+    out_dir = os.path.join(outdir, str(rows), name)
+    done = os.path.join(out_dir, 'done')
+    if not os.path.isfile(done):
+        os.makedirs(out_dir, exist_ok=True)
+        GENERATORS[name](out_dir, rows, random.Random(SEED))
+        open(done, 'w').close()
+
+    return out_dir
+
+
+# --------------------------------------------------
+def writer(file: str):
+    """ A file and a csv.writer on it """
+
+    fh = open(file, 'wt', newline='')
+    return fh, csv.writer(fh, lineterminator='\n')
+
+
+# --------------------------------------------------
+def block_group(rng: random.Random, state: str = '04') -> str:
+    """ A 12-digit block group GEOID """
+
+    return (f'{state}{rng.choice(COUNTIES)}{rng.randrange(1, 999999):06d}'
+            f'{rng.randrange(1, 6)}')
+
+
+# --------------------------------------------------
+def gen_acs5(out_dir: str, rows: int, rng: random.Random) -> None:
+    """
+    "fetch_from_acs.py" output: a CSV for each variable and county, the
+    same rows in a "--store" db and the variables file
+    """
+
+    variables = [f'B19019_{n:03d}E' for n in range(1, 11)]
+    fh, out = writer(os.path.join(out_dir, 'variables.csv'))
+    out.writerow(['variable_id', 'label_in_vars_csv', 'concept'])
+    for i, var in enumerate(variables, start=1):
+        out.writerow([
+            var, f'Estimate!!Total!!{i}-person households',
+            'MEDIAN HOUSEHOLD INCOME IN THE PAST 12 MONTHS BY HOUSEHOLD SIZE'
+        ])
+    fh.close()
+
+    db = sqlite3.connect(os.path.join(out_dir, 'store.db'))
+    db.executescript("""
+        drop table if exists acs;
+        create table acs (
+          variable text not null,
+          block_group text not null,
+          value text not null,
+          primary key (variable, block_group)
+        ) without rowid;
+    """)
+
+    files_dir = os.path.join(out_dir, 'data')
+    os.makedirs(files_dir, exist_ok=True)
+    pairs = [(var, county) for var in variables for county in COUNTIES]
+    per_file = max(1, rows // len(pairs))
+    for var, county in pairs:
+        fh, out = writer(os.path.join(files_dir, f'{var}-{county}.csv'))
+        out.writerow(['variable', 'value', 'block_group'])
+        recs = []
+        for i in range(per_file):
+            # Sequential block groups, so the store has no duplicates
+            geoid = f'04{county}{i // 4:06d}{i % 4 + 1}'
+            value = '' if rng.random() < .01 else str(rng.randrange(10**6))
+            out.writerow([var, value, geoid])
+            recs.append((var, geoid, value))
+        fh.close()
+        db.executemany('insert into acs values (?, ?, ?)', recs)
+
+    db.commit()
+    db.close()
+
+
+# --------------------------------------------------
+def gen_ejscreen(out_dir: str, rows: int, rng: random.Random) -> None:
+    """ A wide EJSCREEN file (ID + variables) and its headers file """
+
+    names = [f'ACS{n:02d}' for n in range(1, 19)] + ['P_LDPNT', 'P_DSLPM']
+    fh, out = writer(os.path.join(out_dir, 'headers.csv'))
+    out.writerow(['FIELD_NAME', 'DESCRIPTION', 'CATEGORY'])
+    out.writerow(['ID', 'Block Group ID', 'Identifier'])
+    for name in names:
+        out.writerow([name, f'Description of {name}', 'Population'])
+    fh.close()
+
+    fh, out = writer(os.path.join(out_dir, 'ejscreen.csv'))
+    out.writerow(['ID'] + names)
+    for _ in range(rows):
+        # About 1 in 10 are not in Arizona and are skipped
+        state = '04' if rng.random() < .9 else '06'
+        values = [
+            '' if rng.random() < .02 else f'{rng.random() * 1000:.4f}'
+            for _ in names[:-2]
+        ] + [f'{rng.randrange(100)}%ile' for _ in names[-2:]]
+        out.writerow([block_group(rng, state)] + values)
+    fh.close()
+
+
+# --------------------------------------------------
+def gen_waterquality(out_dir: str, rows: int, rng: random.Random) -> None:
+    """ A WQP "narrowresult.csv" and "station.csv" """
+
+    stations = [f'USGS-{n:015d}' for n in range(1, 501)]
+    fh, out = writer(os.path.join(out_dir, 'station.csv'))
+    out.writerow([
+        'MonitoringLocationIdentifier', 'LatitudeMeasure', 'LongitudeMeasure'
+    ])
+    for station in stations:
+        out.writerow([
+            station, f'{rng.uniform(*LAT):.6f}', f'{rng.uniform(*LON):.6f}'
+        ])
+    fh.close()
+
+    chars = [('Calcium', 'mg/l'), ('Arsenic', 'ug/l'), ('Lead', 'ug/l'),
+             ('Sodium, percent total cations', '%'), ('pH', ''),
+             ('Zinc', 'ug/l')]
+    fh, out = writer(os.path.join(out_dir, 'narrowresult.csv'))
+    out.writerow(
+        ('OrganizationIdentifier,OrganizationFormalName,ActivityIdentifier,'
+         'ActivityStartDate,ActivityStartTime/Time,'
+         'ActivityStartTime/TimeZoneCode,MonitoringLocationIdentifier,'
+         'ResultIdentifier,DataLoggerLine,ResultDetectionConditionText,'
+         'MethodSpecificationName,CharacteristicName,'
+         'ResultSampleFractionText,ResultMeasureValue,'
+         'ResultMeasure/MeasureUnitCode,MeasureQualifierCode,'
+         'ResultStatusIdentifier,ResultCommentText,USGSPCode,ProviderName'
+         ).split(','))
+    for i in range(rows):
+        char, unit = rng.choice(chars)
+        station = rng.choice(stations) if rng.random() > .01 else 'USGS-NONE'
+        date = (f'{rng.randint(1975, 2020)}-{rng.randint(1, 12):02d}-'
+                f'{rng.randint(1, 28):02d}')
+        comment = rng.choice(['', '', '', 'ok, "checked"', 'one\ntwo'])
+        out.writerow([
+            'USGS-AZ', 'USGS Arizona Water Science Center', f'nwisaz.{i}',
+            date, '10:00:00', 'MST', station, f'NWIS-{i}', '', '', '', char,
+            'Total', f'{rng.random() * 100:.3f}', unit, '', 'Historical',
+            comment, '00910', 'NWIS'
+        ])
+    fh.close()
+
+
+# --------------------------------------------------
+def gen_benthic(out_dir: str, rows: int, rng: random.Random) -> None:
+    """ A CSM benthic sheet (replicates by station/date) and its headers """
+
+    taxa = [f'TAXON{n:02d}' for n in range(1, 41)]
+    fh, out = writer(os.path.join(out_dir, 'headers.csv'))
+    out.writerow(['header', 'order', 'family', 'genus', 'species'])
+    for i, taxon in enumerate(taxa):
+        out.writerow([taxon, 'Ephemeroptera ', f'Family{i % 7}', f'Genus{i}',
+                      'spp.'] if i % 5 else [taxon, '', '', '', ''])
+    fh.close()
+
+    fh, out = writer(os.path.join(out_dir, 'benthic.csv'))
+    out.writerow(['STREAM', 'DATE', 'STATION', 'REP', '#GRIDS'] + taxa + [''])
+    day = 0
+    while day * len(STATIONS) * 3 < rows:
+        year, rest = divmod(day, 336)
+        date = f'{rest // 28 + 1}/{rest % 28 + 1}/{(11 + year) % 100:02d}'
+        for station in STATIONS:
+            for rep in range(1, 4):
+                counts = [
+                    '' if rng.random() < .01 else
+                    str(rng.randrange(300)) if rng.random() < .3 else '0'
+                    for _ in taxa
+                ]
+                out.writerow(['NFCC', date, station, rep,
+                              rng.randrange(1, 12)] + counts + [''])
+        day += 1
+    fh.close()
+
+
+# --------------------------------------------------
+def gen_latlon(out_dir: str, rows: int, rng: random.Random) -> None:
+    """
+    A shapefile of a 10x10 grid of block groups over Arizona, points
+    (some outside the grid or bad) for "point2shape.py" and a USGS soil
+    file with the points for "usgs/to_scrutinizer.py"
+    """
+
+    import shapefile
+
+    cells = 10
+    dlat, dlon = (LAT[1] - LAT[0]) / cells, (LON[1] - LON[0]) / cells
+    with shapefile.Writer(os.path.join(out_dir, 'grid'),
+                          shapeType=shapefile.POLYGON) as shp:
+        shp.field('GEOID', 'C', size=12)
+        for i in range(cells):
+            for j in range(cells):
+                lat, lon = LAT[0] + i * dlat, LON[0] + j * dlon
+                # Clockwise outer ring
+                shp.poly([[(lon, lat), (lon, lat + dlat),
+                           (lon + dlon, lat + dlat), (lon + dlon, lat),
+                           (lon, lat)]])
+                shp.record(f'04{i:03d}{j:06d}1')
+
+    def point():
+        if rng.random() < .005:
+            return 'NA', 'NA'
+        return (f'{rng.uniform(LAT[0] - .1, LAT[1]):.5f}',
+                f'{rng.uniform(LON[0], LON[1] + .1):.5f}')
+
+    fh, out = writer(os.path.join(out_dir, 'latlon.csv'))
+    out.writerow(['sample', 'latitude', 'longitude'])
+    for i in range(rows):
+        out.writerow([f'S{i}', *point()])
+    fh.close()
+
+    flds = [f'Top5_{el}' for el in ELEMENTS]
+    fh, out = writer(os.path.join(out_dir, 'units.csv'))
+    out.writerow(['Top5_LabID', 'StateID', 'Latitude', 'Longitude'] + flds)
+    out.writerow(['', '', 'Degrees', 'Degrees'] +
+                 [rng.choice(['mg/kg', 'wt. %']) for _ in flds])
+    fh.close()
+
+    fh, out = writer(os.path.join(out_dir, 'usgs.csv'))
+    out.writerow(['Top5_LabID', 'StateID', 'Latitude', 'Longitude'] + flds)
+    for i in range(rows):
+        values = [
+            f'<{rng.randrange(1, 10)}' if rng.random() < .05 else
+            f'{rng.random() * 100:.2f}' for _ in flds
+        ]
+        state = 'AZ' if rng.random() < .9 else 'NM'
+        out.writerow([f'C-{i}', state, *point()] + values)
+    fh.close()
+
+
+# --------------------------------------------------
+def gen_azepht(out_dir: str, rows: int, rng: random.Random) -> None:
+    """
+    Arizona EPHT county files (one for each indicator, county names in
+    capitals with some unknown) and the variables file
+    """
+
+    counties = [
+        'APACHE', 'COCHISE', 'COCONINO', 'GILA', 'GRAHAM', 'GREENLEE',
+        'LA PAZ', 'MARICOPA', 'MOHAVE', 'NAVAJO', 'PIMA', 'PINAL',
+        'SANTA  CRUZ', 'YAVAPAI', 'YUMA', 'UNKNOWN'
+    ]
+    indicators = [f'Incidence of Cancer {n:02d}' for n in range(1, 25)]
+
+    fh, out = writer(os.path.join(out_dir, 'variables.csv'))
+    out.writerow(['Indicator', 'Code', 'Measure'])
+    for i, indicator in enumerate(indicators, start=1):
+        out.writerow([indicator, f'c{i:02d}', 'Age-adjusted rate'])
+    fh.close()
+
+    files_dir = os.path.join(out_dir, 'data')
+    os.makedirs(files_dir, exist_ok=True)
+    per_file = max(1, rows // len(indicators))
+    for i, indicator in enumerate(indicators, start=1):
+        fh, out = writer(os.path.join(files_dir, f'EPHTdata_c{i:02d}.csv'))
+        out.writerow([
+            'Name', 'Domain', 'Indicator', 'Year', 'GeogID', 'AgeGroup',
+            'Gender', 'Month', 'Measure', 'Value', 'ts', 'measureName',
+            'indicatorName', 'contentAreaName', 'AgeGroup Text', 'GenderText'
+        ])
+        for _ in range(per_file):
+            value = '' if rng.random() < .01 else f'{rng.random() * 100:.1f}'
+            out.writerow([
+                rng.choice(counties), 'CA', i, rng.randint(2000, 2019),
+                f'040{rng.choice(COUNTIES)}', 20, 'ALL', 'ALL', 99, value,
+                '2020-10-09T19:05:09.780', 'Age-adjusted rate', indicator,
+                'Cancer', 'All Ages', 'Any Gender'
+            ])
+        fh.close()
+
+
+# --------------------------------------------------
+def gen_census(out_dir: str, rows: int, rng: random.Random) -> None:
+    """ A Census "data_with_overlays" file (two header lines) """
+
+    fh, out = writer(os.path.join(out_dir, 'overlays.csv'))
+    out.writerow(['GEO_ID', 'NAME', 'P001001', 'P003002', 'P003003'])
+    out.writerow([
+        'id', 'Geographic Area Name', 'Total', 'Total!!White alone',
+        'Total!!Black or African American alone'
+    ])
+    for i in range(rows):
+        geoid = block_group(rng)
+        total = rng.randrange(5000)
+        white = rng.randrange(total + 1)
+        out.writerow([
+            f'1500000US{geoid}', f'Block Group {i}, Census Tract {geoid[5:11]}'
+            f', Arizona', total, white,
+            rng.randrange(total - white + 1)
+        ])
+    fh.close()
+
+
+GENERATORS: Dict[str, Callable[[str, int, random.Random], None]] = {
+    'acs5': gen_acs5,
+    'ejscreen': gen_ejscreen,
+    'waterquality': gen_waterquality,
+    'benthic': gen_benthic,
+    'latlon': gen_latlon,
+    'census': gen_census,
+    'azepht': gen_azepht,
+}
+
+
+# --------------------------------------------------
+def test_generate() -> None:
+    """ Test the data sets have about the rows asked for """
+
+    import tempfile
+
+    def num_rows(file, skip=1):
+        with open(file, newline='') as fh:
+            return sum(1 for _ in csv.reader(fh)) - skip
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in GENERATORS:
+            if name == 'latlon':
+                try:
+                    import shapefile  # noqa: F401
+                except ImportError:
+                    continue
+            generate(name, 300, tmp)
+
+        data = os.path.join(tmp, '300')
+        assert num_rows(os.path.join(data, 'ejscreen', 'ejscreen.csv')) == 300
+        assert num_rows(os.path.join(data, 'waterquality',
+                                     'narrowresult.csv')) == 300
+        assert num_rows(os.path.join(data, 'census', 'overlays.csv'), 2) == 300
+        assert num_rows(os.path.join(data, 'benthic', 'benthic.csv')) == 312
+
+        azepht = os.path.join(data, 'azepht', 'data')
+        assert len(os.listdir(azepht)) == 24
+        assert sum(num_rows(os.path.join(azepht, file))
+                   for file in os.listdir(azepht)) == 288
+
+        acs = os.path.join(data, 'acs5')
+        files = os.listdir(os.path.join(acs, 'data'))
+        assert len(files) == 140
+        assert num_rows(os.path.join(acs, 'data', files[0])) == 2
+        db = sqlite3.connect(os.path.join(acs, 'store.db'))
+        assert db.execute('select count(*) from acs').fetchone()[0] == 280
+
+        # Not generated again
+        mtime = os.path.getmtime(os.path.join(acs, 'store.db'))
+        generate('acs5', 300, tmp)
+        assert os.path.getmtime(os.path.join(acs, 'store.db')) == mtime
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
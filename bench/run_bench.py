@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Time the converters and loaders on synthetic data
+
+Each benchmark runs a "to_scrutinizer.py," "point2shape.py" or SQLite
+loader on the data from "gen_data.py" (generated the first time a size is
+used) in its own process. The wall time and the peak RSS of the process
+(the largest of it and its worker processes, from "wait4") are written
+with the commit to a JSON file, and "--compare" shows the change from an
+earlier results file so that regressions show up across commits.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, TextIO
+
+from gen_data import GENERATORS, generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Args(NamedTuple):
+    rows: List[int]
+    bench: List[str]
+    datadir: str
+    outfile: Optional[str]
+    compare: Optional[TextIO]
+    repeat: int
+    timeout: float
+
+
+class Bench(NamedTuple):
+    name: str
+    dataset: str
+    cmd: Callable[[str, str], List[str]]
+    setup: Optional[Callable[[str], None]] = None
+
+
+class Timing(NamedTuple):
+    status: str
+    seconds: float
+    peak_rss_mb: float
+    message: str
+
+
+# --------------------------------------------------
+def script(*path: str) -> List[str]:
+    """ A script in this repo run with this Python """
+
+    return [sys.executable, os.path.join(ROOT, *path)]
+
+
+# --------------------------------------------------
+def census_db(out: str) -> None:
+    """ An empty us-census db for "db_loader.py" """
+
+    import sqlite3
+
+    with open(os.path.join(ROOT, 'us-census', 'sqlite', 'schema.sql')) as fh:
+        db = sqlite3.connect(os.path.join(out, 'census.db'))
+        db.executescript(fh.read())
+        db.close()
+
+
+# Given the data set dir and a (clean) dir for the outputs
+BENCHES = [
+    Bench('acs5.files', 'acs5', lambda data, out: script(
+        'acs5', 'to_scrutinizer.py') + [
+            '-v', os.path.join(data, 'variables.csv'), '-o',
+            os.path.join(out, 'scrutinizer.csv'), '-f'
+        ] + files(os.path.join(data, 'data'))),
+    Bench('acs5.files_j4', 'acs5', lambda data, out: script(
+        'acs5', 'to_scrutinizer.py') + [
+            '-j', '4', '-v', os.path.join(data, 'variables.csv'), '-o',
+            os.path.join(out, 'scrutinizer.csv'), '-f'
+        ] + files(os.path.join(data, 'data'))),
+    Bench('acs5.store', 'acs5', lambda data, out: script(
+        'acs5', 'to_scrutinizer.py') + [
+            '-v', os.path.join(data, 'variables.csv'), '-d',
+            os.path.join(data, 'store.db'), '-o',
+            os.path.join(out, 'scrutinizer.csv')
+        ]),
+    Bench('ejscreen', 'ejscreen', lambda data, out: script(
+        'ejscreen', 'to_scrutinizer.py') + [
+            '--quiet', '-H', os.path.join(data, 'headers.csv'), '-c',
+            '2019-01-01', '-o', os.path.join(out, 'scrutinizer.csv'),
+            os.path.join(data, 'ejscreen.csv')
+        ]),
+    Bench('waterquality', 'waterquality', lambda data, out: script(
+        'waterquality', 'to_scrutinizer.py') + [
+            '-f', os.path.join(data, 'narrowresult.csv'), '-s',
+            os.path.join(data, 'station.csv'), '-y', '2018', '-o',
+            os.path.join(out, 'scrutinizer.csv')
+        ]),
+    Bench('waterquality.j4', 'waterquality', lambda data, out: script(
+        'waterquality', 'to_scrutinizer.py') + [
+            '-j', '4', '-f', os.path.join(data, 'narrowresult.csv'), '-s',
+            os.path.join(data, 'station.csv'), '-y', '2018', '-o',
+            os.path.join(out, 'scrutinizer.csv')
+        ]),
+    Bench('csm.benthic', 'benthic', lambda data, out: script(
+        'csm', 'benthic', 'to_scrutinizer.py') + [
+            '-g', '-H', os.path.join(data, 'headers.csv'), '-o',
+            os.path.join(out, 'scrutinizer.csv'),
+            os.path.join(data, 'benthic.csv')
+        ]),
+    Bench('point2shape', 'latlon', lambda data, out: script(
+        'point2shape', 'point2shape.py') + [
+            '-t', 'block_group', '-s', os.path.join(data, 'grid'), '-f',
+            os.path.join(data, 'latlon.csv'), '-o',
+            os.path.join(out, 'out.csv')
+        ]),
+    Bench('usgs', 'latlon', lambda data, out: script(
+        'usgs', 'to_scrutinizer.py') + [
+            '-f', os.path.join(data, 'usgs.csv'), '-u',
+            os.path.join(data, 'units.csv'), '-o',
+            os.path.join(out, 'scrutinizer.csv')
+        ]),
+    Bench('azepht', 'azepht', lambda data, out: script(
+        'azepht', 'to_scrutinizer.py') + [
+            '-l', 'county', '-v', os.path.join(data, 'variables.csv'), '-o',
+            os.path.join(out, 'scrutinizer.csv'), '-f'
+        ] + files(os.path.join(data, 'data'))),
+    Bench('azepht.j4', 'azepht', lambda data, out: script(
+        'azepht', 'to_scrutinizer.py') + [
+            '-j', '4', '-l', 'county', '-v',
+            os.path.join(data, 'variables.csv'), '-o',
+            os.path.join(out, 'scrutinizer.csv'), '-f'
+        ] + files(os.path.join(data, 'data'))),
+    Bench('us-census.sqlite', 'census', lambda data, out: script(
+        'us-census', 'sqlite', 'db_loader.py') + [
+            '-d', os.path.join(out, 'census.db'),
+            os.path.join(data, 'overlays.csv')
+        ], census_db),
+]
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Time the converters and loaders on synthetic data',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-n',
+                        '--rows',
+                        help='Number of input records (e.g., 10000 1000000 '
+                        '10000000)',
+                        metavar='int',
+                        type=int,
+                        nargs='+',
+                        default=[10000])
+
+    parser.add_argument('-b',
+                        '--bench',
+                        help='Benchmarks to run',
+                        metavar='name',
+                        type=str,
+                        nargs='+',
+                        choices=[bench.name for bench in BENCHES],
+                        default=[bench.name for bench in BENCHES])
+
+    parser.add_argument('-d',
+                        '--datadir',
+                        help='Directory for the generated data',
+                        metavar='DIR',
+                        type=str,
+                        default=os.path.join(os.path.dirname(__file__),
+                                             'data'))
+
+    parser.add_argument('-o',
+                        '--outfile',
+                        help='JSON results file '
+                        '(default "results/<commit>.json")',
+                        metavar='FILE',
+                        type=str)
+
+    parser.add_argument('-c',
+                        '--compare',
+                        help='Earlier results file to compare with',
+                        metavar='FILE',
+                        type=argparse.FileType('rt'))
+
+    parser.add_argument('-r',
+                        '--repeat',
+                        help='Number of timings (the fastest is kept)',
+                        metavar='int',
+                        type=int,
+                        default=1)
+
+    parser.add_argument('-t',
+                        '--timeout',
+                        help='Seconds before a benchmark is stopped',
+                        metavar='secs',
+                        type=float,
+                        default=3600.)
+
+    args = parser.parse_args()
+
+    if bad := [n for n in args.rows if n < 1]:
+        parser.error(f'--rows "{bad[0]}" must be > 0')
+
+    if args.repeat < 1:
+        parser.error(f'--repeat "{args.repeat}" must be > 0')
+
+    return Args(rows=args.rows,
+                bench=args.bench,
+                datadir=args.datadir,
+                outfile=args.outfile,
+                compare=args.compare,
+                repeat=args.repeat,
+                timeout=args.timeout)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """Make a jazz noise here"""
+
+    args = get_args()
+    benches = [bench for bench in BENCHES if bench.name in args.bench]
+    commit = git_commit()
+
+    print(f'{"benchmark":18} {"rows":>10} {"status":7} {"seconds":>9} '
+          f'{"rows/sec":>11} {"peak MB":>8}')
+    results = []
+    for rows in args.rows:
+        for bench in benches:
+            data = generate(bench.dataset, rows, args.datadir)
+            timing = best(bench, data, args.repeat, args.timeout)
+            res = result(bench.name, rows, timing)
+            results.append(res)
+            print(f'{bench.name:18} {rows:10,} {timing.status:7} '
+                  f'{timing.seconds:9.2f} {res["rows_per_sec"]:11,.0f} '
+                  f'{timing.peak_rss_mb:8.1f}',
+                  flush=True)
+            if timing.message:
+                print(f'    {timing.message}', file=sys.stderr)
+
+    report = {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+
+    outfile = args.outfile or os.path.join(os.path.dirname(__file__),
+                                           'results',
+                                           f'{commit or "unknown"}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(outfile)), exist_ok=True)
+    with open(outfile, 'wt') as fh:
+        json.dump(report, fh, indent=2)
+
+    if args.compare:
+        print()
+        for line in compare(json.load(args.compare), report):
+            print(line)
+
+    print(f'Done, wrote {len(results)} result(s) to "{outfile}".')
+
+
+# --------------------------------------------------
+def files(path: str) -> List[str]:
+    """ The files in a directory, sorted """
+
+    return sorted(os.path.join(path, name) for name in os.listdir(path))
+
+
+# --------------------------------------------------
+def best(bench: Bench, data: str, repeat: int, timeout: float) -> Timing:
+    """ The fastest of the timings (or the first failure) """
+
+    timings = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as out:
+            if bench.setup:
+                bench.setup(out)
+            timing = measure(bench.cmd(data, out), out, timeout)
+
+        if timing.status != 'ok':
+            return timing
+        timings.append(timing)
+
+    return min(timings, key=lambda t: t.seconds)
+
+
+# --------------------------------------------------
+def measure(cmd: List[str], cwd: str, timeout: float) -> Timing:
+    """
+    Run a command, return the wall time and the peak RSS of it and the
+    processes it waited on (e.g., a process pool)
+    """
+
+    log = os.path.join(cwd, 'bench.log')
+    with open(log, 'wb') as log_fh:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd,
+                                cwd=cwd,
+                                stdin=subprocess.DEVNULL,
+                                stdout=log_fh,
+                                stderr=subprocess.STDOUT)
+
+        # "wait4" gives the rusage of just this child
+        status, usage, timed_out = 0, None, False
+        while usage is None:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid == 0:
+                usage = None
+                if not timed_out and time.perf_counter() - start > timeout:
+                    timed_out = True
+                    proc.kill()
+                time.sleep(.005)
+
+        seconds = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+    # Linux reports KB, macOS bytes
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak_rss_mb = usage.ru_maxrss * scale / 2**20
+
+    if timed_out:
+        return Timing('failed', seconds, peak_rss_mb,
+                      f'timed out after {timeout:g}s')
+
+    if proc.returncode != 0:
+        with open(log, 'rt', errors='replace') as fh:
+            last = fh.read().strip().splitlines()[-1:]
+        return Timing('failed', seconds, peak_rss_mb,
+                      f'exit {proc.returncode}: {" ".join(last)}')
+
+    return Timing('ok', seconds, peak_rss_mb, '')
+
+
+# --------------------------------------------------
+def result(name: str, rows: int, timing: Timing) -> Dict:
+    """ A benchmark result for the JSON """
+
+    return {
+        'name': name,
+        'rows': rows,
+        'status': timing.status,
+        'seconds': round(timing.seconds, 4),
+        'rows_per_sec': round(rows / timing.seconds) if timing.seconds and
+        timing.status == 'ok' else 0,
+        'peak_rss_mb': round(timing.peak_rss_mb, 1),
+        'message': timing.message,
+    }
+
+
+# --------------------------------------------------
+def compare(old: Dict, new: Dict) -> List[str]:
+    """ Lines with the change in rows/sec and peak RSS for each benchmark """
+
+    before = {(res['name'], res['rows']): res for res in old['results']}
+    lines = [
+        f'Compared with {old.get("commit") or "?"} ({old.get("date", "?")})',
+        f'{"benchmark":18} {"rows":>10} {"rows/sec":>11} {"change":>8} '
+        f'{"peak MB":>8} {"change":>8}'
+    ]
+
+    def pct(new_val, old_val):
+        return f'{(new_val - old_val) / old_val:+8.1%}' if old_val else \
+            f'{"-":>8}'
+
+    for res in new['results']:
+        if (prev := before.get((res['name'], res['rows']))) is None:
+            continue
+        lines.append(f'{res["name"]:18} {res["rows"]:10,} '
+                     f'{res["rows_per_sec"]:11,} '
+                     f'{pct(res["rows_per_sec"], prev["rows_per_sec"])} '
+                     f'{res["peak_rss_mb"]:8.1f} '
+                     f'{pct(res["peak_rss_mb"], prev["peak_rss_mb"])}')
+
+    return lines
+
+
+# --------------------------------------------------
+def git_commit() -> Optional[str]:
+    """ The short hash of HEAD (with "-dirty" for local changes) """
+
+    if not shutil.which('git'):
+        return None
+
+    def git(*args):
+        return subprocess.run(['git', '-C', ROOT, *args],
+                              capture_output=True,
+                              text=True,
+                              check=False)
+
+    head = git('rev-parse', '--short', 'HEAD')
+    if head.returncode != 0:
+        return None
+
+    dirty = git('status', '--porcelain', '--untracked-files=no').stdout
+    return head.stdout.strip() + ('-dirty' if dirty.strip() else '')
+
+
+# --------------------------------------------------
+def test_measure() -> None:
+    """ Test measure gets the time and peak RSS of a child """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cmd = [
+            sys.executable, '-c',
+            'import time; x = bytearray(200 * 2**20); time.sleep(.1)'
+        ]
+        timing = measure(cmd, tmp, 60)
+        assert timing.status == 'ok'
+        assert timing.seconds >= .1
+        assert timing.peak_rss_mb > 200
+
+        timing = measure([sys.executable, '-c', 'print("oops"); exit(2)'],
+                         tmp, 60)
+        assert timing.status == 'failed'
+        assert timing.message == 'exit 2: oops'
+
+        timing = measure([sys.executable, '-c', 'import time; time.sleep(9)'],
+                         tmp, .2)
+        assert timing.message == 'timed out after 0.2s'
+        assert timing.seconds < 5
+
+
+# --------------------------------------------------
+def test_compare() -> None:
+    """ Test compare """
+
+    timing = Timing('ok', 2., 100., '')
+    old = {'commit': 'abc', 'date': 'today',
+           'results': [result('ejscreen', 1000, timing)]}
+    new = {'results': [result('ejscreen', 1000, timing._replace(seconds=1.)),
+                       result('usgs', 1000, timing)]}  # yapf: disable
+
+    lines = compare(old, new)
+    assert len(lines) == 3
+    assert lines[0] == 'Compared with abc (today)'
+    assert lines[2].split() == ['ejscreen', '1,000', '1,000', '+100.0%',
+                                '100.0', '+0.0%']  # yapf: disable
+
+
+# --------------------------------------------------
+def test_benches() -> None:
+    """ Test each benchmark's script and inputs are there """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for bench in BENCHES:
+            try:
+                data = generate(bench.dataset, 10, tmp)
+            except ImportError:
+                continue  # No "shapefile" for the grid
+
+            cmd = bench.cmd(data, tmp)
+            assert os.path.isfile(cmd[1]), cmd[1]
+            assert all(
+                os.path.exists(arg) for arg in cmd[2:]
+                if arg.startswith(data) and not arg.endswith('grid'))
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -6,13 +6,16 @@ Purpose: Load the Central Scrutinizer's MySQL database
 """
 
 import argparse
-import csv
 import os
 import sys
 from scrutinizer import database, Location, LocationType, Measurement, \
     Variable, Medium, Source
 from typing import NamedTuple, List, TextIO
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType  # noqa: E402
+from scrutinizer_record import read_records  # noqa: E402
+
 
 class Args(NamedTuple):
     file: List[TextIO]
@@ -41,8 +44,8 @@ def get_args():
     parser.add_argument('file',
                         metavar='FILE',
                         nargs='+',
-                        type=argparse.FileType('rt'),
-                        help='Input file(s)')
+                        type=FileType('rt'),
+                        help='Input file(s) (CSV or Parquet)')
 
     args = parser.parse_args()
 
@@ -67,7 +70,7 @@ def main():
 def process(fh, db):
     """Put the data into the db"""
 
-    reader = csv.DictReader(fh, delimiter=',')
+    reader = read_records(fh)
     num = 0
     for rec in map(lambda r: Record(**r), reader):
         value = None
@@ -8,13 +8,17 @@ Purpose: Load CSM data into SQLite
 import argparse
 import csv
 import os
-import dateparser
 import datetime
 import re
 import sqlite
+import sys
 from pprint import pprint
 from typing import Dict, List, Tuple, NamedTuple, Optional, TextIO
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType, plain_name  # noqa: E402
+from dates import parse_date  # noqa: E402
+
 STATION_LOCATION = {
     'ABOVE_RUSSEL': (39.764606, -105.446683),
     'CC_MAIN_ABOVE_NFCC': (39.740397, -105.411517),
@@ -51,14 +55,14 @@ def get_args() -> Args:
     parser.add_argument('file',
                         nargs='+',
                         metavar='FILE',
-                        type=argparse.FileType('r'),
+                        type=FileType('r'),
                         help='Input file(s)')
 
     parser.add_argument('-H',
                         '--headers',
                         help='Headers file',
                         metavar='FILE',
-                        type=argparse.FileType('r'),
+                        type=FileType('r'),
                         default=None)
 
     parser.add_argument('-d',
@@ -134,7 +138,7 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]], db: str,
             args: Args) -> int:
     """Process the file into Mongo (client)"""
 
-    _, ext = os.path.splitext(os.path.basename(fh.name))
+    _, ext = os.path.splitext(plain_name(os.path.basename(fh.name)))
     delimiter = ',' if ext == '.csv' else args.delimiter
     reader = csv.DictReader(fh, delimiter=delimiter)
     flds = reader.fieldnames
@@ -151,7 +155,7 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]], db: str,
             if fld.strip() == '':
                 continue
 
-            date = dateparser.parse(row['DATE'])
+            date = parse_date(row['DATE'])
             if not date:
                 continue
 
@@ -8,11 +8,15 @@ Purpose: Create input for Central Scrutinizer
 import argparse
 import csv
 import os
-import dateparser
 import datetime
-from collections import defaultdict
+import sys
 from typing import Dict, List, NamedTuple, Optional, TextIO
-from numpy import mean
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType  # noqa: E402
+from dates import parse_date  # noqa: E402
+from scrutinizer_record import (  # noqa: E402
+    ScrutinizerRecord, ScrutinizerWriter, get_writer)
 
 STATION_LOCATION = {
     'ABOVE_RUSSEL': (39.764606, -105.446683),
@@ -32,6 +36,57 @@ class Args(NamedTuple):
     outfile: TextIO
     medium: str
     source: str
+    grouped: bool
+    stats: bool
+
+
+class Replicates:
+    """ Running count/sum (and Welford variance) of replicate values """
+
+    __slots__ = ('n', 'total', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.
+        self.mean = 0.
+        self.m2 = 0.
+
+    def add(self, val: float) -> None:
+        """ Add a value """
+
+        self.n += 1
+        self.total += val
+        delta = val - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (val - self.mean)
+
+    def average(self) -> float:
+        """ Mean of the values (summed in order, like numpy.mean) """
+
+        return self.total / self.n
+
+    def variance(self) -> Optional[float]:
+        """ Sample variance, None for a single value """
+
+        return self.m2 / (self.n - 1) if self.n > 1 else None
+
+
+# --------------------------------------------------
+def test_replicates() -> None:
+    """Test Replicates"""
+
+    reps = Replicates()
+    for val in [2., 4., 4., 4., 5., 5., 7., 9.]:
+        reps.add(val)
+
+    assert reps.n == 8
+    assert reps.average() == 5.
+    assert abs(reps.variance() - 32 / 7) < 1e-12
+
+    one = Replicates()
+    one.add(3.)
+    assert one.average() == 3.
+    assert one.variance() is None
 
 
 # --------------------------------------------------
@@ -45,22 +100,22 @@ def get_args() -> Args:
     parser.add_argument('file',
                         nargs='+',
                         metavar='FILE',
-                        type=argparse.FileType('r'),
+                        type=FileType('r'),
                         help='Input file(s)')
 
     parser.add_argument('-H',
                         '--headers',
                         help='Headers file',
                         metavar='FILE',
-                        type=argparse.FileType('r'),
+                        type=FileType('r'),
                         default=None)
 
     parser.add_argument('-o',
                         '--outfile',
                         metavar='FILE',
-                        type=argparse.FileType('w'),
+                        type=FileType('w'),
                         default='scrutinizer.csv',
-                        help='Output file')
+                        help='Output file (Parquet if "*.parquet")')
 
     parser.add_argument('-m',
                         '--medium',
@@ -76,13 +131,26 @@ def get_args() -> Args:
                         default='CO School of Mines',
                         help='Data source')
 
+    parser.add_argument('-g',
+                        '--grouped',
+                        help='Input rows are grouped by station/date, '
+                        'write each group as soon as it ends',
+                        action='store_true')
+
+    parser.add_argument('-S',
+                        '--stats',
+                        help='Add "replicates" and "variance" columns',
+                        action='store_true')
+
     args = parser.parse_args()
 
     return Args(file=args.file,
                 headers=args.headers,
                 outfile=args.outfile,
                 medium=args.medium,
-                source=args.source)
+                source=args.source,
+                grouped=args.grouped,
+                stats=args.stats)
 
 
 # --------------------------------------------------
@@ -92,11 +160,8 @@ def main() -> None:
     args = get_args()
 
     # Create writer for outfile
-    out_flds = [
-        'source', 'unit', 'location_name', 'location_type', 'variable_name',
-        'variable_desc', 'collected_on', 'value', 'medium'
-    ]
-    writer = csv.DictWriter(args.outfile, out_flds)
+    writer = get_writer(
+        args.outfile, ['replicates', 'variance'] if args.stats else [])
     writer.writeheader()
 
     num_written = 0
@@ -105,6 +170,7 @@ def main() -> None:
         print(f'{i:3}: {os.path.basename(fh.name)}')
         num_written += process(fh, headers, writer, args)
 
+    writer.close()
     print(f'Done, wrote {num_written:,}.')
 
 
@@ -141,7 +207,7 @@ def get_headers(fh: Optional[TextIO]) -> Dict[str, str]:
 
 # --------------------------------------------------
 def process(fh: TextIO, headers: Optional[Dict[str, str]],
-            writer: csv.DictWriter, args: Args) -> int:
+            writer: ScrutinizerWriter, args: Args) -> int:
     """
     Process the file into Mongo (client)
 
@@ -151,9 +217,45 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]],
 
     reader = csv.DictReader(fh, delimiter=',')
     flds = reader.fieldnames
-    values = defaultdict(list)  # to average replicates
+    values: Dict[tuple, Replicates] = {}  # to average replicates
+    finished = set()  # (station, date) groups already written
+    num_written = 0
+
+    # Write the averages for each variable, station, and date
+    def write():
+        nonlocal num_written
+
+        for key, replicates in values.items():
+            fld, station, date = key
+
+            # Maybe convert "ACENTR" -> "Ephemeroptera Baetidae Acentrella"
+            variable = headers.get(fld.upper(), fld) if headers else fld
+
+            # Take the average of the values
+            val = replicates.average()
+            print(f'{fld} {station} {date} => {val}')
+
+            rec = ScrutinizerRecord(source=args.source,
+                                    unit='',
+                                    location_name=station,
+                                    location_type='station',
+                                    variable_name=fld,
+                                    variable_desc=variable,
+                                    collected_on=date,
+                                    medium=args.medium,
+                                    value=val)
+
+            if args.stats:
+                variance = replicates.variance()
+                rec += (replicates.n, '' if variance is None else variance)
+
+            writer.writerow(rec)
+            num_written += 1
+
+        values.clear()
 
     # Parse file into values for each variable, station, and date
+    group = None
     for i, row in enumerate(reader, start=1):
         # Base record has station/date
         station = get_station(row.get('STATION', ''))
@@ -162,6 +264,17 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]],
         if not all([date, station]):
             continue
 
+        if args.grouped and group != (station, date):
+            write()
+            if group:
+                finished.add(group)
+
+            group = (station, date)
+            if group in finished:
+                msg = (f'"{fh.name}" is not grouped by station/date, '
+                       f'"{station} {date}" seen again on row {i}')
+                raise Exception(msg)
+
         for fld in filter(lambda f: f != '', flds[5:]):
             raw_val = row[fld].strip()
             if raw_val == '':
@@ -172,39 +285,17 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]],
                 raw_val = raw_val[1:]
 
             # Try to convert value to float
-            val = None
             try:
                 val = float(raw_val)
             except Exception:
                 continue
 
-            if val is not None:
-                values[(fld, station, date)].append(val)
+            key = (fld, station, date)
+            if key not in values:
+                values[key] = Replicates()
+            values[key].add(val)
 
-    # Write the averages for each variable, station, and date
-    num_written = 0
-    for key, replicates in values.items():
-        fld, station, date = key
-
-        # Maybe convert "ACENTR" -> "Ephemeroptera Baetidae Acentrella spp."
-        variable = headers.get(fld.upper(), fld) if headers else fld
-
-        # Take the average of the values
-        val = mean(replicates)
-        print(f'{fld} {station} {date} => {val}')
-
-        writer.writerow({
-            'source': args.source,
-            'unit': '',
-            'location_name': station,
-            'location_type': 'station',
-            'variable_name': fld,
-            'variable_desc': variable,
-            'collected_on': date,
-            'value': val,
-            'medium': args.medium
-        })
-        num_written += 1
+    write()
 
     return num_written
 
@@ -260,7 +351,7 @@ def get_date(raw_date: str) -> Optional[str]:
 
     date = None
     if raw_date:
-        dp = dateparser.parse(raw_date)
+        dp = parse_date(raw_date)
         date = str(datetime.datetime.utcfromtimestamp(dp.timestamp()))
 
     return date
@@ -8,13 +8,17 @@ Purpose: Load CSM data into Mongo
 import argparse
 import csv
 import os
-import dateparser
 import datetime
 import re
-from pymongo import MongoClient, GEO2D
+import sys
+from pymongo import MongoClient, GEO2D, UpdateOne
 from pprint import pprint
 from typing import Dict, List, Tuple, NamedTuple, Optional, TextIO
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType, open_file, plain_name  # noqa: E402
+from dates import parse_date  # noqa: E402
+
 STATION_LOCATION = {
     'ABOVE_RUSSEL': (39.764606, -105.446683),
     'CC_MAIN_ABOVE_NFCC': (39.740397, -105.411517),
@@ -31,6 +35,12 @@ STAITION_ALIAS = {
     'USGS_GAUGE_STATION': ['GUAGE'],
 }
 
+# Alias (or name) => station name
+STATION_NAME = {
+    alias: name
+    for name, aliases in STAITION_ALIAS.items() for alias in [name] + aliases
+}
+
 
 class Args(NamedTuple):
     file: List[TextIO]
@@ -38,6 +48,7 @@ class Args(NamedTuple):
     mongo_uri: str
     mongo_db: str
     delimiter: str
+    batch_size: int
 
 
 # --------------------------------------------------
@@ -51,7 +62,7 @@ def get_args() -> Args:
     parser.add_argument('file',
                         nargs='+',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         help='Input file(s)')
 
     parser.add_argument('-H',
@@ -82,13 +93,23 @@ def get_args() -> Args:
                         default='\t',
                         help='Field delimiter')
 
+    parser.add_argument('-b',
+                        '--batch_size',
+                        metavar='int',
+                        type=int,
+                        default=1000,
+                        help='Number of upserts to send at once')
+
     args = parser.parse_args()
 
+    if args.batch_size < 1:
+        parser.error(f'--batch_size "{args.batch_size}" must be > 0')
+
     if args.headers and os.path.isfile(args.headers):
-        args.headers = open(args.headers, encoding='utf-8-sig')
+        args.headers = open_file(args.headers, encoding='utf-8-sig')
 
     return Args(args.file, args.headers, args.mongo_uri, args.db,
-                args.delimiter)
+                args.delimiter, args.batch_size)
 
 
 # --------------------------------------------------
@@ -145,7 +166,7 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]], db: str,
             args: Args) -> int:
     """Process the file into Mongo (client)"""
 
-    _, ext = os.path.splitext(os.path.basename(fh.name))
+    _, ext = os.path.splitext(plain_name(os.path.basename(fh.name)))
     delimiter = ',' if ext == '.csv' else args.delimiter
     reader = csv.DictReader(fh, delimiter=delimiter)
     flds = reader.fieldnames
@@ -154,36 +175,37 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]], db: str,
 
     coll.create_index([("location", GEO2D)])
 
-    for i, row in enumerate(reader, start=1):
-        if not row.get('STREAM'):
-            continue
+    # The taxa columns and their measurement names are the same for each row
+    measurements = [(fld, headers.get(fld.upper(), fld) if headers else fld)
+                    for fld in flds[5:-8] if fld.strip() != '']
 
-        for fld in flds[5:-8]:
-            if fld.strip() == '':
-                continue
+    # Upserts keyed on the base record, a later value for the same
+    # station/date/measurement replaces an earlier one in the batch
+    batch = {}
 
-            date = dateparser.parse(row['DATE'])
-            if not date:
-                continue
+    def flush():
+        if batch:
+            coll.bulk_write(list(batch.values()), ordered=False)
+            batch.clear()
 
-            measurement = headers.get(fld.upper(), fld) if headers else fld
+    for i, row in enumerate(reader, start=1):
+        if not row.get('STREAM'):
+            continue
 
-            # Handle aliases, misspelling
-            # Covert spaces and dashes to underscores
-            station = row['STATION'].strip().upper().replace(' ', '_')
-            for name, aliases in STAITION_ALIAS.items():
-                if any(map(lambda s: station == s, [name] + aliases)):
-                    station = name
+        date = parse_date(row['DATE'])
+        if not date:
+            continue
 
-            # Base record has station/date
-            date = datetime.datetime.utcfromtimestamp(date.timestamp())
+        # Base record has station/date
+        date = datetime.datetime.utcfromtimestamp(date.timestamp())
 
-            rec = {
-                'station': station,
-                'collection_date': date,
-                'measurement': measurement,
-            }
+        # Handle aliases, misspelling
+        # Covert spaces and dashes to underscores
+        station = row['STATION'].strip().upper().replace(' ', '_')
+        station = STATION_NAME.get(station, station)
+        location = STATION_LOCATION.get(station)
 
+        for fld, measurement in measurements:
             # Remove leading "="?
             val = row[fld].strip()
             if val.startswith('='):
@@ -197,28 +219,93 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]], db: str,
 
             print(f'{i:4}: {fld} => {val}')
 
-            # Look for the base record w/o the value
-            exists = coll.find_one(rec)
-
-            # If we need to insert, add the value, maybe float or str
-            if exists:
-                coll.update_one(
-                    rec, {
-                        "$set": {
-                            'val': val,
-                            'location': STATION_LOCATION.get(station)
-                        }
-                    })
-            else:
-                rec['val'] = val
-                rec['location'] = STATION_LOCATION.get(station)
-                coll.insert_one(rec)
-
+            # Insert the base record or set the value on the existing one
+            rec = {
+                'station': station,
+                'collection_date': date,
+                'measurement': measurement,
+            }
+            batch[(station, date, measurement)] = UpdateOne(
+                rec, {'$set': {
+                    'val': val,
+                    'location': location
+                }},
+                upsert=True)
             num_inserted += 1
 
+            if len(batch) >= args.batch_size:
+                flush()
+
+    flush()
+
     return num_inserted
 
 
+# --------------------------------------------------
+def test_process() -> None:
+    """ Test process batches the upserts """
+
+    import io
+
+    class Collection:
+        """ Records the bulk writes """
+
+        def __init__(self):
+            self.writes = []
+
+        def create_index(self, keys):
+            pass
+
+        def bulk_write(self, ops, ordered=True):
+            self.writes.append(ops)
+
+    base = ['STREAM', 'DATE', 'STATION', 'REP', '#GRIDS']
+    taxa = ['TAXON1', 'TAXON2', 'TAXON3']
+    fh = io.StringIO('\n'.join(
+        map(','.join, [
+            base + taxa + [f'X{n}' for n in range(8)],
+            ['NFCC', '10/28/16', 'RIVERA', '1', '5', '1', '2', 'x'] + [''] * 8,
+            ['NFCC', '10/28/16', 'Rivera', '2', '5', '=3', '', ''] + [''] * 8,
+            ['', '10/28/16', 'RIVERA', '3', '5', '9', '9', '9'] + [''] * 8,
+            ['NFCC', '11/4/16', 'GUAGE', '1', '5', '4', '5', '6'] + [''] * 8,
+        ])))
+    fh.name = 'benthic.csv'
+
+    coll = Collection()
+    args = Args(file=[], headers=None, mongo_uri='', mongo_db='',
+                delimiter='\t', batch_size=3)
+    headers = {'TAXON1': 'Ephemeroptera Baetidae Baetis'}
+    assert process(fh, headers, {'csm': coll}, args) == 6
+
+    def upsert(station, date, measurement, val):
+        date = datetime.datetime.utcfromtimestamp(
+            parse_date(date).timestamp())
+        return UpdateOne(
+            {
+                'station': station,
+                'collection_date': date,
+                'measurement': measurement
+            }, {'$set': {
+                'val': val,
+                'location': STATION_LOCATION[station]
+            }},
+            upsert=True)
+
+    # The 2nd replicate replaces the 1st value, a full batch is written,
+    # then the rest
+    assert coll.writes == [
+        [
+            upsert('RIVIERA', '10/28/16', headers['TAXON1'], 3.),
+            upsert('RIVIERA', '10/28/16', 'TAXON2', 2.),
+            upsert('USGS_GAUGE_STATION', '11/4/16', headers['TAXON1'], 4.),
+        ],
+        [
+            upsert('USGS_GAUGE_STATION', '11/4/16', 'TAXON2', 5.),
+            upsert('USGS_GAUGE_STATION', '11/4/16', 'TAXON3', 6.),
+        ],
+    ]
+
+
 # --------------------------------------------------
 if __name__ == '__main__':
     main()
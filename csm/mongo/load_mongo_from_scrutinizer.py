@@ -5,15 +5,19 @@ Purpose: Load CSM scrutinizer data directory into Mongo (no MySQL)
 """
 
 import argparse
-import csv
 import os
-import dateparser
 import datetime
 import re
 import pymongo
+import sys
 from pprint import pprint
 from typing import Dict, List, Tuple, NamedTuple, Optional, TextIO
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType, plain_name  # noqa: E402
+from scrutinizer_record import read_records  # noqa: E402
+from dates import parse_date  # noqa: E402
+
 STATION_LOCATION = {
     'ABOVE_RUSSEL': (39.764606, -105.446683),
     'CC_MAIN_ABOVE_NFCC': (39.740397, -105.411517),
@@ -48,8 +52,8 @@ def get_args() -> Args:
 
     parser.add_argument('file',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
-                        help='Input file')
+                        type=FileType('rt'),
+                        help='Input file (CSV or Parquet)')
 
     parser.add_argument('-m',
                         '--mongo_uri',
@@ -94,10 +98,10 @@ def main() -> None:
 def process(fh: TextIO, db: pymongo.database.Database, collection_name: str) -> int:
     """Process the file into Mongo (client)"""
 
-    _, ext = os.path.splitext(os.path.basename(fh.name))
+    # The extension under any compression, e.g., "foo.csv.gz"
+    _, ext = os.path.splitext(plain_name(os.path.basename(fh.name)))
     delimiter = ',' if ext == '.csv' else '\t'
-    reader = csv.DictReader(fh, delimiter=delimiter)
-    flds = reader.fieldnames
+    reader = read_records(fh, delimiter=delimiter)
     num_inserted = 0
 
     collection = db[collection_name]
@@ -118,7 +122,7 @@ def process(fh: TextIO, db: pymongo.database.Database, collection_name: str) ->
             continue
 
         # Base record has station/date
-        date = dateparser.parse(row.get('collected_on'))
+        date = parse_date(row.get('collected_on'))
         if not date:
             continue
 
@@ -6,15 +6,19 @@ Purpose: Load CSM Scrutinizer-formatted data into Mongo
 """
 
 import argparse
-import csv
 import os
-import dateparser
 import datetime
 import re
+import sys
 from pymongo import MongoClient, GEO2D
 from pprint import pprint
 from typing import Dict, List, Tuple, NamedTuple, Optional, TextIO
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType, plain_name  # noqa: E402
+from scrutinizer_record import read_records  # noqa: E402
+from dates import parse_date  # noqa: E402
+
 STATION_LOCATION = {
     'ABOVE_RUSSEL': (39.764606, -105.446683),
     'CC_MAIN_ABOVE_NFCC': (39.740397, -105.411517),
@@ -45,8 +49,8 @@ def get_args() -> Args:
     parser.add_argument('file',
                         nargs='+',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
-                        help='Input file(s)')
+                        type=FileType('rt'),
+                        help='Input file(s) (CSV or Parquet)')
 
     parser.add_argument('-m',
                         '--mongo_uri',
@@ -94,10 +98,10 @@ def main() -> None:
 def process(fh: TextIO, db: str, args: Args) -> int:
     """Process the file into Mongo (client)"""
 
-    _, ext = os.path.splitext(os.path.basename(fh.name))
+    # The extension under any compression, e.g., "foo.csv.gz"
+    _, ext = os.path.splitext(plain_name(os.path.basename(fh.name)))
     delimiter = ',' if ext == '.csv' else args.delimiter
-    reader = csv.DictReader(fh, delimiter=delimiter)
-    flds = reader.fieldnames
+    reader = read_records(fh, delimiter=delimiter)
     coll = db[args.mongo_collection]
     num_inserted = 0
 
@@ -106,7 +110,7 @@ def process(fh: TextIO, db: str, args: Args) -> int:
     for i, rec in enumerate(reader, start=1):
         # pprint(rec)
         value = float(rec.get('value'))
-        dp = dateparser.parse(rec.get('collected_on'))
+        dp = parse_date(rec.get('collected_on'))
         date = str(datetime.datetime.utcfromtimestamp(dp.timestamp()))
         station = rec.get('location_name')
         lat_lon = STATION_LOCATION.get(station)
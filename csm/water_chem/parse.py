@@ -9,10 +9,13 @@ import argparse
 import os
 import re
 import sys
-import io
 from itertools import chain, starmap
-from collections import defaultdict, Counter
-from typing import Dict, List, TextIO, NamedTuple
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, \
+    NamedTuple, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType, plain_name  # noqa: E402
 
 
 class Args(NamedTuple):
@@ -31,7 +34,7 @@ def get_args() -> Args:
     parser.add_argument('file',
                         metavar='FILE',
                         nargs='+',
-                        type=argparse.FileType('rt', encoding='utf-8'),
+                        type=FileType('rt', encoding='utf-8'),
                         help='Input file')
 
     parser.add_argument('-o',
@@ -58,45 +61,106 @@ def main() -> None:
     for i, file in enumerate(args.file, start=1):
         print(f'{i:3}: {file.name}')
 
-        sections = find_sections(file)
-        basename = os.path.basename(file.name)
+        basename = plain_name(os.path.basename(file.name))
         root, _ = os.path.splitext(basename)
 
-        icp = 'icp_aes'
-        if icp not in sections:
-            print(f'File "{file.name}" missing section "{icp}"!',
+        if not parse_file(file, root, args.outdir):
+            print(f'File "{file.name}" missing section "icp_aes"!',
                   file=sys.stderr)
-            continue
 
-        icp_aes = sections[icp]
-        master_header = icp_aes.pop(0)
-        sections[icp] = icp_aes
+    print(f'Done, see output in "{args.outdir}".')
 
-        for section, raw in sections.items():
-            hdrs, data = parse_section(section, master_header, raw)
-            _ = write_out(data, hdrs, args.outdir, f'{root}_{section}.csv')
 
-    print(f'Done, see output in "{args.outdir}".')
+# --------------------------------------------------
+def parse_file(fh: TextIO, root: str, out_dir: str) -> bool:
+    """
+    Stream the sections of one sheet to "{root}_{section}.csv" files.
+    Returns False (and writes nothing) when there is no "icp_aes" section.
+    """
+
+    written = set()
+    try:
+        for section, hdrs, data in parse_sheet(fh):
+            if write_out(data,
+                         hdrs,
+                         out_dir,
+                         f'{root}_{section}.csv',
+                         append=section in written):
+                written.add(section)
+    except MissingSection:
+        return False
+
+    return True
 
 
 # --------------------------------------------------
-def write_out(data: List[dict], headers: List[str], out_dir: str,
-              filename: str) -> str:
-    """ Write data to file """
+class MissingSection(Exception):
+    """ A sheet has no "icp_aes" section """
 
-    if not data:
-        return
+
+# --------------------------------------------------
+def parse_sheet(
+        fh: Iterable[str]
+) -> Iterator[Tuple[str, List[str], Iterator[Dict[str, str]]]]:
+    """
+    Stream (section, headers, records) for each section of one sheet,
+    the records must be used before asking for the next section.
+    The first line of "icp_aes" is the master header for every section,
+    so anything before it is held until it is found. Raises
+    MissingSection (having yielded nothing) when there is no "icp_aes".
+    """
+
+    master_header: Optional[str] = None
+    pending: List[Tuple[str, str, List[str]]] = []
+    headers: Dict[str, List[str]] = {}
+
+    def parse(section, header, rows):
+        hdrs, data = parse_section(section, master_header, header, rows,
+                                   headers.get(section))
+        headers[section] = hdrs
+        return section, hdrs, data
+
+    for section, header, rows in scan_sections(read_lines(fh)):
+        if master_header is None and section == 'icp_aes':
+            master_header, header = header, next(rows, '')
+
+            for args in pending:
+                yield parse(*args)
+            pending = []
+
+        if master_header is None:
+            pending.append((section, header, list(rows)))
+        else:
+            yield parse(section, header, rows)
+
+    if master_header is None:
+        raise MissingSection()
+
+
+# --------------------------------------------------
+def write_out(data: Iterable[dict],
+              headers: List[str],
+              out_dir: str,
+              filename: str,
+              append: bool = False) -> Optional[str]:
+    """ Write data to file, nothing is created when there is no data """
 
     # Get rid of the empty fields
     headers = list(filter(lambda s: len(s) > 0, headers))
 
     out_file = os.path.join(out_dir, filename)
-    fh = open(out_file, 'wt')
-    fh.write(','.join(headers) + '\n')
-
+    fh = None
     for rec in data:
+        if fh is None:
+            fh = open(out_file, 'at' if append else 'wt')
+            if not append:
+                fh.write(','.join(headers) + '\n')
+
         fh.write(','.join(map(lambda f: rec.get(f, ''), headers)) + '\n')
 
+    if fh is None:
+        return None
+
     fh.close()
 
     return out_file
@@ -106,14 +170,7 @@ def write_out(data: List[dict], headers: List[str], out_dir: str,
 def expand_master_header(hdr: str) -> List[str]:
     """ Expand the master header """
 
-    flds = re.split('([^,]+)', hdr[2:])[1:]
-
-    new_flds = []
-    while flds:
-        name, commas = flds.pop(0), flds.pop(0)
-        new_flds.append(replicate(name, len(commas)))
-
-    return list(chain.from_iterable(new_flds))
+    return repeater(hdr[2:].split(','))
 
 
 # --------------------------------------------------
@@ -147,25 +204,37 @@ def test_replicate() -> None:
 
 
 # --------------------------------------------------
-def parse_section(name: str, master_header: List[str],
-                  data: List[str]) -> (str, List[Dict[str, str]]):
-    """ Parse a section """
+def parse_section(
+    name: str,
+    master_header: str,
+    header: str,
+    data: Iterable[str],
+    headers: Optional[List[str]] = None
+) -> Tuple[List[str], Iterator[Dict[str, str]]]:
+    """
+    Parse a section, the records are generated lazily from "data".
+    Pass the "headers" from an earlier part of the same section to
+    continue it (its "header" line is then just data).
+    """
     def split(line):
         return line.split(',')
 
-    master_header = split(master_header)
-    this_header = '' if name == 'field_data' else split(data.pop(0))
+    if headers is None:
+        master_header = split(master_header)
+        this_header = '' if name == 'field_data' else split(header)
 
-    # print(f'name "{name}"')
-    # print(f'master_header "{master_header}"')
-    # print(f'header "{this_header}"')
+        # print(f'name "{name}"')
+        # print(f'master_header "{master_header}"')
+        # print(f'header "{this_header}"')
 
-    # start off with the 1st 2 flds
-    headers = this_header[:2] + unique_names(
-        merge_headers(repeater(master_header[2:]),
-                      this_header[2:])) if this_header else master_header
-    headers[0] = 'measurement'
-    headers = list(map(normalize, headers))
+        # start off with the 1st 2 flds
+        headers = this_header[:2] + unique_names(
+            merge_headers(repeater(master_header[2:]),
+                          this_header[2:])) if this_header else master_header
+        headers[0] = 'measurement'
+        headers = list(map(normalize, headers))
+    elif header:
+        data = chain([header], data)
 
     def num_col(i, val):
         if i >= 2 and val != 'BDL':
@@ -175,18 +244,48 @@ def parse_section(name: str, master_header: List[str],
                 val = ''
         return val
 
-    ret = []
-    prev_measurement = ''
-    for row in map(split, data):
-        # Have to carry down "pH" for this!
-        if name == 'field_data' and row[0] == '':
-            row[0] = prev_measurement
+    def records():
+        prev_measurement = ''
+        for row in map(split, data):
+            # Have to carry down "pH" for this!
+            if name == 'field_data' and row[0] == '':
+                row[0] = prev_measurement
 
-        row = list(starmap(num_col, enumerate(row)))
-        ret.append(dict(filter(all, zip(headers, row))))
-        prev_measurement = row[0]
+            row = list(starmap(num_col, enumerate(row)))
+            yield dict(filter(all, zip(headers, row)))
+            prev_measurement = row[0]
 
-    return headers, ret
+    return headers, records()
+
+
+# --------------------------------------------------
+def test_parse_section() -> None:
+    """ Test """
+
+    master = ',,BNT,,ATP,'
+    hdrs, data = parse_section('ic', master, 'Analyte,DL,RA,FA,RA,FA',
+                               iter(['Cl,0.1,1,BDL,x,2']))
+    assert hdrs == [
+        'measurement', 'dl', 'bnt_ra', 'bnt_fa', 'atp_ra', 'atp_fa'
+    ]
+    assert list(data) == [{
+        'measurement': 'Cl',
+        'dl': '0.1',
+        'bnt_ra': '1.0',
+        'bnt_fa': 'BDL',
+        'atp_fa': '2.0'
+    }]
+
+    hdrs, data = parse_section('field_data', 'Date,,BNT', '',
+                               iter(['pH,,7', ',,8']))
+    assert hdrs == ['measurement', '', 'bnt']
+    assert list(data) == [{
+        'measurement': 'pH',
+        'bnt': '7.0'
+    }, {
+        'measurement': 'pH',
+        'bnt': '8.0'
+    }]
 
 
 # --------------------------------------------------
@@ -265,37 +364,106 @@ def test_repeater() -> None:
 
 
 # --------------------------------------------------
-def reader(fh):
-    """ Handle BOM (byte order mark) in Excel output """
+def read_lines(fh: Iterable[str]) -> Iterator[str]:
+    """ Strip lines, handle BOM (byte order mark) in Excel output """
 
     BOM = "\ufeff"
-    text = fh.read()
-    if text.startswith(BOM):
-        text = text[1:]
+    lines = map(str.rstrip, fh)
+    first = next(lines, None)
+    if first is None:
+        return
 
-    return io.StringIO(text)
+    yield first[1:] if first.startswith(BOM) else first
+    yield from lines
 
 
 # --------------------------------------------------
-def find_sections(fh: TextIO) -> Dict[str, List[str]]:
-    """ Find the major sections: ICP-AES, IC, Field Data, DOC/TOC """
+SECTIONS = {
+    'ICP-AES': 'icp_aes',
+    'IC': 'ic',
+    'Field Data': 'field_data',
+    'DOC/TOC': 'doc_toc'
+}
 
-    sections = defaultdict(list)
-    header = re.compile("^(ICP-AES|IC|Field Data|DOC/TOC),{1,}$")
-    all_commas = re.compile("^,{1,}$")
-    last_header = ''
 
-    for line in map(str.rstrip, reader(fh)):
-        hdr = header.match(line)
-        empty_line = all_commas.match(line)
+def section_name(line: str) -> Optional[str]:
+    """ Name of the section a line starts, if any """
 
-        if hdr:
-            group = normalize(hdr.group(1))
-            last_header = group
-        elif last_header and not empty_line:
-            sections[last_header].append(line)
+    name, sep, rest = line.partition(',')
+    if sep and name in SECTIONS and not rest.strip(','):
+        return SECTIONS[name]
+
+    return None
+
+
+# --------------------------------------------------
+def scan_sections(
+        lines: Iterable[str]) -> Iterator[Tuple[str, str, Iterator[str]]]:
+    """
+    Stream the major sections (ICP-AES, IC, Field Data, DOC/TOC) as
+    (section, header, rows). "header" is the first line of the section
+    except for "field_data" and a section seen earlier in the file (which
+    have no header line). Each "rows" iterator must be used (or dropped)
+    before asking for the next section.
+    """
+
+    lines = iter(lines)
+    seen = set()
+    next_section = None
+
+    # Skip anything before the first section
+    for line in lines:
+        if next_section := section_name(line):
+            break
+
+    def rows():
+        nonlocal next_section
+        next_section = None
+        for line in lines:
+            if name := section_name(line):
+                next_section = name
+                return
+
+            # Lines of all commas are spacers
+            if not line or line.strip(','):
+                yield line
+
+    while next_section:
+        section = next_section
+        data = rows()
+
+        header = ''
+        if section != 'field_data' and section not in seen:
+            header = next(data, '')
+        seen.add(section)
+
+        yield section, header, data
+
+        # Consume whatever the caller left to find the next section
+        for _ in data:
+            pass
+
+
+# --------------------------------------------------
+def test_scan_sections() -> None:
+    """ Test """
+
+    lines = [
+        'junk', 'ICP-AES,,,', ',,Ref1,,', 'Analyte,DL,FA,RA', 'Al,1,2,3',
+        ',,,', 'Field Data,,,,', 'pH,,7,8', 'IC,', 'Analyte,DL,RA',
+        'ICP-AES,,', 'Fe,1,2,3'
+    ]
+
+    assert [(s, h, list(r)) for s, h, r in scan_sections(lines)] == [
+        ('icp_aes', ',,Ref1,,', ['Analyte,DL,FA,RA', 'Al,1,2,3']),
+        ('field_data', '', ['pH,,7,8']),
+        ('ic', 'Analyte,DL,RA', []),
+        ('icp_aes', '', ['Fe,1,2,3']),
+    ]
 
-    return sections
+    # Unread rows are skipped
+    assert [s for s, _, _ in scan_sections(lines)
+            ] == ['icp_aes', 'field_data', 'ic', 'icp_aes']
 
 
 # --------------------------------------------------
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Parse water chemistry sheets straight into Central Scrutinizer input
+"""
+
+import argparse
+import csv
+import io
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, NamedTuple, Tuple
+
+import parse
+import to_scrutinizer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import open_file, plain_name  # noqa: E402
+from scrutinizer_record import ParquetWriter, get_writer  # noqa: E402
+
+
+class Args(NamedTuple):
+    file: List[str]
+    outfile: str
+    source: str
+    jobs: int
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Parse water chemistry sheets into scrutinizer input',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('file',
+                        nargs='+',
+                        metavar='FILE',
+                        type=str,
+                        help='Input sheet(s)')
+
+    parser.add_argument('-o',
+                        '--outfile',
+                        metavar='FILE',
+                        type=str,
+                        default='scrutinizer.csv.gz',
+                        help='Output file (compressed if ending in '
+                        '".gz," ".bz2" or ".zst," Parquet if "*.parquet")')
+
+    parser.add_argument('-s',
+                        '--source',
+                        metavar='source',
+                        type=str,
+                        default='CO School of Mines',
+                        help='Data source')
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        help='Number of processes parsing sheets',
+                        metavar='int',
+                        type=int,
+                        default=os.cpu_count() or 1)
+
+    args = parser.parse_args()
+
+    if bad := list(filter(lambda f: not os.path.isfile(f), args.file)):
+        parser.error('The following are not files:\n{}'.format("\n".join(bad)))
+
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be greater than 0')
+
+    return Args(file=args.file,
+                outfile=args.outfile,
+                source=args.source,
+                jobs=args.jobs)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """Make a jazz noise here"""
+
+    args = get_args()
+    convert = partial(convert_sheet, source=args.source)
+    num_written = 0
+
+    with open_file(args.outfile, 'wt') as out_fh, \
+            ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        writer = get_writer(out_fh)
+        writer.writeheader()
+
+        # Results come back in the order of the input files
+        results = zip(args.file, executor.map(convert, args.file))
+        for i, (file, (text, num, error)) in enumerate(results, start=1):
+            print(f'{i:3}: {file}' + (f' ({error})' if error else ''))
+            if isinstance(writer, ParquetWriter):
+                writer.writerows(csv.reader(io.StringIO(text)))
+            else:
+                out_fh.write(text)
+            num_written += num
+
+        writer.close()
+
+    print(f'Done, wrote {num_written:,} to "{args.outfile}".')
+
+
+# --------------------------------------------------
+def convert_sheet(file: str, source: str) -> Tuple[str, int, str]:
+    """
+    Parse one sheet and run each section through its converter, return
+    the CSV text (no header), the number of records and any error.
+    Sections are written in name order to match converting the
+    "{root}_{section}.csv" files from parse.py in sorted order.
+    """
+
+    root = os.path.splitext(plain_name(os.path.basename(file)))[0]
+    match = re.match(r'(\d{4})(\d{2})(\d{2})$', root)
+    if not match:
+        return '', 0, f'unexpected file name "{root}"'
+
+    collected_on = '-'.join(match.groups())
+    args = to_scrutinizer.Args(file=[], outfile=None, source=source)
+    dispatch = to_scrutinizer.get_dispatch()
+    sections = {}
+    num_written = 0
+
+    try:
+        with open_file(file, 'rt', encoding='utf-8') as fh:
+            for section, hdrs, data in parse.parse_sheet(fh):
+                flds = list(filter(None, hdrs))
+                rows = map(lambda rec: {f: rec.get(f, '') for f in flds},
+                           data)
+
+                out = sections.setdefault(section, io.StringIO())
+                writer = to_scrutinizer.ScrutinizerWriter(out)
+                num_written += dispatch[section](rows, flds, collected_on,
+                                                 writer, args)
+    except parse.MissingSection:
+        return '', 0, 'missing section "icp_aes"'
+
+    return ''.join(sections[s].getvalue()
+                   for s in sorted(sections)), num_written, ''
+
+
+# --------------------------------------------------
+def test_convert_sheet() -> None:
+    """Test convert_sheet"""
+
+    import tempfile
+
+    lines = [
+        'ICP-AES,,,,', ',,ANT,,RAP,', 'Analyte Name,DL (mg/l),RA,FA,RA,FA',
+        'Fe,0.1,1,BDL,x,2', 'Field Data,,,,', 'pH,,7,8', ',,9,'
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, '20200102.csv')
+        with open(file, 'wt') as fh:
+            fh.write('\n'.join(lines) + '\n')
+
+        text, num, error = convert_sheet(file, 'test')
+        assert error == ''
+        assert num == 8
+        rows = list(csv.reader(io.StringIO(text)))
+        assert rows[0] == [
+            'csm_field_data', '', 'ant', 'station', 'ph', 'ph', '2020-01-02',
+            'water', '7.0'
+        ]
+        assert rows[2][-1] == '9.0'
+        assert [r[0] for r in rows
+                ] == ['csm_field_data'] * 4 + ['csm_icp_aes'] * 4
+
+        bad = os.path.join(tmp, 'foo.csv')
+        with open(bad, 'wt') as fh:
+            fh.write('\n'.join(lines[4:]))
+        assert convert_sheet(bad, 'test') == ('', 0,
+                                              'unexpected file name "foo"')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
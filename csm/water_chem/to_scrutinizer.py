@@ -11,10 +11,16 @@ import os
 import dateparser
 import datetime
 import re
+import sys
 from collections import defaultdict
-from typing import Dict, List, NamedTuple, Optional, TextIO
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, TextIO
 from numpy import mean
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType, plain_name  # noqa: E402
+from scrutinizer_record import (  # noqa: E402
+    ScrutinizerRecord, ScrutinizerWriter, get_writer)
+
 STATION_LOCATION = {
     'ABOVE_RUSSEL': (39.764606, -105.446683),
     'CC_MAIN_ABOVE_NFCC': (39.740397, -105.411517),
@@ -44,15 +50,15 @@ def get_args() -> Args:
     parser.add_argument('file',
                         nargs='+',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         help='Input file(s)')
 
     parser.add_argument('-o',
                         '--outfile',
                         metavar='FILE',
-                        type=argparse.FileType('wt'),
+                        type=FileType('wt'),
                         default='scrutinizer.csv',
-                        help='Output file')
+                        help='Output file (Parquet if "*.parquet")')
 
     parser.add_argument('-s',
                         '--source',
@@ -73,44 +79,48 @@ def main() -> None:
     args = get_args()
 
     # Create writer for outfile
-    out_flds = [
-        'source', 'unit', 'location_name', 'location_type', 'variable_name',
-        'variable_desc', 'collected_on', 'value', 'medium'
-    ]
-    writer = csv.DictWriter(args.outfile, out_flds)
+    writer = get_writer(args.outfile)
     writer.writeheader()
-
-    dispatch = {
-        'field_data': process_field_data,
-        'icp_aes': process_icp_aes,
-        'doc_toc': process_doc_toc,
-        'ic': process_ic,
-    }
+    dispatch = get_dispatch()
 
     num_written = 0
     for i, fh in enumerate(args.file, start=1):
-        basename = os.path.splitext(os.path.basename(fh.name))[0]
+        basename = os.path.splitext(plain_name(os.path.basename(fh.name)))[0]
         if match := re.match('(\d{4})(\d{2})(\d{2})_(.+)', basename):
             year, month, day, data_type = match.groups()
             collected_on = '-'.join([year, month, day])
             print(f'{i:3}: {basename} -> {data_type}')
             if f := dispatch.get(data_type):
-                num_written += f(fh, collected_on, writer, args)
+                reader = csv.DictReader(fh, delimiter=',')
+                num_written += f(reader, reader.fieldnames, collected_on,
+                                 writer, args)
             else:
                 print(f'No dispatch for data type "{data_type}"')
         else:
             print(f'Unexpected file name "{basename}"')
 
+    writer.close()
     print(f'Done, wrote {num_written:,}.')
 
 
 # --------------------------------------------------
-def process_field_data(fh: TextIO, collected_on: str, writer: csv.DictWriter,
+def get_dispatch() -> Dict[str, Callable[..., int]]:
+    """ Converters for each type of section """
+
+    return {
+        'field_data': process_field_data,
+        'icp_aes': process_icp_aes,
+        'doc_toc': process_doc_toc,
+        'ic': process_ic,
+    }
+
+
+# --------------------------------------------------
+def process_field_data(reader: Iterable[Dict[str, str]], flds: List[str],
+                       collected_on: str, writer: ScrutinizerWriter,
                        args: Args) -> int:
-    """ Process the file into CSV """
+    """ Process the rows (with fieldnames "flds") into CSV """
 
-    reader = csv.DictReader(fh, delimiter=',')
-    flds = reader.fieldnames
     stations = 'ant arg railless rap rbp ref1 ref2 tp usgs'.split()
     num_written = 0
 
@@ -127,29 +137,27 @@ def process_field_data(fh: TextIO, collected_on: str, writer: csv.DictWriter,
 
         for station in stations:
             if station in row:
-                writer.writerow({
-                    'source': 'csm_field_data',
-                    'unit': unit,
-                    'location_name': station,
-                    'location_type': 'station',
-                    'variable_name': variable,
-                    'variable_desc': variable,
-                    'collected_on': collected_on,
-                    'value': row.get(station),
-                    'medium': 'water',
-                })
+                writer.writerow(
+                    ScrutinizerRecord(source='csm_field_data',
+                                      unit=unit,
+                                      location_name=station,
+                                      location_type='station',
+                                      variable_name=variable,
+                                      variable_desc=variable,
+                                      collected_on=collected_on,
+                                      medium='water',
+                                      value=row.get(station)))
                 num_written += 1
 
     return num_written
 
 
 # --------------------------------------------------
-def process_icp_aes(fh: TextIO, collected_on: str, writer: csv.DictWriter,
+def process_icp_aes(reader: Iterable[Dict[str, str]], flds: List[str],
+                    collected_on: str, writer: ScrutinizerWriter,
                     args: Args) -> int:
-    """ Process the file into CSV """
+    """ Process the rows (with fieldnames "flds") into CSV """
 
-    reader = csv.DictReader(fh, delimiter=',')
-    flds = reader.fieldnames
     num_written = 0
 
     # Parse file into values for each variable, station, and date
@@ -164,29 +172,27 @@ def process_icp_aes(fh: TextIO, collected_on: str, writer: csv.DictWriter,
             if fld in ('measurement', 'dl_mg_l'):
                 continue
 
-            writer.writerow({
-                'source': 'csm_icp_aes',
-                'unit': unit,
-                'location_name': fld,
-                'location_type': 'station',
-                'variable_name': variable,
-                'variable_desc': variable,
-                'collected_on': collected_on,
-                'value': row.get(fld),
-                'medium': 'water',
-            })
+            writer.writerow(
+                ScrutinizerRecord(source='csm_icp_aes',
+                                  unit=unit,
+                                  location_name=fld,
+                                  location_type='station',
+                                  variable_name=variable,
+                                  variable_desc=variable,
+                                  collected_on=collected_on,
+                                  medium='water',
+                                  value=row.get(fld)))
             num_written += 1
 
     return num_written
 
 
 # --------------------------------------------------
-def process_doc_toc(fh: TextIO, collected_on: str, writer: csv.DictWriter,
+def process_doc_toc(reader: Iterable[Dict[str, str]], flds: List[str],
+                    collected_on: str, writer: ScrutinizerWriter,
                     args: Args) -> int:
-    """ Process the file into CSV """
+    """ Process the rows (with fieldnames "flds") into CSV """
 
-    reader = csv.DictReader(fh, delimiter=',')
-    flds = reader.fieldnames
     num_written = 0
 
     # Parse file into values for each variable, station, and date
@@ -205,29 +211,27 @@ def process_doc_toc(fh: TextIO, collected_on: str, writer: csv.DictWriter,
             if fld == 'measurement':
                 continue
 
-            writer.writerow({
-                'source': 'csm_doc_toc',
-                'unit': unit,
-                'location_name': fld,
-                'location_type': 'station',
-                'variable_name': variable,
-                'variable_desc': variable,
-                'collected_on': collected_on,
-                'value': row.get(fld),
-                'medium': 'water',
-            })
+            writer.writerow(
+                ScrutinizerRecord(source='csm_doc_toc',
+                                  unit=unit,
+                                  location_name=fld,
+                                  location_type='station',
+                                  variable_name=variable,
+                                  variable_desc=variable,
+                                  collected_on=collected_on,
+                                  medium='water',
+                                  value=row.get(fld)))
             num_written += 1
 
     return num_written
 
 
 # --------------------------------------------------
-def process_ic(fh: TextIO, collected_on: str, writer: csv.DictWriter,
+def process_ic(reader: Iterable[Dict[str, str]], flds: List[str],
+               collected_on: str, writer: ScrutinizerWriter,
                args: Args) -> int:
-    """ Process the file into CSV """
+    """ Process the rows (with fieldnames "flds") into CSV """
 
-    reader = csv.DictReader(fh, delimiter=',')
-    flds = reader.fieldnames
     num_written = 0
 
     # Parse file into values for each variable, station, and date
@@ -242,17 +246,16 @@ def process_ic(fh: TextIO, collected_on: str, writer: csv.DictWriter,
             if fld == 'measurement':
                 continue
 
-            writer.writerow({
-                'source': 'csm_ic',
-                'unit': unit,
-                'location_name': fld,
-                'location_type': 'station',
-                'variable_name': variable,
-                'variable_desc': variable,
-                'collected_on': collected_on,
-                'value': row.get(fld),
-                'medium': 'water',
-            })
+            writer.writerow(
+                ScrutinizerRecord(source='csm_ic',
+                                  unit=unit,
+                                  location_name=fld,
+                                  location_type='station',
+                                  variable_name=variable,
+                                  variable_desc=variable,
+                                  collected_on=collected_on,
+                                  medium='water',
+                                  value=row.get(fld)))
             num_written += 1
 
     return num_written
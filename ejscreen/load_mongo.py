@@ -11,10 +11,14 @@ import os
 import dateparser
 import datetime
 import re
+import sys
 from pymongo import MongoClient, GEO2D
 from pprint import pprint
 from typing import Dict, List, Tuple, NamedTuple, Optional, TextIO
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+from compressed_io import FileType, plain_name  # noqa: E402
+
 
 class Args(NamedTuple):
     file: List[TextIO]
@@ -36,14 +40,14 @@ def get_args() -> Args:
     parser.add_argument('file',
                         nargs='+',
                         metavar='FILE',
-                        type=argparse.FileType('r'),
+                        type=FileType('r'),
                         help='Input file(s)')
 
     parser.add_argument('-H',
                         '--headers',
                         help='Headers file',
                         metavar='FILE',
-                        type=argparse.FileType('r'),
+                        type=FileType('r'),
                         default=None)
 
     parser.add_argument('-m',
@@ -124,7 +128,7 @@ def process(fh: TextIO, headers: Optional[Dict[str, str]], db: str,
             args: Args) -> int:
     """Process the file into Mongo (client)"""
 
-    _, ext = os.path.splitext(os.path.basename(fh.name))
+    _, ext = os.path.splitext(plain_name(os.path.basename(fh.name)))
     delimiter = ',' if ext == '.csv' else args.delimiter
     reader = csv.DictReader(fh, delimiter=delimiter)
     flds = reader.fieldnames
@@ -9,8 +9,14 @@ import argparse
 import csv
 import os
 import re
+import sys
 from typing import Dict, List, NamedTuple, Optional, TextIO
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+from compressed_io import FileType  # noqa: E402
+from scrutinizer_record import (  # noqa: E402
+    ScrutinizerRecord, ScrutinizerWriter, get_writer)
+
 
 class Args(NamedTuple):
     file: List[TextIO]
@@ -33,14 +39,14 @@ def get_args() -> Args:
     parser.add_argument('file',
                         nargs='+',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         help='Input file(s)')
 
     parser.add_argument('-H',
                         '--headers',
                         help='Headers file',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         required=True)
 
     parser.add_argument('-c',
@@ -66,9 +72,9 @@ def get_args() -> Args:
 
     parser.add_argument('-o',
                         '--outfile',
-                        help='Output filename',
+                        help='Output file (Parquet if "*.parquet")',
                         metavar='FILE',
-                        type=argparse.FileType('wt'),
+                        type=FileType('wt'),
                         default='scrutinizer.csv')
 
     parser.add_argument('-q',
@@ -93,14 +99,7 @@ def main() -> None:
 
     args = get_args()
     headers = get_headers(args.headers)
-    writer = csv.DictWriter(args.outfile,
-                            delimiter=',',
-                            fieldnames=[
-                                'source', 'unit', 'location_name',
-                                'location_type', 'variable_name',
-                                'variable_desc', 'collected_on', 'medium',
-                                'value'
-                            ])
+    writer = get_writer(args.outfile)
     writer.writeheader()
 
     num_written = 0
@@ -108,6 +107,7 @@ def main() -> None:
         print(f'{i:3}: {os.path.basename(fh.name)}')
         num_written += process(fh, headers, args, writer)
 
+    writer.close()
     print(f'Done, wrote {num_written:,} to "{args.outfile.name}".')
 
 
@@ -135,7 +135,7 @@ def get_headers(fh: Optional[TextIO]) -> Dict[str, str]:
 
 # --------------------------------------------------
 def process(in_fh: TextIO, headers: Dict[str, str], args: Args,
-            writer: csv.DictWriter) -> int:
+            writer: ScrutinizerWriter) -> int:
     """Process the file into Mongo (client)"""
 
     reader = csv.DictReader(in_fh, delimiter=',')
@@ -195,17 +195,16 @@ def process(in_fh: TextIO, headers: Dict[str, str], args: Args,
             if not args.quiet:
                 print(f'{i:4}: {block_id} {fld} => {val}')
 
-            writer.writerow({
-                'source': args.source,
-                'unit': unit,
-                'location_name': block_id,
-                'location_type': 'block_group',
-                'variable_name': fld,
-                'variable_desc': desc,
-                'collected_on': args.collected_on,
-                'medium': args.medium,
-                'value': val
-            })
+            writer.writerow(
+                ScrutinizerRecord(source=args.source,
+                                  unit=unit,
+                                  location_name=block_id,
+                                  location_type='block_group',
+                                  variable_name=fld,
+                                  variable_desc=desc,
+                                  collected_on=args.collected_on,
+                                  medium=args.medium,
+                                  value=val))
             num_written += 1
 
     return num_written
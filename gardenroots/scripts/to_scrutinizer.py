@@ -6,7 +6,7 @@ Purpose: Create Scrutinizer import
 """
 
 import argparse
-import csv
+import json
 import os
 import re
 import sys
@@ -14,12 +14,20 @@ from datapackage import Package
 from pprint import pprint, pformat
 from typing import List, NamedTuple, TextIO
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import (  # noqa: E402
+    EXTENSIONS, FileType, open_file, plain_name)
+from scrutinizer_record import (  # noqa: E402
+    ScrutinizerRecord, get_writer)
+
 
 class Args(NamedTuple):
     file: List[TextIO]
     outdir: str
     source: str
     delimiter: str
+    compress: str
+    parquet: bool
     verbose: bool
 
 
@@ -35,7 +43,7 @@ def get_args() -> Args:
                         '--file',
                         help='GardenRoots "datapackage.json" file',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         nargs='+')
 
     parser.add_argument('-s',
@@ -59,6 +67,19 @@ def get_args() -> Args:
                         type=str,
                         default=',')
 
+    parser.add_argument('-z',
+                        '--compress',
+                        help='Compress the delimited output files',
+                        metavar='ext',
+                        type=str,
+                        choices=[ext[1:] for ext in EXTENSIONS],
+                        default='')
+
+    parser.add_argument('-p',
+                        '--parquet',
+                        help='Write Parquet instead of delimited text',
+                        action='store_true')
+
     parser.add_argument('-v',
                         '--verbose',
                         help='Talk loudly',
@@ -70,6 +91,8 @@ def get_args() -> Args:
                 source=args.source,
                 outdir=args.outdir,
                 delimiter=args.delimiter,
+                compress=args.compress,
+                parquet=args.parquet,
                 verbose=args.verbose)
 
 
@@ -93,7 +116,7 @@ def main() -> None:
 def process(pkg_name: str, args: Args):
     """Process resource into output directory"""
 
-    _, ext = os.path.splitext(pkg_name)
+    _, ext = os.path.splitext(plain_name(pkg_name))
     if ext != '.json':
         raise Exception(f'File "{pkg_name}" not a JSON file')
 
@@ -106,7 +129,12 @@ def process(pkg_name: str, args: Args):
         manganese nickel lead zinc copper
     """.split()
 
-    package = Package(pkg_name)
+    # The descriptor may be compressed, its resources are relative to it
+    with open_file(pkg_name, 'rt') as fh:
+        descriptor = json.load(fh)
+
+    package = Package(descriptor,
+                      base_path=os.path.dirname(os.path.abspath(pkg_name)))
     errors = []
 
     def exc_handler(exc, row_number=None, row_data=None, error_data=None):
@@ -120,17 +148,13 @@ def process(pkg_name: str, args: Args):
             continue
 
         print(f'==> {resource.name} <==')
-        ext = '.csv' if args.delimiter == ',' else '.txt'
+        ext = '.parquet' if args.parquet else \
+            ('.csv' if args.delimiter == ',' else '.txt') + \
+            ('.' + args.compress if args.compress else '')
         out_file = os.path.join(args.outdir, resource.name + ext)
-        flds = [
-            'source', 'unit', 'location_name', 'location_type',
-            'variable_name', 'variable_desc', 'collected_on', 'medium', 'value'
-        ]
-
-        with open(out_file, 'wt') as out_fh:
-            writer = csv.DictWriter(out_fh,
-                                    fieldnames=flds,
-                                    delimiter=args.delimiter)
+
+        with open_file(out_file, 'wt') as out_fh:
+            writer = get_writer(out_fh, delimiter=args.delimiter)
             writer.writeheader()
 
             for row in resource.iter(keyed=True, cast=False):
@@ -153,23 +177,25 @@ def process(pkg_name: str, args: Args):
                         pass
 
                     if value:
-                        writer.writerow({
-                            'source': args.source,
-                            'unit': row.get('units'),
-                            'location_name': row.get('geoid'),
-                            'location_type': row.get('geoid_type'),
-                            'variable_name': variable_name,
-                            'variable_desc': '',
-                            'collected_on': collected_on,
-                            'medium': row.get('type'),
-                            'value': value
-                        })
+                        writer.writerow(
+                            ScrutinizerRecord(
+                                source=args.source,
+                                unit=row.get('units'),
+                                location_name=row.get('geoid'),
+                                location_type=row.get('geoid_type'),
+                                variable_name=variable_name,
+                                variable_desc='',
+                                collected_on=collected_on,
+                                medium=row.get('type'),
+                                value=value))
 
                 if errors:
                     print(f'{resource.name} had {len(errors)} errors',
                           file=sys.stderr)
                     print(pformat(errors), file=sys.stderr)
 
+            writer.close()
+
 
 # --------------------------------------------------
 if __name__ == '__main__':
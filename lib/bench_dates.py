@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Time dateparser against dates.parse_date on the bundled data
+"""
+
+import argparse
+import csv
+import os
+import timeit
+from typing import List, NamedTuple, Tuple
+
+import dateparser
+from compressed_io import open_file
+from dates import parse_date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# File and date column for each of the bundled data sets
+DATA = [
+    ('csm/benthic/benthic.csv', 'DATE'),
+    ('csm/benthic/scrutinizer.csv', 'collected_on'),
+    ('csm/water_chem/scrutinizer.csv.gz', 'collected_on'),
+    ('waterquality/scrutinizer.csv', 'collected_on'),
+    ('usgs/scrutinizer.csv', 'collected_on'),
+]
+
+
+class Args(NamedTuple):
+    data: List[Tuple[str, str]]
+    limit: int
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Time dateparser against dates.parse_date',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-f',
+                        '--file',
+                        help='CSV file(s) (default: bundled data)',
+                        metavar='FILE',
+                        type=str,
+                        nargs='*')
+
+    parser.add_argument('-c',
+                        '--column',
+                        help='Date column in --file',
+                        metavar='str',
+                        type=str,
+                        default='collected_on')
+
+    parser.add_argument('-l',
+                        '--limit',
+                        help='Rows to time with dateparser per file (0=all)',
+                        metavar='int',
+                        type=int,
+                        default=2000)
+
+    args = parser.parse_args()
+
+    data = [(f, args.column) for f in args.file] if args.file else [
+        (os.path.join(ROOT, f), col) for f, col in DATA
+    ]
+
+    return Args(data, args.limit)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """Make a jazz noise here"""
+
+    args = get_args()
+
+    print(f'{"file":36} {"rows":>7} {"dateparser":>11} {"uncached":>9} '
+          f'{"cold":>7} {"warm":>7}  (usec/row)')
+
+    for file, column in args.data:
+        dates = read_dates(file, column)
+        sample = dates[:args.limit] if args.limit else dates
+
+        # Check the two agree before timing anything
+        for text in set(sample):
+            if parse_date(text) != dateparser.parse(text):
+                print(f'{file}: "{text}" differs')
+
+        slow = timeit.timeit(lambda: list(map(dateparser.parse, sample)),
+                             number=1) / len(sample)
+
+        uncached = timeit.timeit(
+            lambda: list(map(parse_date.__wrapped__, dates)),
+            number=1) / len(dates)
+
+        # Cache starting empty, then full
+        parse_date.cache_clear()
+        cold = timeit.timeit(lambda: list(map(parse_date, dates)),
+                             number=1) / len(dates)
+        warm = timeit.timeit(lambda: list(map(parse_date, dates)),
+                             number=1) / len(dates)
+
+        name = os.path.relpath(file, ROOT)
+        print(f'{name:36} {len(dates):7,} {slow * 1e6:11.1f} '
+              f'{uncached * 1e6:9.2f} {cold * 1e6:7.2f} {warm * 1e6:7.2f}')
+
+
+# --------------------------------------------------
+def read_dates(file: str, column: str) -> List[str]:
+    """ Non-empty values of the date column """
+
+    with open_file(file, 'rt', encoding='utf-8-sig') as fh:
+        return list(filter(None, (r.get(column) for r in csv.DictReader(fh))))
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
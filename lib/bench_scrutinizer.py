@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Time writing scrutinizer rows as dicts against ScrutinizerRecords
+"""
+
+import argparse
+import csv
+import io
+import timeit
+from typing import NamedTuple
+
+from scrutinizer_record import FIELDNAMES, ScrutinizerRecord, \
+    ScrutinizerWriter
+
+
+class Args(NamedTuple):
+    num: int
+    repeat: int
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Time writing scrutinizer rows',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-n',
+                        '--num',
+                        help='Number of rows',
+                        metavar='int',
+                        type=int,
+                        default=200000)
+
+    parser.add_argument('-r',
+                        '--repeat',
+                        help='Number of timings (best is reported)',
+                        metavar='int',
+                        type=int,
+                        default=3)
+
+    args = parser.parse_args()
+
+    return Args(args.num, args.repeat)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """Make a jazz noise here"""
+
+    args = get_args()
+
+    # Values like the waterquality converter's, in its loop
+    values = [(f'{31 + i % 100 / 100},-109.25', f'{i % 1000 / 10}')
+              for i in range(args.num)]
+
+    def dicts():
+        writer = csv.DictWriter(io.StringIO(), FIELDNAMES)
+        for location, value in values:
+            writer.writerow({
+                'source': 'USGS Arizona Water Science Center',
+                'unit': 'mg/l',
+                'location_name': location,
+                'location_type': 'point',
+                'variable_name': 'Calcium',
+                'variable_desc': 'Concentration of Calcium in water',
+                'medium': 'water',
+                'collected_on': '2018-05-01',
+                'value': value
+            })
+
+    def records():
+        writer = ScrutinizerWriter(io.StringIO())
+        for location, value in values:
+            writer.writerow(
+                ScrutinizerRecord(
+                    source='USGS Arizona Water Science Center',
+                    unit='mg/l',
+                    location_name=location,
+                    location_type='point',
+                    variable_name='Calcium',
+                    variable_desc='Concentration of Calcium in water',
+                    medium='water',
+                    collected_on='2018-05-01',
+                    value=value))
+
+    def batched():
+        writer = ScrutinizerWriter(io.StringIO())
+        writer.writerows(
+            ScrutinizerRecord('USGS Arizona Water Science Center', 'mg/l',
+                              location, 'point', 'Calcium',
+                              'Concentration of Calcium in water',
+                              '2018-05-01', 'water', value)
+            for location, value in values)
+
+    print(f'{"method":44} {"rows/sec":>12} {"speedup":>8}')
+    base = None
+    for name, func in [('dict + csv.DictWriter', dicts),
+                       ('ScrutinizerRecord + writerow', records),
+                       ('ScrutinizerRecord (positional) + writerows',
+                        batched)]:
+        secs = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        rate = args.num / secs
+        base = base or rate
+        print(f'{name:44} {rate:12,.0f} {rate / base:7.2f}x')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Read a big CSV file in chunks in a process pool
+
+The file is split at newlines that end a record, i.e., that come after an
+even number of double quotes, so a quoted field with commas or newlines is
+never cut in two. Each worker gets its chunk as a file handle that reads
+like a CSV file on its own (the header and then the chunk's records), so
+the code that reads a whole file can be run on a chunk unchanged. The
+results come back in the order of the chunks. "map_files_chunks" does the
+same for the chunks of several files in one process pool.
+"""
+
+import io
+import mmap
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Iterator, List, TextIO, Tuple
+
+CHUNK_SIZE = 64 * 1024 * 1024  # Most bytes read by a worker at once
+BLOCK_SIZE = 16 * 1024 * 1024  # For counting quotes
+
+
+# --------------------------------------------------
+def map_chunks(file: str,
+               func: Callable[[TextIO], Any],
+               jobs: int,
+               chunk_size: int = CHUNK_SIZE,
+               encoding: str = 'utf-8') -> Iterator[Any]:
+    """
+    Run "func" on each chunk of "file" in "jobs" processes, yield the
+    results in file order. "func" must be picklable (a module-level
+    function or a functools.partial of one).
+    """
+
+    yield from map_files_chunks([file], func, jobs, chunk_size, encoding)
+
+
+# --------------------------------------------------
+def map_files_chunks(files: List[str],
+                     func: Callable[[TextIO], Any],
+                     jobs: int,
+                     chunk_size: int = CHUNK_SIZE,
+                     encoding: str = 'utf-8') -> Iterator[Any]:
+    """
+    Like "map_chunks" for the chunks of all the "files," yield the
+    results in the order of the files and then the chunks
+    """
+
+    tasks = []
+    for file in files:
+        size = os.path.getsize(file)
+        num_chunks = max(jobs * 4, -(-size // chunk_size))
+        header_end, chunks = chunk_offsets(file, num_chunks)
+        tasks.extend((file, header_end, chunk) for chunk in chunks)
+
+    run = partial(run_task, func, encoding)
+
+    if jobs == 1:
+        yield from map(run, tasks)
+    else:
+        # Only a few chunks ahead of the caller, so finished results
+        # don't pile up in memory while waiting to be taken in order
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            pending: Deque[Future] = deque()
+            for task in tasks:
+                if len(pending) >= jobs * 2:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(run, task))
+
+            while pending:
+                yield pending.popleft().result()
+
+
+# --------------------------------------------------
+def run_task(func: Callable[[TextIO], Any], encoding: str,
+             task: Tuple[str, int, Tuple[int, int]]) -> Any:
+    """ Call "func" on the chunk of a file from "map_files_chunks" """
+
+    file, header_end, chunk = task
+    return run_chunk(file, header_end, func, encoding, chunk)
+
+
+# --------------------------------------------------
+def run_chunk(file: str, header_end: int, func: Callable[[TextIO], Any],
+              encoding: str, chunk: Tuple[int, int]) -> Any:
+    """ Call "func" on a handle to the header and one chunk """
+
+    start, end = chunk
+    with open(file, 'rb') as fh:
+        header = fh.read(header_end)
+        fh.seek(start)
+        data = fh.read(end - start)
+
+    # Universal newlines, like opening the file with "rt"
+    return func(io.TextIOWrapper(io.BytesIO(header + data), encoding=encoding))
+
+
+# --------------------------------------------------
+def chunk_offsets(file: str,
+                  num_chunks: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    Find the end of the header and the (start, end) byte offsets of up
+    to "num_chunks" chunks of whole records after it
+    """
+
+    size = os.path.getsize(file)
+    if size == 0:
+        return 0, []
+
+    with open(file, 'rb') as fh, \
+            mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+        def count_quotes(start, end):
+            return sum(
+                mm[i:min(i + BLOCK_SIZE, end)].count(b'"')
+                for i in range(start, end, BLOCK_SIZE))
+
+        def next_record(pos, quotes):
+            """ Offset after the record at "pos" and quotes before it """
+            while pos < size:
+                newline = mm.find(b'\n', pos)
+                if newline < 0:
+                    break
+                quotes += count_quotes(pos, newline)
+                pos = newline + 1
+                if quotes % 2 == 0:
+                    return pos, quotes
+            return size, quotes
+
+        header_end, quotes = next_record(0, 0)
+        offsets = [header_end]
+        for i in range(1, num_chunks):
+            target = header_end + (size - header_end) * i // num_chunks
+            if target <= offsets[-1]:
+                continue
+            quotes += count_quotes(offsets[-1], target)
+            end, quotes = next_record(target, quotes)
+            if end < size:
+                offsets.append(end)
+
+    offsets.append(size)
+    chunks = list(zip(offsets, offsets[1:]))
+
+    return header_end, [(start, end) for start, end in chunks if end > start]
+
+
+# --------------------------------------------------
+def count_records(fh: TextIO) -> int:
+    """ Number of records (used by the tests) """
+
+    import csv
+
+    return sum(1 for _ in csv.DictReader(fh))
+
+
+# --------------------------------------------------
+def test_chunk_offsets() -> None:
+    """ Test chunk_offsets never splits a quoted field """
+
+    import csv
+    import tempfile
+
+    rows = [['id', 'comment']]
+    for i in range(200):
+        comment = ['', 'one, two', 'say "hi"', 'line\nbreak', '"\n"'][i % 5]
+        rows.append([str(i), comment])
+
+    with tempfile.NamedTemporaryFile('wt', suffix='.csv', newline='',
+                                     delete=False) as fh:
+        csv.writer(fh).writerows(rows)
+
+    try:
+        for num_chunks in [1, 2, 7, 50, 500]:
+            header_end, chunks = chunk_offsets(fh.name, num_chunks)
+            assert len(chunks) <= num_chunks
+
+            records = []
+            for chunk in chunks:
+                records.extend(
+                    run_chunk(fh.name, header_end,
+                              lambda f: list(csv.reader(f)), 'utf-8',
+                              chunk)[1:])
+            assert records == rows[1:]
+
+        results = list(map_chunks(fh.name, count_records, jobs=2,
+                                  chunk_size=100))
+        assert len(results) > 1
+        assert sum(results) == 200
+
+        results = list(
+            map_files_chunks([fh.name, fh.name], count_records, jobs=2))
+        assert len(results) == 16
+        assert sum(results) == 400
+    finally:
+        os.remove(fh.name)
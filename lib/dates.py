@@ -0,0 +1,107 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Fast, cached date parsing
+
+"dateparser.parse" works out the language/locale of every string, which
+makes it the slowest thing in the loaders that call it once per row.
+"parse_date" returns the same (naive) datetime for the formats in our data
+(YYYY-MM-DD with an optional time, M/D/YYYY and M/D/YY) using a regex, and
+only hands anything else to dateparser. Results are cached as the same
+dates repeat on many rows. "year_prefix" reads the year off the front of
+a YYYY-MM-DD string so rows can be filtered before anything is parsed.
+"""
+
+import datetime
+import re
+from functools import lru_cache
+from typing import Optional
+
+ISO = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})'
+                 r'(?:[ T](\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?$')
+US = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4}|\d{2})$')
+
+
+# --------------------------------------------------
+@lru_cache(maxsize=65536)
+def parse_date(text: str) -> Optional[datetime.datetime]:
+    """ Parse a date string like dateparser.parse """
+
+    if not text:
+        return None
+
+    try:
+        return fast_parse(text.strip())
+    except ValueError:
+        import dateparser
+        return dateparser.parse(text)
+
+
+# --------------------------------------------------
+def fast_parse(text: str) -> datetime.datetime:
+    """ Parse the common formats, raise ValueError for anything else """
+
+    if match := ISO.match(text):
+        year, month, day, hour, minute, second, frac = match.groups()
+        return datetime.datetime(int(year), int(month), int(day),
+                                 int(hour or 0), int(minute or 0),
+                                 int(second or 0),
+                                 int((frac or '0').ljust(6, '0')))
+
+    if match := US.match(text):
+        month, day, year = map(int, match.groups())
+        if year < 100:
+            # Same pivot as dateparser and strptime's "%y"
+            year += 2000 if year < 69 else 1900
+        return datetime.datetime(year, month, day)
+
+    raise ValueError(f'Unknown date format "{text}"')
+
+
+# --------------------------------------------------
+def year_prefix(text: str) -> Optional[int]:
+    """ Year of a "YYYY-..." string without parsing it, else None """
+
+    if len(text or '') > 4 and text[4] == '-' and text[:4].isdecimal():
+        return int(text[:4])
+
+    return None
+
+
+# --------------------------------------------------
+def test_year_prefix() -> None:
+    """ Test year_prefix """
+
+    assert year_prefix('') is None
+    assert year_prefix('2018') is None
+    assert year_prefix('5/1/2018') is None
+    assert year_prefix('2018-05-01') == 2018
+    assert year_prefix('1985-4-25 10:00') == 1985
+
+
+# --------------------------------------------------
+def test_parse_date() -> None:
+    """ Test parse_date """
+
+    assert parse_date('') is None
+    assert parse_date('2020-01-02') == datetime.datetime(2020, 1, 2)
+    assert parse_date(' 2020-1-2 ') == datetime.datetime(2020, 1, 2)
+    assert parse_date('2020-01-02 03:04') == datetime.datetime(
+        2020, 1, 2, 3, 4)
+    assert parse_date('2020-01-02T03:04:05.123') == datetime.datetime(
+        2020, 1, 2, 3, 4, 5, 123000)
+    assert parse_date('1/2/2020') == datetime.datetime(2020, 1, 2)
+    assert parse_date('10/28/16') == datetime.datetime(2016, 10, 28)
+    assert parse_date('1/2/69') == datetime.datetime(1969, 1, 2)
+
+
+# --------------------------------------------------
+def test_fast_parse() -> None:
+    """ Test fast_parse leaves odd formats and bad dates to dateparser """
+
+    for text in ['2020-02-30', '13/2/2020', '2020-01-02T03:04:05Z', 'May 1']:
+        try:
+            fast_parse(text)
+            assert False, text
+        except ValueError:
+            pass
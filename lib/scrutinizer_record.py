@@ -0,0 +1,276 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Central Scrutinizer input records and a writer for them
+
+The converters used to build a dict for every output row and write it with
+"csv.DictWriter," which looks up each field by name for every row. A
+"ScrutinizerRecord" is a tuple with the fields in the output order, so the
+writer hands it straight to "csv.writer" (and it is smaller to send back
+from a worker process). Extra columns (e.g., benthic "--stats") are given
+to the writer and added to the end of each record.
+
+"get_writer" returns a "ParquetWriter" instead for an output file named
+"*.parquet" (needs "pyarrow"). The repeated strings (source, unit, etc.)
+are dictionary encoded, and "value" is a float64 (null if not a number),
+so the file is much smaller and loaders need not parse it. "read_records"
+reads either format back as dicts, Parquet in record batches.
+"""
+
+import csv
+from typing import IO, Any, Dict, Iterable, Iterator, List, NamedTuple, \
+    Optional, Sequence, TextIO
+
+FIELDNAMES = [
+    'source', 'unit', 'location_name', 'location_type', 'variable_name',
+    'variable_desc', 'collected_on', 'medium', 'value'
+]
+
+STRING_FIELDS = FIELDNAMES[:-1]
+
+BATCH_SIZE = 65536  # Parquet rows written/read at once
+
+
+class ScrutinizerRecord(NamedTuple):
+    source: str
+    unit: str
+    location_name: str
+    location_type: str
+    variable_name: str
+    variable_desc: str
+    collected_on: str
+    medium: str
+    value: Any
+
+
+class ScrutinizerWriter:
+    """ Write ScrutinizerRecords like a csv.DictWriter with FIELDNAMES """
+
+    def __init__(self, fh: TextIO, extra: Sequence[str] = (), **fmtparams):
+        self.fieldnames: List[str] = FIELDNAMES + list(extra)
+        self.writer = csv.writer(fh, **fmtparams)
+
+    def writeheader(self) -> Any:
+        """ Write the column names """
+
+        return self.writer.writerow(self.fieldnames)
+
+    def writerow(self, rec: Sequence[Any]) -> Any:
+        """ Write a record (plus the values of any extra columns) """
+
+        return self.writer.writerow(rec)
+
+    def writerows(self, recs: Iterable[Sequence[Any]]) -> None:
+        """ Write many records """
+
+        self.writer.writerows(recs)
+
+    def close(self) -> None:
+        """ Nothing to finish, the caller closes the file """
+
+
+class ParquetWriter:
+    """
+    Write ScrutinizerRecords to Parquet like a ScrutinizerWriter, in
+    batches of "batch_size" rows. Extra columns are float64 like "value."
+    """
+
+    def __init__(self,
+                 fh: IO,
+                 extra: Sequence[str] = (),
+                 batch_size: int = BATCH_SIZE):
+        import pyarrow as pa
+
+        self.fieldnames: List[str] = FIELDNAMES + list(extra)
+        numbers = self.fieldnames[len(STRING_FIELDS):]
+        self.schema = pa.schema([(f, pa.string()) for f in STRING_FIELDS] +
+                                [(f, pa.float64()) for f in numbers])
+        self.fh = getattr(fh, 'buffer', fh)  # Binary under a text handle
+        self.batch_size = batch_size
+        self.rows: List[Sequence[Any]] = []
+        self.writer = None
+
+    def writeheader(self) -> None:
+        """ The schema is written with the data """
+
+    def writerow(self, rec: Sequence[Any]) -> None:
+        """ Write a record (plus the values of any extra columns) """
+
+        self.rows.append(rec)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def writerows(self, recs: Iterable[Sequence[Any]]) -> None:
+        """ Write many records """
+
+        for rec in recs:
+            self.writerow(rec)
+
+    def flush(self) -> None:
+        """ Write the buffered rows as a record batch """
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.fh,
+                                           self.schema,
+                                           use_dictionary=STRING_FIELDS,
+                                           compression='zstd')
+
+        if self.rows:
+            cols = list(zip(*self.rows))
+            num_str = len(STRING_FIELDS)
+            arrays = [string_array(col) for col in cols[:num_str]] + [
+                pa.array(list(map(to_float, col)), pa.float64())
+                for col in cols[num_str:]
+            ]
+            self.writer.write_batch(
+                pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+            self.rows = []
+
+    def close(self) -> None:
+        """ Write any rows left and the file footer """
+
+        self.flush()
+        self.writer.close()
+        self.fh.flush()
+
+
+# --------------------------------------------------
+def get_writer(fh: IO, extra: Sequence[str] = (), **fmtparams):
+    """ A ParquetWriter for a "*.parquet" file, else a ScrutinizerWriter """
+
+    if is_parquet(fh):
+        return ParquetWriter(fh, extra)
+
+    return ScrutinizerWriter(fh, extra, **fmtparams)
+
+
+# --------------------------------------------------
+def read_records(fh: IO, delimiter: str = ',') -> Iterator[Dict[str, Any]]:
+    """ Rows of a scrutinizer CSV or Parquet file as dicts """
+
+    if is_parquet(fh):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(getattr(fh, 'buffer', fh))
+        for batch in parquet.iter_batches(batch_size=BATCH_SIZE):
+            yield from batch.to_pylist()
+    else:
+        yield from csv.DictReader(fh, delimiter=delimiter)
+
+
+# --------------------------------------------------
+def is_parquet(fh: IO) -> bool:
+    """ Whether a file handle is for a "*.parquet" file """
+
+    return str(getattr(fh, 'name', '')).endswith('.parquet')
+
+
+# --------------------------------------------------
+def string_array(values: Sequence[Any]):
+    """ Arrow strings, converting numbers (e.g., a float "unit") """
+
+    import pyarrow as pa
+
+    try:
+        return pa.array(values, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([v if v is None else str(v) for v in values],
+                        pa.string())
+
+
+# --------------------------------------------------
+def to_float(value: Any) -> Optional[float]:
+    """ A float or None """
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# --------------------------------------------------
+def test_writer() -> None:
+    """ Test ScrutinizerWriter writes the same as csv.DictWriter """
+
+    import io
+
+    rec = ScrutinizerRecord(source='USGS',
+                            unit='mg/kg',
+                            location_name='31.5,-109.25',
+                            location_type='point',
+                            variable_name='as',
+                            variable_desc='Concentration of "as"',
+                            collected_on='2013-09-18',
+                            medium='soil',
+                            value=1.5)
+
+    expected = io.StringIO()
+    dict_writer = csv.DictWriter(expected, FIELDNAMES)
+    dict_writer.writeheader()
+    dict_writer.writerows([rec._asdict()] * 2)
+
+    out = io.StringIO()
+    writer = ScrutinizerWriter(out)
+    writer.writeheader()
+    writer.writerow(rec)
+    writer.writerows([rec])
+    assert out.getvalue() == expected.getvalue()
+
+    out = io.StringIO()
+    writer = ScrutinizerWriter(out, extra=['replicates'])
+    writer.writeheader()
+    writer.writerow(rec + (3, ))
+    assert list(csv.DictReader(io.StringIO(out.getvalue()))) == [
+        dict(rec._asdict(), value='1.5', replicates='3')
+    ]
+
+
+# --------------------------------------------------
+def test_parquet() -> None:
+    """ Test writing and reading Parquet """
+
+    import os
+    import tempfile
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return  # Optional
+
+    recs = [
+        ScrutinizerRecord('USGS', 'mg/kg', '31.5,-109.25', 'point', 'as',
+                          'Concentration of as', '2013-09-18', 'soil', v)
+        for v in [1.5, '2', 'BDL', None]
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'scrutinizer.parquet')
+        with open(file, 'wt') as fh:
+            writer = get_writer(fh, extra=['replicates'])
+            assert isinstance(writer, ParquetWriter)
+            writer.batch_size = 3
+            writer.writeheader()
+            writer.writerows(rec + (i, ) for i, rec in enumerate(recs))
+            writer.close()
+
+        meta = pq.ParquetFile(file).metadata
+        assert meta.num_row_groups == 2
+        assert any('DICTIONARY' in enc
+                   for enc in meta.row_group(0).column(0).encodings)
+
+        with open(file, 'rt') as fh:
+            rows = list(read_records(fh))
+
+        assert [(r['value'], r['replicates']) for r in rows] == [(1.5, 0.),
+                                                                  (2., 1.),
+                                                                  (None, 2.),
+                                                                  (None, 3.)]
+        assert rows[0]['location_name'] == '31.5,-109.25'
+        assert list(rows[0]) == FIELDNAMES + ['replicates']
+
+        with open(os.path.join(tmp, 'empty.parquet'), 'wt') as fh:
+            get_writer(fh).close()
+        assert pq.read_table(fh.name).num_rows == 0
@@ -0,0 +1,788 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Run the pipeline stages that are out of date
+
+The stages (fetch, point2shape, to_scrutinizer, load) are described in
+"stages.json" with the command to run, the directory to run it in and the
+files it reads and writes. A stage depends on the stages that write its
+inputs. A stage is skipped when its command and the contents (SHA-256) of
+its inputs are the same as when it last succeeded and its outputs are
+there, so touching a file or rewriting it with the same contents does not
+rerun anything downstream. Stages that do not depend on each other (e.g.,
+usgs, ejscreen, acs5 and csm) run in parallel, except that stages with the
+same "lock" (e.g., the MySQL loaders) run one at a time.
+
+File hashes are kept with the mtime and size of each file in the state
+file, so an unchanged file is not read again. Each stage's output goes to
+"logs/<stage>.log" next to the state file.
+"""
+
+import argparse
+import datetime
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import string
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, NamedTuple, Optional, Set, TextIO
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Args(NamedTuple):
+    stage: List[str]
+    file: TextIO
+    state: str
+    jobs: int
+    define: Dict[str, str]
+    force: bool
+    dry_run: bool
+    list: bool
+
+
+class Stage(NamedTuple):
+    name: str
+    dir: str
+    cmd: List[str]
+    inputs: List[str]
+    outputs: List[str]
+    after: List[str]
+    lock: Optional[str]
+
+
+class Result(NamedTuple):
+    name: str
+    status: str
+    seconds: float
+    message: str
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Run the pipeline stages that are out of date',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('stage',
+                        help='Stages (or prefixes, e.g., "usgs") to run '
+                        'with the stages they depend on (default all)',
+                        metavar='STAGE',
+                        nargs='*')
+
+    parser.add_argument('-f',
+                        '--file',
+                        help='Stages file',
+                        metavar='FILE',
+                        type=argparse.FileType('rt'),
+                        default=os.path.join(HERE, 'stages.json'))
+
+    parser.add_argument('-s',
+                        '--state',
+                        help='State file of the hashes of the last runs',
+                        metavar='FILE',
+                        type=str,
+                        default=os.path.join(HERE, 'state', 'state.json'))
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        help='Number of stages to run at once',
+                        metavar='int',
+                        type=int,
+                        default=4)
+
+    parser.add_argument('-D',
+                        '--define',
+                        help='Set a variable in the stages file',
+                        metavar='NAME=VALUE',
+                        type=str,
+                        action='append')
+
+    parser.add_argument('-F',
+                        '--force',
+                        help='Run the stages even if up to date',
+                        action='store_true')
+
+    parser.add_argument('-n',
+                        '--dry_run',
+                        help='Show which stages would run',
+                        action='store_true')
+
+    parser.add_argument('-l',
+                        '--list',
+                        help='List the stages and their last timings',
+                        action='store_true')
+
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be > 0')
+
+    define = {}
+    for item in args.define or []:
+        name, sep, value = item.partition('=')
+        if not sep or not name:
+            parser.error(f'--define "{item}" must be NAME=VALUE')
+        define[name] = value
+
+    return Args(stage=args.stage,
+                file=args.file,
+                state=args.state,
+                jobs=args.jobs,
+                define=define,
+                force=args.force,
+                dry_run=args.dry_run,
+                list=args.list)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """Make a jazz noise here"""
+
+    args = get_args()
+
+    try:
+        stages = read_stages(args.file, args.define)
+        deps = dependencies(stages)
+        names = select(stages, deps, args.stage)
+    except ValueError as err:
+        sys.exit(str(err))
+
+    state = State(args.state, root_dir(stages))
+
+    if args.list:
+        for name in names:
+            last = state.stages.get(name, {})
+            secs = f'{last["seconds"]:9.2f}s' if last else f'{"-":>10}'
+            print(f'{secs}  {name}  <- {", ".join(sorted(deps[name]))}')
+        return
+
+    start = time.perf_counter()
+    results = run(stages, deps, names, args.jobs, state, args.force,
+                  args.dry_run)
+    wall = time.perf_counter() - start
+
+    if args.dry_run:
+        return
+
+    print(f'\n{"stage":40} {"status":8} {"seconds":>9}')
+    for res in results:
+        print(f'{res.name:40} {res.status:8} {res.seconds:9.2f}')
+
+    busy = sum(res.seconds for res in results)
+    print(f'Done, {len(results)} stage(s) in {wall:.2f}s '
+          f'({busy:.2f}s of stage time).')
+
+    failed = [res for res in results if res.status == 'failed']
+    for res in results:
+        if res.status in ('failed', 'missing'):
+            print(f'{res.name}: {res.message}', file=sys.stderr)
+
+    if failed:
+        sys.exit(1)
+
+
+# --------------------------------------------------
+def read_stages(fh: TextIO, define: Dict[str, str]) -> List[Stage]:
+    """
+    Read the stages file. "$ROOT" is the "root" directory (relative to the
+    stages file) and "vars" (or "define") are put in the other strings.
+    """
+
+    config = json.load(fh)
+    base = os.path.dirname(os.path.abspath(fh.name))
+    root = os.path.normpath(os.path.join(base, config.get('root', '.')))
+
+    variables = {'ROOT': root}
+    for name, value in {**config.get('vars', {}), **define}.items():
+        variables[name] = expand(value, variables)
+
+    stages = []
+    for stage in config.get('stages', []):
+        if 'name' not in stage or 'cmd' not in stage:
+            raise ValueError(f'Stage "{stage}" needs a "name" and "cmd"')
+
+        cwd = os.path.join(root, expand(stage.get('dir', '.'), variables))
+
+        def paths(key):
+            return [
+                os.path.normpath(os.path.join(cwd, expand(path, variables)))
+                for path in stage.get(key, [])
+            ]
+
+        stages.append(
+            Stage(name=stage['name'],
+                  dir=os.path.normpath(cwd),
+                  cmd=[expand(arg, variables) for arg in stage['cmd']],
+                  inputs=paths('inputs'),
+                  outputs=paths('outputs'),
+                  after=stage.get('after', []),
+                  lock=stage.get('lock')))
+
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError('Stage names must be unique')
+
+    return stages
+
+
+# --------------------------------------------------
+def expand(text: str, variables: Dict[str, str]) -> str:
+    """ Put the variables into "$NAME" or "${NAME}" """
+
+    try:
+        return string.Template(text).substitute(variables)
+    except KeyError as err:
+        raise ValueError(f'Unknown variable {err} in "{text}"') from err
+
+
+# --------------------------------------------------
+def root_dir(stages: List[Stage]) -> str:
+    """ The directory the state file's paths are relative to """
+
+    return os.path.commonpath([stage.dir for stage in stages]) \
+        if stages else os.getcwd()
+
+
+# --------------------------------------------------
+def dependencies(stages: List[Stage]) -> Dict[str, Set[str]]:
+    """ The stages that write the inputs of each stage (or in "after") """
+
+    known = {stage.name for stage in stages}
+    deps: Dict[str, Set[str]] = {}
+    for stage in stages:
+        unknown = set(stage.after) - known
+        if unknown:
+            raise ValueError(f'Stage "{stage.name}" is after unknown '
+                             f'stage(s) {", ".join(sorted(unknown))}')
+
+        deps[stage.name] = set(stage.after) | {
+            other.name
+            for other in stages if other.name != stage.name and any(
+                writes(output, path) for output in other.outputs
+                for path in stage.inputs)
+        }
+
+    topo_order(deps)
+    return deps
+
+
+# --------------------------------------------------
+def writes(output: str, path: str) -> bool:
+    """ Whether an output file/dir is or holds an input path or pattern """
+
+    return output == path or path.startswith(output + os.sep) or \
+        fnmatch.fnmatch(output, path)
+
+
+# --------------------------------------------------
+def topo_order(deps: Dict[str, Set[str]]) -> List[str]:
+    """ The stages, each after the ones it depends on """
+
+    order: List[str] = []
+    done: Set[str] = set()
+    visiting: Set[str] = set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f'Stage "{name}" depends on itself')
+        visiting.add(name)
+        for dep in sorted(deps[name]):
+            visit(dep)
+        visiting.remove(name)
+        done.add(name)
+        order.append(name)
+
+    for name in deps:
+        visit(name)
+
+    return order
+
+
+# --------------------------------------------------
+def select(stages: List[Stage], deps: Dict[str, Set[str]],
+           wanted: List[str]) -> List[str]:
+    """ The wanted stages (all by default) and theirs deps in run order """
+
+    if not wanted:
+        return topo_order(deps)
+
+    todo = set()
+    for want in wanted:
+        found = [
+            stage.name for stage in stages
+            if stage.name == want or stage.name.startswith(want + '.')
+        ]
+        if not found:
+            raise ValueError(f'Unknown stage "{want}"')
+        todo.update(found)
+
+    names: Set[str] = set()
+    while todo:
+        name = todo.pop()
+        if name not in names:
+            names.add(name)
+            todo.update(deps[name])
+
+    return [name for name in topo_order(deps) if name in names]
+
+
+# --------------------------------------------------
+class State:
+    """ The file hashes and the digest of the last good run of each stage """
+
+    def __init__(self, file: str, root: str):
+        self.file = file
+        self.root = root
+        self.lock = threading.Lock()
+        self.files: Dict[str, dict] = {}
+        self.stages: Dict[str, dict] = {}
+
+        if os.path.isfile(file):
+            with open(file, 'rt') as fh:
+                try:
+                    saved = json.load(fh)
+                except ValueError:
+                    saved = {}
+            self.files = saved.get('files', {})
+            self.stages = saved.get('stages', {})
+
+    def save(self) -> None:
+        """
+        Write the state file (whole, so it is never half written), holding
+        the lock until it is in place so an older copy cannot replace it
+        """
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.file)),
+                    exist_ok=True)
+
+        with self.lock:
+            data = json.dumps({'files': self.files, 'stages': self.stages},
+                              indent=1,
+                              sort_keys=True)
+            tmp = f'{self.file}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wt') as fh:
+                fh.write(data)
+            os.replace(tmp, self.file)
+
+    def file_hash(self, path: str) -> str:
+        """ The SHA-256 of a file, hashed again only if it changed """
+
+        stat = os.stat(path)
+        key = os.path.relpath(path, self.root)
+        with self.lock:
+            saved = self.files.get(key)
+        if saved and saved['mtime'] == stat.st_mtime_ns and \
+                saved['size'] == stat.st_size:
+            return saved['sha256']
+
+        digest = hash_file(path)
+        with self.lock:
+            self.files[key] = {
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'sha256': digest
+            }
+        return digest
+
+    def digest(self, stage: Stage) -> str:
+        """
+        A hash of the stage's command and the contents of its inputs,
+        raises OSError for a missing input
+        """
+
+        sha = hashlib.sha256()
+        sha.update(json.dumps([stage.cmd, self.rel(stage.dir)]).encode())
+        for path in input_files(stage):
+            sha.update(f'{self.rel(path)}\0{self.file_hash(path)}\0'.encode())
+        for path in stage.outputs:
+            sha.update(f'{self.rel(path)}\0'.encode())
+
+        return sha.hexdigest()
+
+    def rel(self, path: str) -> str:
+        """ A path relative to the root """
+
+        return os.path.relpath(path, self.root)
+
+    def is_current(self, stage: Stage, digest: str) -> bool:
+        """ Whether the stage last succeeded with the same hash """
+
+        with self.lock:
+            last = self.stages.get(stage.name, {})
+        return last.get('digest') == digest and all(
+            map(os.path.exists, stage.outputs))
+
+    def finished(self, stage: Stage, digest: str, seconds: float) -> None:
+        """ Remember a good run """
+
+        with self.lock:
+            self.stages[stage.name] = {
+                'digest': digest,
+                'seconds': round(seconds, 3),
+                'finished': datetime.datetime.now().isoformat()
+            }
+        self.save()
+
+
+# --------------------------------------------------
+def input_files(stage: Stage) -> List[str]:
+    """ The input files, with globs and directories expanded """
+
+    files = []
+    for path in stage.inputs:
+        found = sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+        if not found or not os.path.exists(found[0]):
+            raise OSError(f'Missing input "{path}"')
+
+        for file in found:
+            if os.path.isdir(file):
+                files.extend(
+                    sorted(
+                        os.path.join(dirpath, name)
+                        for dirpath, _, names in os.walk(file)
+                        for name in names))
+            else:
+                files.append(file)
+
+    return files
+
+
+# --------------------------------------------------
+def has_outputs(stage: Stage) -> bool:
+    """ Whether a stage has outputs and they are all there """
+
+    return bool(stage.outputs) and all(map(os.path.exists, stage.outputs))
+
+
+# --------------------------------------------------
+def hash_file(path: str) -> str:
+    """ SHA-256 of a file """
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+# --------------------------------------------------
+def command(stage: Stage) -> List[str]:
+    """ The command with any globs expanded in the stage dir, like a shell """
+
+    cmd = []
+    for arg in stage.cmd:
+        found = sorted(glob.glob(os.path.join(stage.dir, arg))) \
+            if glob.has_magic(arg) else []
+        cmd.extend([os.path.relpath(path, stage.dir)
+                    for path in found] or [arg])
+
+    return cmd
+
+
+# --------------------------------------------------
+def run_stage(stage: Stage, state: State, force: bool) -> Result:
+    """ Run a stage if it is out of date """
+
+    start = time.perf_counter()
+    try:
+        digest = state.digest(stage)
+    except OSError as err:
+        # e.g., raw data that is not here but was already converted
+        if has_outputs(stage):
+            return Result(stage.name, 'skipped', 0., f'{err}, kept outputs')
+        return Result(stage.name, 'missing', 0., str(err))
+
+    if not force and state.is_current(stage, digest):
+        return Result(stage.name, 'skipped', time.perf_counter() - start, '')
+
+    log_dir = os.path.join(os.path.dirname(os.path.abspath(state.file)),
+                           'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    log = os.path.join(log_dir, f'{stage.name}.log')
+
+    with open(log, 'wt') as log_fh:
+        try:
+            proc = subprocess.run(command(stage),
+                                  cwd=stage.dir,
+                                  stdin=subprocess.DEVNULL,
+                                  stdout=log_fh,
+                                  stderr=subprocess.STDOUT,
+                                  check=False)
+        except OSError as err:
+            return Result(stage.name, 'failed',
+                          time.perf_counter() - start, str(err))
+
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        return Result(stage.name, 'failed', seconds,
+                      f'exit {proc.returncode}, see "{log}"')
+
+    missing = [path for path in stage.outputs if not os.path.exists(path)]
+    if missing:
+        return Result(stage.name, 'failed', seconds,
+                      f'did not write {", ".join(map(state.rel, missing))}')
+
+    state.finished(stage, digest, seconds)
+    return Result(stage.name, 'ran', seconds, '')
+
+
+# --------------------------------------------------
+def run(stages: List[Stage], deps: Dict[str, Set[str]], names: List[str],
+        jobs: int, state: State, force: bool, dry_run: bool) -> List[Result]:
+    """
+    Run the named stages, each as soon as the stages it depends on are done
+    and its lock is free. A stage with a missing input is "skipped" if its
+    outputs are there or else "missing," and the stages after it go on to
+    check their own inputs and outputs. Stages after a "failed" stage (one
+    that ran and failed) are "blocked."
+    """
+
+    by_name = {stage.name: stage for stage in stages}
+    if dry_run:
+        return plan(by_name, deps, names, state, force)
+
+    results: Dict[str, Result] = {}
+    pending = list(names)
+    running: Dict = {}
+    locks: Set[str] = set()
+
+    def report(res):
+        results[res.name] = res
+        print(f'[{res.seconds:8.2f}s] {res.status:8} {res.name}'
+              f'{": " + res.message if res.message else ""}',
+              flush=True)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for name in list(pending):
+                stage = by_name[name]
+                # Only the selected deps, the others are taken as done
+                waits = [dep for dep in deps[name] if dep in names]
+                if any(results.get(dep, Result('', 'ran', 0, '')).status in
+                       ('failed', 'blocked') for dep in waits):
+                    pending.remove(name)
+                    report(Result(name, 'blocked', 0., 'a dependency failed'))
+                elif len(running) < jobs and \
+                        all(dep in results for dep in waits) and \
+                        (stage.lock is None or stage.lock not in locks):
+                    pending.remove(name)
+                    if stage.lock:
+                        locks.add(stage.lock)
+                    running[executor.submit(run_stage, stage, state,
+                                            force)] = stage
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                locks.discard(stage.lock)
+                report(future.result())
+
+    return [results[name] for name in names]
+
+
+# --------------------------------------------------
+def plan(by_name: Dict[str, Stage], deps: Dict[str, Set[str]],
+         names: List[str], state: State, force: bool) -> List[Result]:
+    """ Which stages would run or skip, or miss an input """
+
+    results: Dict[str, Result] = {}
+    for name in names:
+        stage = by_name[name]
+        before = {results[dep].status for dep in deps[name] if dep in results}
+        if force or 'run' in before:
+            status, message = 'run', ''
+        else:
+            try:
+                current = state.is_current(stage, state.digest(stage))
+                status, message = ('skip', '') if current else ('run', '')
+            except OSError as err:
+                status = 'skip' if has_outputs(stage) else 'missing'
+                message = str(err)
+
+        results[name] = Result(name, status, 0., message)
+        print(f'{status:7} {name}{": " + message if message else ""}')
+
+    return [results[name] for name in names]
+
+
+# --------------------------------------------------
+def test_dependencies() -> None:
+    """ Test dependencies, select and topo_order """
+
+    def stage(name, inputs, outputs, after=()):
+        return Stage(name, '/data', [], inputs, outputs, list(after), None)
+
+    stages = [
+        stage('usgs.load', ['/data/usgs/scrutinizer.csv'], []),
+        stage('usgs.scrutinizer', ['/data/usgs/bg.csv'],
+              ['/data/usgs/scrutinizer.csv']),
+        stage('usgs.bg', ['/data/usgs/az.csv'], ['/data/usgs/bg.csv']),
+        stage('acs5.fetch', [], ['/data/acs5/data']),
+        stage('acs5.scrutinizer', ['/data/acs5/data/*'],
+              ['/data/acs5/scrutinizer.csv']),
+        stage('report', ['/data/*/scrutinizer.csv'], [], ['acs5.fetch']),
+    ]
+
+    deps = dependencies(stages)
+    assert deps['usgs.load'] == {'usgs.scrutinizer'}
+    assert deps['usgs.bg'] == set()
+    assert deps['acs5.scrutinizer'] == {'acs5.fetch'}
+    assert deps['report'] == {'usgs.scrutinizer', 'acs5.scrutinizer',
+                              'acs5.fetch'}
+
+    assert select(stages, deps, ['usgs.load']) == [
+        'usgs.bg', 'usgs.scrutinizer', 'usgs.load'
+    ]
+    assert select(stages, deps, ['acs5']) == ['acs5.fetch', 'acs5.scrutinizer']
+    assert len(select(stages, deps, [])) == len(stages)
+
+    stages.append(stage('usgs.az', ['/data/usgs/scrutinizer.csv'],
+                        ['/data/usgs/az.csv']))
+    try:
+        dependencies(stages)
+        assert False
+    except ValueError as err:
+        assert 'depends on itself' in str(err)
+
+
+# --------------------------------------------------
+def test_state() -> None:
+    """ Test stages finished in several threads are all saved """
+
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'state', 'state.json')
+        state = State(file, tmp)
+        stages = [
+            Stage(f's{n}', tmp, [], [], [], [], None) for n in range(50)
+        ]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(
+                executor.map(lambda stage: state.finished(stage, 'x', 0.),
+                             stages))
+
+        assert sorted(State(file, tmp).stages) == sorted(s.name
+                                                         for s in stages)
+        assert os.listdir(os.path.dirname(file)) == ['state.json']
+
+
+# --------------------------------------------------
+def test_run() -> None:
+    """ Test stages are skipped unless the input contents change """
+
+    import io
+    import tempfile
+
+    copy = 'import sys, shutil; shutil.copy(sys.argv[1], sys.argv[2])'
+    # Writes when it started and stopped sleeping
+    sleep = ('import sys, time; start = time.time(); time.sleep(.3); '
+             'print(start, time.time(), file=open(sys.argv[1], "w"))')
+    with tempfile.TemporaryDirectory() as tmp:
+        config = io.StringIO(
+            json.dumps({
+                'vars': {'PY': sys.executable},
+                'stages': [
+                    {'name': 'a.copy', 'cmd': ['$PY', '-c', copy, 'a.txt',
+                                               'b.txt'],
+                     'inputs': ['a.txt'], 'outputs': ['b.txt']},
+                    {'name': 'a.upper', 'dir': 'up',
+                     'cmd': ['$PY', '-c', 'import sys; print('
+                             'open("../b.txt").read().upper(), '
+                             'file=open("B.txt", "w"))'],
+                     'inputs': ['../b.txt'], 'outputs': ['B.txt']},
+                    {'name': 'sleep1', 'cmd': ['$PY', '-c', sleep,
+                                               'sleep1.txt'],
+                     'outputs': ['sleep1.txt']},
+                    {'name': 'sleep2', 'cmd': ['$PY', '-c', sleep,
+                                               'sleep2.txt'],
+                     'outputs': ['sleep2.txt']},
+                    {'name': 'fail', 'cmd': ['$PY', '-c', 'exit(1)']},
+                    {'name': 'fail.after', 'cmd': ['true'],
+                     'after': ['fail']},
+                ]
+            }))  # yapf: disable
+        config.name = os.path.join(tmp, 'stages.json')
+        stages = read_stages(config, {})
+        deps = dependencies(stages)
+        os.makedirs(os.path.join(tmp, 'up'))
+        file = os.path.join(tmp, 'a.txt')
+        with open(file, 'wt') as fh:
+            fh.write('foo')
+
+        def status(jobs=4, force=False):
+            state = State(os.path.join(tmp, 'state', 'state.json'), tmp)
+            return {
+                res.name: res.status
+                for res in run(stages, deps, topo_order(deps), jobs, state,
+                               force, False)
+            }
+
+        assert status() == {
+            'a.copy': 'ran',
+            'a.upper': 'ran',
+            'sleep1': 'ran',
+            'sleep2': 'ran',
+            'fail': 'failed',
+            'fail.after': 'blocked'
+        }
+
+        # The sleeps ran at once: each started before the other stopped
+        times = []
+        for name in ['sleep1.txt', 'sleep2.txt']:
+            with open(os.path.join(tmp, name)) as fh:
+                times.append(list(map(float, fh.read().split())))
+        (start1, end1), (start2, end2) = times
+        assert start1 < end2 and start2 < end1
+
+        with open(os.path.join(tmp, 'up', 'B.txt')) as fh:
+            assert fh.read() == 'FOO\n'
+
+        # Touching or rewriting the same contents runs nothing
+        os.utime(file, ns=(0, 0))
+        assert status()['a.copy'] == 'skipped'
+        assert status()['sleep1'] == 'skipped'
+
+        # New contents run the stages after
+        with open(file, 'wt') as fh:
+            fh.write('bar')
+        assert status(jobs=1)['a.upper'] == 'ran'
+        with open(os.path.join(tmp, 'up', 'B.txt')) as fh:
+            assert fh.read() == 'BAR\n'
+
+        # A deleted output reruns its stage only
+        os.remove(os.path.join(tmp, 'b.txt'))
+        result = status()
+        assert (result['a.copy'], result['a.upper']) == ('ran', 'skipped')
+        assert status(force=True)['a.upper'] == 'ran'
+
+        # A missing input keeps the outputs there
+        os.remove(file)
+        assert status()['a.copy'] == 'skipped'
+        os.remove(os.path.join(tmp, 'b.txt'))
+        result = status()
+        assert (result['a.copy'], result['a.upper']) == ('missing', 'skipped')
+        os.remove(os.path.join(tmp, 'up', 'B.txt'))
+        assert status()['a.upper'] == 'missing'
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
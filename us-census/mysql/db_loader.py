@@ -11,9 +11,59 @@ import csv
 import os
 import re
 import mysql.connector
+import mysql.connector.pooling
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType  # noqa: E402
+
+SQL = {
+    'find_location':
+    'select location_id from location where name = %s',
+    'insert_location': ('insert into location (name) values (%s) '
+                        'on duplicate key update '
+                        'location_id = last_insert_id(location_id)'),
+    'find_attr_type':
+    'select attr_type_id from attr_type where attr_type = %s',
+    'insert_attr_type': ('insert into attr_type (attr_type) values (%s) '
+                         'on duplicate key update '
+                         'attr_type_id = last_insert_id(attr_type_id)'),
+    'find_attr': ('select attr_id from attr '
+                  'where location_id = %s '
+                  'and   attr_type_id = %s'),
+    'insert_attr': ('insert into attr '
+                    '(location_id, attr_type_id, value) '
+                    'values (%s, %s, %s) '
+                    'on duplicate key update '
+                    'attr_id = last_insert_id(attr_id)'),
+}
+
+
+class Statements:
+    """Prepared cursors for one pooled connection"""
+
+    def __init__(self, dbh):
+        self.cursors = {
+            name: dbh.cursor(prepared=True)
+            for name in SQL
+        }
+
+    def execute(self, name, params):
+        """Execute a named statement, return the cursor"""
+
+        cur = self.cursors[name]
+        cur.execute(SQL[name], params)
+        return cur
+
+    def find_one(self, name, params):
+        """Return the first column of the first row or None"""
+
+        cur = self.execute(name, params)
+        res = cur.fetchall()
+        return res[0][0] if res else None
+
 
 # --------------------------------------------------
 def get_args():
@@ -26,7 +76,7 @@ def get_args():
     parser.add_argument('file',
                         metavar='FILE',
                         nargs='+',
-                        type=argparse.FileType('r'),
+                        type=FileType('r'),
                         help='Input file(s)')
 
     parser.add_argument('-d',
@@ -53,13 +103,33 @@ def get_args():
                         default='127.0.0.1',
                         help='MySQL host')
 
+    parser.add_argument('-P',
+                        '--port',
+                        metavar='PORT',
+                        type=int,
+                        default=3306,
+                        help='MySQL port')
+
     parser.add_argument('-s',
                         '--sep',
                         metavar='SEP',
                         default=',',
                         help='Field separator')
 
-    return parser.parse_args()
+    parser.add_argument('-j',
+                        '--jobs',
+                        metavar='JOBS',
+                        type=int,
+                        default=4,
+                        help='Number of files to load concurrently')
+
+    args = parser.parse_args()
+
+    if not 0 < args.jobs <= mysql.connector.pooling.CNX_POOL_MAXSIZE:
+        parser.error(f'--jobs "{args.jobs}" must be between 1 and '
+                     f'{mysql.connector.pooling.CNX_POOL_MAXSIZE}')
+
+    return args
 
 
 # --------------------------------------------------
@@ -67,9 +137,6 @@ def main():
     """Make a jazz noise here"""
 
     args = get_args()
-    db_name = args.db
-    db_user = args.user
-    db_host = args.host
     db_pass = args.password
     my_cnf = os.path.join(os.path.expanduser("~"), '.my.cnf')
 
@@ -84,21 +151,36 @@ def main():
         print('Error: Missing --password')
         sys.exit(1)
 
-    dbh = mysql.connector.connect(user=db_user,
-                                  password=db_pass,
-                                  host=db_host,
-                                  database=db_name)
-    num_imported = 0
-
-    for i, fh in enumerate(args.file, start=1):
+    # One connection per worker, autocommit as each insert was committed
+    pool = mysql.connector.pooling.MySQLConnectionPool(
+        pool_name='census',
+        pool_size=min(args.jobs, len(args.file)),
+        user=args.user,
+        password=db_pass,
+        host=args.host,
+        port=args.port,
+        database=args.db,
+        autocommit=True)
+
+    def load(job):
+        i, fh = job
         print(f'{i:3}: {os.path.basename(fh.name)}')
-        num_imported += process(fh, dbh, args)
+        dbh = pool.get_connection()
+        try:
+            return process(fh, Statements(dbh), args)
+        finally:
+            fh.close()
+            dbh.close()
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        num_imported = sum(
+            executor.map(load, enumerate(args.file, start=1)))
 
     print(f'Done, imported {num_imported}')
 
 
 # --------------------------------------------------
-def process(fh, dbh, args):
+def process(fh, stmts, args):
     """Import file into db"""
 
     # The "real" headers are in the 2nd row
@@ -120,15 +202,16 @@ def process(fh, dbh, args):
             print(f'Missing "{location_header}" value!')
             continue
 
-        location_id = find_or_create_location(location, dbh)
+        location_id = find_or_create_location(location, stmts)
 
         for attr_type in filter(lambda col: col != 'id', headers):
             value = rec[attr_type]
             if value == '':
                 continue
 
-            attr_type_id = find_or_create_attr_type(attr_type, dbh)
-            attr_id = find_or_create_attr(location_id, attr_type_id, value, dbh)
+            attr_type_id = find_or_create_attr_type(attr_type, stmts)
+            attr_id = find_or_create_attr(location_id, attr_type_id, value,
+                                          stmts)
 
         i += 1
 
@@ -136,70 +219,43 @@ def process(fh, dbh, args):
 
 
 # --------------------------------------------------
-def find_or_create_location(location, dbh):
+def find_or_create_location(location, stmts):
     """Find or create the location"""
 
-    cur = dbh.cursor()
-    cur.execute('select location_id from location where name = %s', (location, ))
-    res = cur.fetchone()
-    location_id = 0
+    location_id = stmts.find_one('find_location', (location, ))
 
-    if res is None:
+    if location_id is None:
         print(f'Loading location "{location}"')
-        cur.execute('insert into location (name) values (%s)', (location, ))
-        location_id = cur.lastrowid
-        dbh.commit()
-    else:
-        location_id = res[0]
+        location_id = stmts.execute('insert_location',
+                                    (location, )).lastrowid
 
     return location_id
 
 
 # --------------------------------------------------
-def find_or_create_attr_type(attr_type, dbh):
+def find_or_create_attr_type(attr_type, stmts):
     """Find or create the attr_type"""
 
-    cur = dbh.cursor()
-    cur.execute('select attr_type_id from attr_type where attr_type = %s',
-                (attr_type, ))
-    res = cur.fetchone()
-    attr_type_id = 0
+    attr_type_id = stmts.find_one('find_attr_type', (attr_type, ))
 
-    if res is None:
+    if attr_type_id is None:
         print(f'Loading attr_type "{attr_type}"')
-        cur.execute('insert into attr_type (attr_type) values (%s)',
-                    (attr_type, ))
-        attr_type_id = cur.lastrowid
-        dbh.commit()
-    else:
-        attr_type_id = res[0]
+        attr_type_id = stmts.execute('insert_attr_type',
+                                     (attr_type, )).lastrowid
 
     return attr_type_id
 
 
 # --------------------------------------------------
-def find_or_create_attr(location_id, attr_type_id, value, dbh):
+def find_or_create_attr(location_id, attr_type_id, value, stmts):
     """Find or create the attr"""
 
-    cur = dbh.cursor()
-    find_sql = ('select attr_id from attr '
-                'where location_id = %s '
-                'and   attr_type_id = %s')
-
-    insert_sql = ('insert into attr '
-                  '(location_id, attr_type_id, value) '
-                  'values (%s, %s, %s)')
-    cur.execute(find_sql, (location_id, attr_type_id))
-    res = cur.fetchone()
-    attr_id = 0
+    attr_id = stmts.find_one('find_attr', (location_id, attr_type_id))
 
-    if res is None:
+    if attr_id is None:
         print(f'Loading attr "{value}"')
-        cur.execute(insert_sql, (location_id, attr_type_id, value))
-        attr_id = cur.lastrowid
-        dbh.commit()
-    else:
-        attr_id = res[0]
+        attr_id = stmts.execute('insert_attr',
+                                (location_id, attr_type_id, value)).lastrowid
 
     return attr_id
 
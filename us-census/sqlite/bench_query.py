@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-19
+Purpose: Time query.py against a synthetic census-sized SQLite db
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import timeit
+from query import build_query
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Time query.py against a synthetic census-sized db',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-d',
+                        '--db',
+                        metavar='DB',
+                        help='SQLite db (default: temp file)')
+
+    parser.add_argument('-l',
+                        '--locations',
+                        metavar='int',
+                        type=int,
+                        default=4000,
+                        help='Number of locations')
+
+    parser.add_argument('-t',
+                        '--attr_types',
+                        metavar='int',
+                        type=int,
+                        default=250,
+                        help='Number of attribute types')
+
+    parser.add_argument('-n',
+                        '--num_queries',
+                        metavar='int',
+                        type=int,
+                        default=200,
+                        help='Number of location queries to time')
+
+    parser.add_argument('-s',
+                        '--seed',
+                        metavar='int',
+                        type=int,
+                        default=1,
+                        help='Random seed')
+
+    return parser.parse_args()
+
+
+# --------------------------------------------------
+def main():
+    """Make a jazz noise here"""
+
+    args = get_args()
+    random.seed(args.seed)
+
+    tmp = None
+    db_file = args.db
+    if not db_file:
+        tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        tmp.close()
+        db_file = tmp.name
+
+    db = sqlite3.connect(db_file)
+    num_attrs = load(db, args.locations, args.attr_types)
+    print(f'Loaded {args.locations:,} locations x {args.attr_types:,} '
+          f'attr types = {num_attrs:,} attrs into "{db_file}"')
+
+    names = [
+        location_name(random.randrange(args.locations))
+        for _ in range(args.num_queries)
+    ]
+
+    db.execute('drop index attr_location_idx')
+    report('no index', time_queries(db, names, False), len(names))
+
+    db.execute('create index attr_location_idx '
+               'on attr (location_id, attr_type_id, value)')
+    db.execute('analyze')
+    report('covering index', time_queries(db, names, False), len(names))
+
+    with open(os.path.join(HERE, 'materialize.sql')) as fh:
+        db.executescript(fh.read())
+    report('materialized', time_queries(db, names, True), len(names))
+
+    db.close()
+    if tmp:
+        os.remove(tmp.name)
+
+
+# --------------------------------------------------
+def load(db, num_locations, num_attr_types):
+    """Create the schema and fill it with synthetic data"""
+
+    with open(os.path.join(HERE, 'schema.sql')) as fh:
+        db.executescript(fh.read())
+
+    db.executemany('insert into location (location_id, name) values (?, ?)',
+                   ((i, location_name(i)) for i in range(num_locations)))
+
+    db.executemany(
+        'insert into attr_type (attr_type_id, attr_type) values (?, ?)',
+        ((i, f'Estimate!!Total!!Variable {i:04d}')
+         for i in range(num_attr_types)))
+
+    # Insert in the loader's order (by location) but with the attr types
+    # shuffled so the rowids are not already clustered on the lookup.
+    attr_type_ids = list(range(num_attr_types))
+    rows = []
+    for location_id in range(num_locations):
+        random.shuffle(attr_type_ids)
+        for attr_type_id in attr_type_ids:
+            rows.append((attr_type_id, location_id,
+                         str(random.randint(0, 100000))))
+
+    db.executemany(
+        'insert into attr (attr_type_id, location_id, value) '
+        'values (?, ?, ?)', rows)
+    db.commit()
+
+    return len(rows)
+
+
+# --------------------------------------------------
+def location_name(i):
+    """Synthetic location name"""
+
+    return f'Block Group {i % 10}, Census Tract {i}, Pima County, Arizona'
+
+
+# --------------------------------------------------
+def time_queries(db, names, materialized):
+    """Time fetching all the attrs for each location"""
+
+    cur = db.cursor()
+
+    def run():
+        for name in names:
+            select, qry_args = build_query(name, 0, materialized)
+            cur.execute(select, qry_args)
+            cur.fetchall()
+
+    return timeit.timeit(run, number=1)
+
+
+# --------------------------------------------------
+def report(label, secs, num_queries):
+    """Print timing"""
+
+    print(f'{label:>15}: {secs:8.4f}s total, '
+          f'{1000 * secs / num_queries:8.3f}ms/query')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
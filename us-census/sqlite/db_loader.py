@@ -13,6 +13,9 @@ import sqlite3
 import sys
 from pprint import pprint
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from compressed_io import FileType  # noqa: E402
+
 
 # --------------------------------------------------
 def get_args():
@@ -25,7 +28,7 @@ def get_args():
     parser.add_argument('file',
                         metavar='FILE',
                         nargs='+',
-                        type=argparse.FileType('r'),
+                        type=FileType('r'),
                         help='Input file(s)')
 
     parser.add_argument('-d',
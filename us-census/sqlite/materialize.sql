@@ -0,0 +1,18 @@
+-- Flatten the location/attr_type/attr EAV rows into one table clustered
+-- on the location name so that all the attributes for one location are
+-- a single range read (see "query.py --materialized").
+-- Rerun after every load as this is a snapshot.
+
+drop table if exists location_attr;
+create table location_attr (
+  name text not null,
+  attr_type text not null,
+  value text not null,
+  primary key (name, attr_type, value)
+) without rowid;
+
+insert into location_attr (name, attr_type, value)
+select l.name, t.attr_type, a.value
+from   attr a
+join   location l on l.location_id=a.location_id
+join   attr_type t on t.attr_type_id=a.attr_type_id;
@@ -40,6 +40,11 @@ def get_args():
                         type=int,
                         default=100)
 
+    parser.add_argument('-m',
+                        '--materialized',
+                        help='Query the "location_attr" table',
+                        action='store_true')
+
     return parser.parse_args()
 
 
@@ -50,25 +55,42 @@ def main():
     args = get_args()
     db = sqlite3.connect(args.db)
     cur = db.cursor()
+    select, qry_args = build_query(args.location, args.limit,
+                                   args.materialized)
+
+    cur.execute(select, qry_args)
+    res = cur.fetchall()
+    print(tabulate(res, headers=['name', 'type', 'value']))
 
-    select = """
-        select l.name, t.attr_type, a.value
-        from   location l, attr_type t, attr a
-        where  l.location_id=a.location_id
-        and    a.attr_type_id=t.attr_type_id
-    """
+
+# --------------------------------------------------
+def build_query(location, limit, materialized=False):
+    """Build the SQL and bind args for the location attributes"""
+
+    if materialized:
+        select = """
+            select name, attr_type, value
+            from   location_attr
+        """
+        where = 'where name=? '
+    else:
+        select = """
+            select l.name, t.attr_type, a.value
+            from   location l
+            join   attr a on a.location_id=l.location_id
+            join   attr_type t on t.attr_type_id=a.attr_type_id
+        """
+        where = 'where l.name=? '
 
     qry_args = []
-    if args.location:
-        select += 'and l.name=? '
-        qry_args.append(args.location)
+    if location:
+        select += where
+        qry_args.append(location)
 
-    if args.limit:
-        select += f'limit {args.limit}'
+    if limit:
+        select += f'limit {limit}'
 
-    cur.execute(select, qry_args)
-    res = cur.fetchall()
-    print(tabulate(res, headers=['name', 'type', 'value']))
+    return select, qry_args
 
 
 # --------------------------------------------------
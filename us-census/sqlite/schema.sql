@@ -20,3 +20,8 @@ create table attr (
   value text not null,
   unique (attr_type_id, location_id, value)
 );
+
+-- "unique (name)" above already gives location an index on name.
+-- This one covers the location -> attrs lookup in query.py and the
+-- find in db_loader.py without touching the attr table rows.
+create index attr_location_idx on attr (location_id, attr_type_id, value);
@@ -7,10 +7,17 @@ Purpose: Load USGS data
 
 import argparse
 import csv
+import os
 import re
+import sys
 from pprint import pprint
 from typing import TextIO, NamedTuple, Dict
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+from compressed_io import FileType  # noqa: E402
+from scrutinizer_record import (  # noqa: E402
+    ScrutinizerRecord, get_writer)
+
 
 class Args(NamedTuple):
     file: TextIO
@@ -31,23 +38,23 @@ def get_args() -> Args:
     parser.add_argument('-f',
                         '--file',
                         metavar='FILE',
-                        type=argparse.FileType('rt', encoding='utf-8-sig'),
+                        type=FileType('rt', encoding='utf-8-sig'),
                         default='az_data_bg.csv',
                         help='Input file')
 
     parser.add_argument('-u',
                         '--units',
                         metavar='FILE',
-                        type=argparse.FileType('rt', encoding='utf-8-sig'),
+                        type=FileType('rt', encoding='utf-8-sig'),
                         default='units.csv',
                         help='Input file')
 
     parser.add_argument('-o',
                         '--outfile',
                         metavar='FILE',
-                        type=argparse.FileType('wt'),
+                        type=FileType('wt'),
                         default='scrutinizer.csv',
-                        help='Output file')
+                        help='Output file (Parquet if "*.parquet")')
 
     parser.add_argument('-m',
                         '--medium',
@@ -87,13 +94,7 @@ def main() -> None:
 
     wanted = list(filter(lambda f: f.startswith('top5_'), reader.fieldnames))
 
-    writer = csv.DictWriter(args.outfile,
-                            fieldnames=[
-                                'source', 'unit', 'location_name',
-                                'location_type', 'variable_name',
-                                'variable_desc', 'collected_on', 'medium',
-                                'value'
-                            ])
+    writer = get_writer(args.outfile)
     writer.writeheader()
 
     num_exported = 0
@@ -112,18 +113,19 @@ def main() -> None:
                 point = ','.join([rec['latitude'], rec['longitude']])
                 symbol = fld.replace('top5_', '')
                 num_exported += 1
-                writer.writerow({
-                    'source': args.source,
-                    'unit': units.get(fld, ''),
-                    'location_name': point,
-                    'location_type': 'point',
-                    'variable_name': symbol,
-                    'variable_desc': f'Concentration of {symbol}',
-                    'medium': args.medium,
-                    'collected_on': '2013-09-18',
-                    'value': str(val)
-                })
-
+                writer.writerow(
+                    ScrutinizerRecord(
+                        source=args.source,
+                        unit=units.get(fld, ''),
+                        location_name=point,
+                        location_type='point',
+                        variable_name=symbol,
+                        variable_desc=f'Concentration of {symbol}',
+                        collected_on='2013-09-18',
+                        medium=args.medium,
+                        value=str(val)))
+
+    writer.close()
     print(f'Done, exported {num_exported:,} to "{args.outfile.name}"')
 
 
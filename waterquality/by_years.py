@@ -7,16 +7,78 @@ Purpose: Separate water by years
 
 import argparse
 import csv
-import dateparser
 import os
-from collections import defaultdict
-from typing import NamedTuple, TextIO, List
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+from functools import partial
+from typing import Dict, NamedTuple, TextIO, List, Set, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+from compressed_io import FileType, is_plain_file  # noqa: E402
+from csv_chunks import map_chunks  # noqa: E402
+from dates import parse_date, year_prefix  # noqa: E402
 
 
 class Args(NamedTuple):
     file: TextIO
     year: List[int]
     out_dir: str
+    max_open: int
+    jobs: int
+
+
+class YearWriter:
+    """
+    Write records to "{out_dir}/{year}.csv" as they come, keeping at most
+    "max_open" files open (the least recently used is closed and reopened
+    for appending when needed). Leave out the CSV header with
+    "header=False".
+    """
+
+    def __init__(self,
+                 out_dir: str,
+                 fieldnames: List[str],
+                 max_open: int,
+                 header: bool = True):
+        self.out_dir = out_dir
+        self.fieldnames = fieldnames
+        self.max_open = max_open
+        self.header = header
+        self.open_files: OrderedDict = OrderedDict()
+        self.counts: Dict[int, int] = {}
+
+    def writerow(self, year: int, rec: Dict[str, str]) -> None:
+        """ Write a record to the file for the year """
+
+        if year in self.open_files:
+            self.open_files.move_to_end(year)
+            _, writer = self.open_files[year]
+        else:
+            if len(self.open_files) >= self.max_open:
+                _, (fh, _) = self.open_files.popitem(last=False)
+                fh.close()
+
+            # Start the file the first time the year is seen in this run
+            out_file = os.path.join(self.out_dir, f'{year}.csv')
+            fh = open(out_file, 'at' if year in self.counts else 'wt')
+            writer = csv.DictWriter(fh, self.fieldnames)
+            if year not in self.counts:
+                if self.header:
+                    writer.writeheader()
+                self.counts[year] = 0
+            self.open_files[year] = (fh, writer)
+
+        writer.writerow(rec)
+        self.counts[year] += 1
+
+    def close(self) -> None:
+        """ Close all the files """
+
+        for fh, _ in self.open_files.values():
+            fh.close()
+        self.open_files.clear()
 
 
 # --------------------------------------------------
@@ -38,7 +100,7 @@ def get_args() -> Args:
                         '--file',
                         help='Input file',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         default='narrowresult.csv')
 
     parser.add_argument('-o',
@@ -48,9 +110,29 @@ def get_args() -> Args:
                         type=str,
                         default=os.path.join(os.getcwd(), 'years'))
 
+    parser.add_argument('-m',
+                        '--max_open',
+                        help='Most output files to keep open',
+                        metavar='int',
+                        type=int,
+                        default=64)
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        help='Number of processes reading --file',
+                        metavar='int',
+                        type=int,
+                        default=1)
+
     args = parser.parse_args()
 
-    return Args(args.file, args.year, args.outdir)
+    if args.max_open < 1:
+        parser.error(f'--max_open "{args.max_open}" must be > 0')
+
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be > 0')
+
+    return Args(args.file, args.year, args.outdir, args.max_open, args.jobs)
 
 
 # --------------------------------------------------
@@ -63,30 +145,109 @@ def main() -> None:
     if not os.path.isdir(out_dir):
         os.makedirs(out_dir)
 
-    reader = csv.DictReader(args.file)
-    years = defaultdict(list)
+    years = set(args.year or [])
+
+    if args.jobs > 1 and is_plain_file(args.file.name):
+        counts = split_parallel(args.file.name, out_dir, years, args.max_open,
+                                args.jobs)
+    else:
+        reader = csv.DictReader(args.file)
+        writer = YearWriter(out_dir, reader.fieldnames, args.max_open)
+        split(reader, writer, years)
+        writer.close()
+        counts = writer.counts
+
+    for year in sorted(counts):
+        print(f'Wrote year "{year}" ({counts[year]:,} records)')
+
+    print('Done.')
+
+
+# --------------------------------------------------
+def split(reader: csv.DictReader, writer: YearWriter, years: Set[int]) -> None:
+    """ Write the records for the years (or all) """
+
     for rec in reader:
         # Skip records with no units
         if not rec.get('ResultMeasure/MeasureUnitCode'):
             continue
 
-        # Attempt to parse the date
+        # Take the year off "YYYY-MM-DD" before trying to parse the date
         if date := rec.get('ActivityStartDate'):
-            dp = dateparser.parse(date)
-            if year := dp.year:
-                if not args.year or year in args.year:
-                    years[year].append(rec)
-
-    for year in sorted(years):
-        print(f'Writing year "{year}"')
-        out_file = os.path.join(out_dir, str(year) + '.csv')
-        with open(out_file, 'wt') as out_fh:
-            writer = csv.DictWriter(out_fh, reader.fieldnames)
-            writer.writeheader()
-            for rec in years[year]:
-                writer.writerow(rec)
+            year = year_prefix(date)
+            if year is None:
+                year = parse_date(date).year
 
-    print('Done.')
+            if not years or year in years:
+                writer.writerow(year, rec)
+
+
+# --------------------------------------------------
+def split_chunk(fh: TextIO, out_dir: str, years: Set[int],
+                max_open: int) -> Tuple[str, Dict[int, int]]:
+    """
+    Split one chunk of the file into headerless year files in a new
+    temporary directory, return the directory and counts
+    """
+
+    tmp_dir = tempfile.mkdtemp(dir=out_dir)
+    reader = csv.DictReader(fh)
+    writer = YearWriter(tmp_dir, reader.fieldnames, max_open, header=False)
+    split(reader, writer, years)
+    writer.close()
+
+    return tmp_dir, writer.counts
+
+
+# --------------------------------------------------
+def split_parallel(file: str, out_dir: str, years: Set[int], max_open: int,
+                   jobs: int) -> Dict[int, int]:
+    """
+    Split chunks of the file in parallel, then append each chunk's year
+    files in order so the records stay in file order
+    """
+
+    with open(file) as fh:
+        fieldnames = csv.DictReader(fh).fieldnames
+
+    counts: Dict[int, int] = {}
+    run = partial(split_chunk, out_dir=out_dir, years=years, max_open=max_open)
+    for tmp_dir, chunk_counts in map_chunks(file, run, jobs):
+        for year, num in chunk_counts.items():
+            out_file = os.path.join(out_dir, f'{year}.csv')
+            with open(out_file, 'at' if year in counts else 'wt',
+                      newline='') as out_fh:
+                if year not in counts:
+                    csv.DictWriter(out_fh, fieldnames).writeheader()
+                    counts[year] = 0
+
+                with open(os.path.join(tmp_dir, f'{year}.csv'),
+                          newline='') as in_fh:
+                    shutil.copyfileobj(in_fh, out_fh)
+
+            counts[year] += num
+
+        shutil.rmtree(tmp_dir)
+
+    return counts
+
+
+# --------------------------------------------------
+def test_year_writer() -> None:
+    """ Test YearWriter """
+
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        writer = YearWriter(out_dir, ['id'], max_open=2)
+        for i, year in enumerate([2001, 2002, 2003, 2001, 2002, 2001]):
+            writer.writerow(year, {'id': str(i)})
+            assert len(writer.open_files) <= 2
+        writer.close()
+
+        assert writer.counts == {2001: 3, 2002: 2, 2003: 1}
+        with open(os.path.join(out_dir, '2001.csv')) as fh:
+            assert fh.read().split() == ['id', '0', '3', '5']
 
 
 # --------------------------------------------------
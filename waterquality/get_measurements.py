@@ -7,12 +7,55 @@ Purpose: Extract measurements
 
 import argparse
 import csv
-from typing import NamedTuple, TextIO, List
+import datetime
+import io
+import os
+import sys
+from typing import Dict, NamedTuple, Optional, TextIO, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+from compressed_io import FileType, is_plain_file  # noqa: E402
+from csv_chunks import map_files_chunks  # noqa: E402
+from dates import parse_date  # noqa: E402
 
 
 class Args(NamedTuple):
     file: List[TextIO]
     outfile: TextIO
+    jobs: int
+
+
+class Measurement:
+    """ Number of records and first/last date of a measurement """
+
+    __slots__ = ['count', 'first', 'last']
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.first: Optional[datetime.datetime] = None
+        self.last: Optional[datetime.datetime] = None
+
+    def add(self, date: Optional[datetime.datetime]) -> None:
+        """ Count one record """
+
+        self.count += 1
+        if date:
+            if self.first is None or date < self.first:
+                self.first = date
+            if self.last is None or date > self.last:
+                self.last = date
+
+    def merge(self, other: 'Measurement') -> None:
+        """ Add the count and dates from another file or chunk """
+
+        self.count += other.count
+        if other.first and (self.first is None or other.first < self.first):
+            self.first = other.first
+        if other.last and (self.last is None or other.last > self.last):
+            self.last = other.last
+
+
+Measurements = Dict[Tuple[str, str], Measurement]
 
 
 # --------------------------------------------------
@@ -27,18 +70,28 @@ def get_args() -> Args:
                         help='Input file(s)',
                         metavar='FILE',
                         nargs='+',
-                        type=argparse.FileType('rt'))
+                        type=FileType('rt'))
 
     parser.add_argument('-o',
                         '--outfile',
                         help='Output file',
                         metavar='FILE',
                         default='measurements.csv',
-                        type=argparse.FileType('wt'))
+                        type=FileType('wt'))
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        help='Number of processes reading the files',
+                        metavar='int',
+                        type=int,
+                        default=1)
 
     args = parser.parse_args()
 
-    return Args(args.file, args.outfile)
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be > 0')
+
+    return Args(args.file, args.outfile, args.jobs)
 
 
 # --------------------------------------------------
@@ -46,21 +99,116 @@ def main() -> None:
     """Make a jazz noise here"""
 
     args = get_args()
-    uniq = set()
-    for fh in args.file:
-        reader = csv.DictReader(fh)
-        for rec in reader:
-            uniq.add((rec['CharacteristicName'],
-                      rec['ResultMeasure/MeasureUnitCode']))
-
-    writer = csv.DictWriter(args.outfile, ['name', 'unit'])
+
+    # The chunks of all the files are read in one process pool
+    if args.jobs > 1 and all(map(lambda fh: is_plain_file(fh.name),
+                                 args.file)):
+        results = map_files_chunks([fh.name for fh in args.file],
+                                   measurements, args.jobs)
+    else:
+        results = map(measurements, args.file)
+
+    uniq: Measurements = {}
+    for chunk in results:
+        merge(uniq, chunk)
+
+    writer = csv.DictWriter(args.outfile,
+                            ['name', 'unit', 'count', 'first', 'last'])
     writer.writeheader()
-    num = 0
-    for name, unit in uniq:
-        num += 1
-        writer.writerow({'name': name, 'unit': unit})
+    writer.writerows(rows(uniq))
+
+    print(f'Done, wrote {len(uniq)} to {args.outfile.name}.')
+
 
-    print(f'Done, wrote {num} to {args.outfile.name}.')
+# --------------------------------------------------
+def measurements(fh: TextIO) -> Measurements:
+    """ The count and first/last date of the unique (name, unit) pairs """
+
+    reader = csv.reader(fh)
+    hdr = next(reader, [])
+    name, unit, date = map(hdr.index, [
+        'CharacteristicName', 'ResultMeasure/MeasureUnitCode',
+        'ActivityStartDate'
+    ])
+
+    def field(row: List[str], i: int) -> str:
+        return row[i] if i < len(row) else ''
+
+    uniq: Measurements = {}
+    for row in filter(None, reader):
+        key = (field(row, name), field(row, unit))
+        if (meas := uniq.get(key)) is None:
+            meas = uniq[key] = Measurement()
+        meas.add(parse_date(field(row, date)))
+
+    return uniq
+
+
+# --------------------------------------------------
+def merge(into: Measurements, other: Measurements) -> None:
+    """ Add the measurements from another file or chunk """
+
+    for key, meas in other.items():
+        if key in into:
+            into[key].merge(meas)
+        else:
+            into[key] = meas
+
+
+# --------------------------------------------------
+def rows(uniq: Measurements) -> List[dict]:
+    """ Output rows sorted by name and unit """
+
+    def fmt(date):
+        return date.strftime('%Y-%m-%d') if date else ''
+
+    return [{
+        'name': name,
+        'unit': unit,
+        'count': meas.count,
+        'first': fmt(meas.first),
+        'last': fmt(meas.last)
+    } for (name, unit), meas in sorted(uniq.items())]
+
+
+# --------------------------------------------------
+def test_measurements() -> None:
+    """ Test measurements and merge """
+
+    text = ('ActivityStartDate,CharacteristicName,'
+            'ResultMeasure/MeasureUnitCode\n'
+            '2018-05-01,Calcium,mg/l\n'
+            '1985-04-25,Calcium,mg/l\n'
+            ',"Sodium, percent total cations",%\n'
+            '2020-01-02,Calcium,\n')
+
+    uniq = measurements(io.StringIO(text))
+    assert rows(uniq) == [
+        {'name': 'Calcium', 'unit': '', 'count': 1,
+         'first': '2020-01-02', 'last': '2020-01-02'},
+        {'name': 'Calcium', 'unit': 'mg/l', 'count': 2,
+         'first': '1985-04-25', 'last': '2018-05-01'},
+        {'name': 'Sodium, percent total cations', 'unit': '%', 'count': 1,
+         'first': '', 'last': ''},
+    ]  # yapf: disable
+
+    merge(uniq, measurements(io.StringIO(text)))
+    merge(uniq, measurements(io.StringIO(text.splitlines()[0] +
+                                         '\n1970-01-01,Zinc,ug/l\n')))
+    assert [(r['name'], r['count'], r['first'], r['last'])
+            for r in rows(uniq)] == [
+        ('Calcium', 2, '2020-01-02', '2020-01-02'),
+        ('Calcium', 4, '1985-04-25', '2018-05-01'),
+        ('Sodium, percent total cations', 2, '', ''),
+        ('Zinc', 1, '1970-01-01', '1970-01-01'),
+    ]  # yapf: disable
+
+    # Short rows are missing the last fields, blank lines are skipped
+    short = measurements(io.StringIO(text.splitlines()[0] +
+                                     '\n2019-03-04,Lead\n\n2019-03-04\n'))
+    assert [(r['name'], r['unit'], r['count'], r['first'])
+            for r in rows(short)] == [('', '', 1, '2019-03-04'),
+                                      ('Lead', '', 1, '2019-03-04')]
 
 
 # --------------------------------------------------
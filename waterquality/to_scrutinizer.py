@@ -6,22 +6,42 @@ Purpose: Format water quality
 """
 
 import argparse
-import dateparser
 import datetime
 import csv
+import io
+import json
+import os
 import re
 import sys
-import recordparser
+from collections import Counter
 from pprint import pprint
-from typing import TextIO, NamedTuple, Dict, Tuple
+from functools import partial
+from typing import TextIO, NamedTuple, Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+from compressed_io import FileType, is_plain_file  # noqa: E402
+from csv_chunks import map_chunks  # noqa: E402
+from dates import parse_date, year_prefix  # noqa: E402
+from scrutinizer_record import (  # noqa: E402
+    ScrutinizerRecord, get_writer)
 
 
 class Args(NamedTuple):
     file: TextIO
     stations: TextIO
+    cache: str
     outfile: TextIO
     medium: str
     source: str
+    year: int
+    jobs: int
+
+
+# Input columns for the Record fields
+FIELDS = [
+    'CharacteristicName', 'MonitoringLocationIdentifier', 'ActivityStartDate',
+    'ResultMeasureValue', 'ResultMeasure/MeasureUnitCode'
+]
 
 
 class Record(NamedTuple):
@@ -43,23 +63,29 @@ def get_args() -> Args:
     parser.add_argument('-f',
                         '--file',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         default='narrowresult.csv',
                         help='Input file')
 
     parser.add_argument('-s',
                         '--station_file',
                         metavar='FILE',
-                        type=argparse.FileType('rt'),
+                        type=FileType('rt'),
                         default='station.csv',
                         help='Station file')
 
+    parser.add_argument('-c',
+                        '--cache',
+                        metavar='FILE',
+                        type=str,
+                        help='Cache of station locations (JSON)')
+
     parser.add_argument('-o',
                         '--outfile',
                         metavar='FILE',
-                        type=argparse.FileType('wt'),
+                        type=FileType('wt'),
                         default='scrutinizer.csv',
-                        help='Output file')
+                        help='Output file (Parquet if "*.parquet")')
 
     parser.add_argument('-m',
                         '--medium',
@@ -75,13 +101,33 @@ def get_args() -> Args:
                         default='USGS Arizona Water Science Center',
                         help='Source for data')
 
+    parser.add_argument('-y',
+                        '--year',
+                        metavar='year',
+                        type=int,
+                        default=2018,
+                        help='Year to export')
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        metavar='jobs',
+                        type=int,
+                        default=1,
+                        help='Number of processes reading --file')
+
     args = parser.parse_args()
 
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be > 0')
+
     return Args(file=args.file,
                 stations=args.station_file,
+                cache=args.cache,
                 outfile=args.outfile,
                 medium=args.medium,
-                source=args.source)
+                source=args.source,
+                year=args.year,
+                jobs=args.jobs)
 
 
 # --------------------------------------------------
@@ -89,73 +135,245 @@ def main() -> None:
     """Make a jazz noise here"""
 
     args = get_args()
-    stations = read_stations(args.stations)
-    reader = csv.DictReader(args.file, delimiter=',')
-    writer = csv.DictWriter(args.outfile,
-                            fieldnames=[
-                                'source', 'unit', 'location_name',
-                                'location_type', 'variable_name',
-                                'variable_desc', 'collected_on', 'medium',
-                                'value'
-                            ])
+    stations = load_stations(args.stations, args.cache)
+    writer = get_writer(args.outfile)
     writer.writeheader()
 
-    mapping = {
-        'CharacteristicName': 'variable',
-        'MonitoringLocationIdentifier': 'location_name',
-        'ActivityStartDate': 'collected_on',
-        'ResultMeasureValue': 'value',
-        'ResultMeasure/MeasureUnitCode': 'unit',
-    }
+    num_exported = 0
+    missing: Counter = Counter()
+
+    # Chunks of a big file are read in parallel, the rows come back in order
+    if args.jobs > 1 and is_plain_file(args.file.name):
+        export = partial(convert_chunk,
+                         stations=stations,
+                         year=args.year,
+                         source=args.source,
+                         medium=args.medium)
+
+        for rows, chunk_missing in map_chunks(args.file.name, export,
+                                              args.jobs):
+            writer.writerows(rows)
+            num_exported += len(rows)
+            missing.update(chunk_missing)
+    else:
+        for rec in convert(args.file, stations, args.year, args.source,
+                           args.medium, missing):
+            writer.writerow(rec)
+            num_exported += 1
+
+    if missing:
+        print(f'Missing {len(missing):,} location(s) '
+              f'for {sum(missing.values()):,} record(s):',
+              file=sys.stderr)
+        for location, count in missing.most_common():
+            print(f'{count:9,} {location}', file=sys.stderr)
+
+    writer.close()
+    print(f'Done, exported {num_exported:,} to "{args.outfile.name}"')
 
-    parser = recordparser.parse(fh=args.file,
-                                cls=Record,
-                                delimiter=',',
-                                mapping=mapping)
 
-    num_exported = 0
-    for i, rec in enumerate(parser, start=1):
-        dt = dateparser.parse(rec.collected_on)
-        if dt.year != 2018:
+# --------------------------------------------------
+def convert_chunk(fh: TextIO, stations: Dict[str, str], year: int,
+                  source: str,
+                  medium: str) -> Tuple[List[ScrutinizerRecord], Counter]:
+    """
+    Convert one chunk, return the rows and the number of records for
+    each location not in "stations"
+    """
+
+    missing: Counter = Counter()
+    rows = list(convert(fh, stations, year, source, medium, missing))
+
+    return rows, missing
+
+
+# --------------------------------------------------
+def convert(fh: TextIO, stations: Dict[str, str], year: int, source: str,
+            medium: str, missing: Counter) -> Iterator[ScrutinizerRecord]:
+    """
+    Yield the converted records for the year, count the records for
+    each location not in "stations" in "missing"
+    """
+
+    reader = csv.reader(fh)
+    if (hdr := next(reader, None)) is None:
+        return
+
+    if missing_flds := [f for f in FIELDS if f not in hdr]:
+        raise Exception(f'Missing field: {", ".join(missing_flds)}')
+
+    cols = list(map(hdr.index, FIELDS))
+    width = max(cols) + 1
+    date_col = hdr.index('ActivityStartDate')
+
+    for row_num, row in enumerate(reader, start=1):
+        if len(row) < width:
+            warn(f'{row_num}: Only {len(row)} fields')
+            continue
+
+        # Skip plainly other years before anything else is done
+        if year_prefix(row[date_col]) not in (None, year):
+            continue
+
+        rec = record(row, cols, row_num)
+        if rec is None:
+            continue
+
+        dt = parse_date(rec.collected_on)
+        if not dt or dt.year != year:
             continue
 
         if not rec.location_name:
             continue
 
-        if rec.location_name not in stations:
-            print('Missing location "{rec.location_name}"', file=sys.stderr)
+        if (location := stations.get(rec.location_name)) is None:
+            missing[rec.location_name] += 1
             continue
 
         collected_on = '{:02d}-{:02d}-{:02d}'.format(dt.year, dt.month, dt.day)
 
-        num_exported += 1
-        writer.writerow({
-            'source': args.source,
-            'unit': rec.unit or 'NA',
-            'location_name': ','.join(stations.get(rec.location_name)),
-            'location_type': 'point',
-            'variable_name': rec.variable,
-            'variable_desc': f'Concentration of {rec.variable} in water',
-            'medium': args.medium,
-            'collected_on': collected_on,
-            'value': str(rec.value)
-        })
+        yield ScrutinizerRecord(
+            source=source,
+            unit=rec.unit or 'NA',
+            location_name=location,
+            location_type='point',
+            variable_name=rec.variable,
+            variable_desc=f'Concentration of {rec.variable} in water',
+            collected_on=collected_on,
+            medium=medium,
+            value=str(rec.value))
 
-    print(f'Done, exported {num_exported:,} to "{args.outfile.name}"')
+
+# --------------------------------------------------
+def record(row: List[str], cols: List[int], row_num: int) -> Optional[Record]:
+    """ A Record from the FIELDS columns of a row, None if "value" is bad """
+
+    variable, location_name, collected_on, value, unit = (row[i]
+                                                          for i in cols)
+    try:
+        num = float(value)
+    except ValueError:
+        warn(f'{row_num}: Cannot convert "{value}" to "float"')
+        return None
+
+    return Record(variable=variable,
+                  location_name=location_name,
+                  collected_on=collected_on,
+                  value=num,
+                  unit=unit)
+
+
+# --------------------------------------------------
+def test_convert() -> None:
+    """ Test convert """
+
+    text = ('ActivityStartDate,MonitoringLocationIdentifier,'
+            'CharacteristicName,ResultMeasureValue,'
+            'ResultMeasure/MeasureUnitCode,ResultCommentText\n'
+            '2018-01-02,USGS-1,Calcium,1.5,mg/l,"a, ""b""\nc"\n'
+            '2017-01-02,USGS-1,Calcium,2,mg/l,x\n'
+            '1/2/2018,USGS-1,Lead,3,,y\n'
+            '2018-03-04,USGS-1,Lead,BDL,ug/l,\n'
+            '2018-03-04,USGS-2,Lead,4,ug/l,\n'
+            '2018-03-04,USGS-1\n')
+
+    missing: Counter = Counter()
+    rows = list(
+        convert(io.StringIO(text), {'USGS-1': '31.5,-109.25'}, 2018, 'USGS',
+                'water', missing))
+    assert [(r.collected_on, r.variable_name, r.unit, r.value)
+            for r in rows] == [('2018-01-02', 'Calcium', 'mg/l', '1.5'),
+                               ('2018-01-02', 'Lead', 'NA', '3.0')]
+    assert rows[0].location_name == '31.5,-109.25'
+    assert missing == Counter({'USGS-2': 1})
+
+
+# --------------------------------------------------
+def warn(msg: str) -> None:
+    """ Print a message to STDERR """
+
+    print(msg, file=sys.stderr)
 
 
 # --------------------------------------------------
-def read_stations(fh: TextIO) -> Dict[str, Tuple[str, str]]:
-    """Read the stations file"""
+def load_stations(fh: TextIO, cache: Optional[str]) -> Dict[str, str]:
+    """
+    Read the stations file, or the cache of it if the cache was written
+    from the same version (mtime and size) of the file
+    """
+
+    if not cache or not os.path.isfile(fh.name):
+        return read_stations(fh)
+
+    stat = os.stat(fh.name)
+    key = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+    if os.path.isfile(cache):
+        with open(cache, 'rt') as cache_fh:
+            try:
+                saved = json.load(cache_fh)
+            except ValueError:
+                saved = {}
+
+        if saved.get('key') == key:
+            return saved['stations']
+
+    stations = read_stations(fh)
+    with open(cache, 'wt') as cache_fh:
+        json.dump({'key': key, 'stations': stations}, cache_fh)
+
+    return stations
+
+
+# --------------------------------------------------
+def read_stations(fh: TextIO) -> Dict[str, str]:
+    """Read the stations file into "lat,lon" location names"""
 
     reader = csv.DictReader(fh)
     return {
         r['MonitoringLocationIdentifier']:
-        (r['LatitudeMeasure'], r['LongitudeMeasure'])
+        f"{r['LatitudeMeasure']},{r['LongitudeMeasure']}"
         for r in reader
     }
 
 
+# --------------------------------------------------
+def test_load_stations() -> None:
+    """ Test load_stations reads and invalidates the cache """
+
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'station.csv')
+        cache = os.path.join(tmp, 'station.json')
+        with open(file, 'wt') as fh:
+            fh.write('MonitoringLocationIdentifier,LatitudeMeasure,'
+                     'LongitudeMeasure\nUSGS-1,31.5,-109.25\n')
+
+        expected = {'USGS-1': '31.5,-109.25'}
+        with open(file) as fh:
+            assert load_stations(fh, None) == expected
+            assert not os.path.isfile(cache)
+
+        with open(file) as fh:
+            assert load_stations(fh, cache) == expected
+
+        # Stations now come from the cache
+        with open(cache, 'rt') as fh:
+            saved = json.load(fh)
+        saved['stations'] = {'USGS-2': '1,2'}
+        with open(cache, 'wt') as fh:
+            json.dump(saved, fh)
+
+        with open(file) as fh:
+            assert load_stations(fh, cache) == {'USGS-2': '1,2'}
+
+        # Until the stations file changes
+        os.utime(file, ns=(0, 0))
+        with open(file) as fh:
+            assert load_stations(fh, cache) == expected
+
+
 # --------------------------------------------------
 def normalize(s):
     """ Normalize a string """